@@ -0,0 +1,144 @@
+"""
+Asynchronous, batched sender for the GA4 Measurement Protocol.
+
+Request handlers call :meth:`MeasurementProtocolDispatcher.enqueue` and return
+immediately; a background thread drains the bounded queue, groups events by
+measurement stream and client, and posts them in batches of up to 25 events
+(the Measurement Protocol's per-request limit), retrying transient failures
+with exponential backoff.
+
+``endpoint`` can point at a local collector for testing. ``requests`` is
+imported when the sender thread starts, on the first queued event.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT = 'https://www.google-analytics.com/mp/collect'
+
+# Measurement Protocol limit on events per request
+MAX_EVENTS_PER_REQUEST = 25
+
+
+class MeasurementProtocolDispatcher:
+    """Bounded queue plus background sender for Measurement Protocol events."""
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, max_queue=1000, max_retries=3,
+                 backoff=0.5, timeout=5, drain_limit=500):
+        self.endpoint = endpoint
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.drain_limit = drain_limit
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._sender = None
+        self._session = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.endpoint = app.config.get('GA_MP_ENDPOINT') or self.endpoint
+        app.extensions['analytics_dispatcher'] = self
+
+    def _ensure_sender(self):
+        """Start the sender thread on first use, and again in a forked worker."""
+        if self._sender is not None and self._sender.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._sender is not None and self._sender.is_alive() and self._pid == os.getpid():
+                return
+            import requests
+
+            self._session = requests.Session()
+            self._pid = os.getpid()
+            self._sender = threading.Thread(target=self._run, name='ga-mp-sender', daemon=True)
+            self._sender.start()
+
+    def enqueue(self, measurement_id, api_secret, client_id, event):
+        """Queue one event for delivery. Returns ``False`` if the queue is full."""
+        self._ensure_sender()
+        try:
+            self._queue.put_nowait((measurement_id, api_secret, client_id, event))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Measurement Protocol queue full, dropping event %s", event.get('name'))
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every queued event has been sent or given up on."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _drain(self):
+        """Wait for one event, then take whatever else is already queued."""
+        items = [self._queue.get()]
+        while len(items) < self.drain_limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._drain()
+            batches = defaultdict(list)
+            for measurement_id, api_secret, client_id, event in items:
+                batches[(measurement_id, api_secret, client_id)].append(event)
+            try:
+                for (measurement_id, api_secret, client_id), events in batches.items():
+                    for start in range(0, len(events), MAX_EVENTS_PER_REQUEST):
+                        chunk = events[start:start + MAX_EVENTS_PER_REQUEST]
+                        try:
+                            self._send(measurement_id, api_secret, client_id, chunk)
+                        except Exception:
+                            # e.g. an event that cannot be serialised; count it and keep the sender alive
+                            logger.exception("Unexpected error sending Measurement Protocol batch")
+                            self.failed += len(chunk)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _send(self, measurement_id, api_secret, client_id, events):
+        """Post one batch, retrying network errors, 429s and 5xx responses."""
+        import requests
+
+        params = {'measurement_id': measurement_id, 'api_secret': api_secret}
+        payload = {'client_id': client_id, 'events': events}
+        for attempt in range(self.max_retries + 1):
+            try:
+                with instrumentation.timed('ga'):
+                    response = self._session.post(self.endpoint, params=params, json=payload,
+                                                  timeout=self.timeout)
+                if response.status_code < 300:
+                    self.sent += len(events)
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.error(f"Measurement Protocol rejected batch: {response.status_code} {response.text}")
+                    break
+                error = f"status {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** attempt))
+        else:
+            logger.error(f"Giving up on Measurement Protocol batch after {self.max_retries + 1} attempts: {error}")
+        self.failed += len(events)
+        return False
@@ -1,64 +1,231 @@
 import os
-import json
-import requests
 import time
-from flask import Flask, render_template, redirect, url_for, request, jsonify, send_from_directory, abort
-from pathlib import Path
+from flask import Flask, Response, current_app, render_template, redirect, url_for, request, jsonify, send_file, abort, stream_with_context
 import logging
 import re
+import budget_optimizer
+import downloads
+import images
+import instrumentation
+import notebooks
+import notebook_render
+import sensitivity
+from analytics_dispatcher import MeasurementProtocolDispatcher
+from artifacts import ArtifactRegistry
+from assets import IMMUTABLE_MAX_AGE, AssetManifest
+from blobstore import BlobStore
+from compression import ResponseCompressor
+from github_proxy import GitHubProxyError, GitHubRepoProxy
+from model_registry import ModelRegistry
+from page_cache import PageCache
+from template_cache import TemplateWarmer
 
-app = Flask(__name__)
-app.logger.setLevel(logging.INFO)
+# Candidate locations for each file-backed page, in priority order.
+# Resolved once at startup by the artifact registry instead of on every request.
+ARTIFACT_SOURCES = {
+    'optimisation': [
+        # Original paths that were not found
+        os.path.join('static', 'historical_projects', 'WooliesX-ChristmasCampaign', 'budget_optimisation.html'),
+        os.path.join('archive', 'historical_projects', 'WooliesX-ChristmasCampaign', 'budget_optimisation.html'),
+        # New paths based on found files
+        os.path.join('static', 'historical_projects', 'WooliesX-CampaignOptimisation', 'xmas_budget_optimisation2_collapsible.html'),
+        os.path.join('archive', 'historical_projects', 'WooliesX-CampaignOptimisation', 'xmas_budget_optimisation2.html')
+    ],
+    'mmm_viz': [
+        'static/historical_projects/WooliesX-CampaignOptimisation/mmm-viz.html',
+        'archive/visualizations/mmm-viz.html'
+    ],
+    'interactive_chart': [
+        'static/historical_projects/wooliesx_budget_optimization/interactive_chart.html',
+        'archive/visualizations/interactive_chart.html'
+    ],
+    'retail_loyalty_analytics': [
+        'static/visualizations/Retail_Loyalty_Program_Analytics.html',
+        'archive/visualizations/Retail_Loyalty_Program_Analytics.html',
+        'attached_assets/Retail_Loyalty_Program_Analytics.html'
+    ],
+    'marketing_cost_forecast': [
+        'attached_assets/marketing-cost-forecast/visual_representations/2_Data_Model_Diagram.md'
+    ],
+    'job_listing': [
+        'attached_assets/Data Analyst Job in Canberra at Charterhouse - SEEK.html'
+    ]
+}
 
-@app.route('/')
+# Extensions are created unbound and attached to the app in create_app()
+
+# Per-route latency/size histograms, Server-Timing headers and /metrics
+metrics = instrumentation.Instrumentation()
+
+# Compiled templates shared on disk between workers; warmed up once the routes exist
+template_warmer = TemplateWarmer()
+
+# Mirrored files collapsed by `python blobstore.py migrate` resolve through the store's index
+blobs = BlobStore()
+
+artifacts = ArtifactRegistry(ARTIFACT_SOURCES, blobs=blobs)
+# Notebooks are indexed as notebooks/<path>, static copies shadowing archived ones
+artifacts.register_tree('notebooks', ['static/historical_projects', 'archive/historical_projects'],
+                        suffixes=['.ipynb'])
+artifacts.register_tree('images', [images.DEFAULT_ROOT], suffixes=images.SUFFIXES)
+# Files served by /downloads/<tree>/<path> with range support
+artifacts.register_tree('downloads/resume', ['static/files'], suffixes=downloads.SUFFIXES)
+artifacts.register_tree('downloads/projects', ['static/historical_projects', 'archive/historical_projects'],
+                        suffixes=downloads.SUFFIXES)
+artifacts.register_tree('downloads/marketing-cost-forecast', ['attached_assets/marketing-cost-forecast'],
+                        suffixes=downloads.SUFFIXES)
+
+# Fingerprinted CSS/JS built by `python assets.py`, resolved in templates via asset_url()
+assets = AssetManifest()
+
+# Content-encodes responses: precompressed static siblings, cached on-the-fly compression otherwise
+compressor = ResponseCompressor()
+
+# Rendered output of the pages that only depend on their template
+page_cache = PageCache()
+
+# Pre-rendered notebook HTML, keyed by content hash and shared on disk between workers
+notebook_renderer = notebook_render.NotebookRenderer()
+
+# Resized AVIF/WebP/JPEG copies of static/images, encoded on first request and cached on disk
+image_pipeline = images.ImagePipeline(artifacts)
+
+# Resume and project documents: byte ranges, sendfile and per-file download counts
+download_service = downloads.DownloadService(artifacts)
+
+# Fitted sales models published by `python model_registry.py publish`, loaded on first use
+models = ModelRegistry()
+
+# Vectorised channel-budget search for the Christmas campaign model behind /api/optimise
+optimizer = budget_optimizer.BudgetOptimizer(registry=models)
+
+# Scenario sweeps over the same model, chunked and streamed as NDJSON
+sensitivity_engine = sensitivity.SensitivityEngine(optimizer)
+
+# Cached, pooled proxy for the GitHub repositories shown on the projects page.
+# requests is only imported when the first call goes out.
+github = GitHubRepoProxy()
+
+# Background, batched sender for GA4 Measurement Protocol events, started on the first event
+analytics = MeasurementProtocolDispatcher()
+
+# Views declared with @route below, added to each app by create_app()
+ROUTES = []
+
+
+def route(rule, **options):
+    """Declare a view like ``app.route`` does; it is registered when the app is created."""
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
+
+
+def create_app(config=None):
+    """Build the app: load config from the environment, bind the extensions, register the routes.
+
+    Import-heavy integrations (requests, Pillow, markdown/pygments) are only
+    imported when first used, so creating the app touches little beyond Flask.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.logger.setLevel(logging.INFO)
+    app.config['ARTIFACT_WATCH_INTERVAL'] = float(os.environ.get('ARTIFACT_WATCH_INTERVAL', 0))
+    app.config['GITHUB_USERNAME'] = os.environ.get('GITHUB_USERNAME')
+    app.config['GITHUB_API_TOKEN'] = os.environ.get('GITHUB_API_TOKEN')
+    app.config['GITHUB_API_URL'] = os.environ.get('GITHUB_API_URL')
+    app.config['GA_MP_ENDPOINT'] = os.environ.get('GA_MP_ENDPOINT')
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['TEMPLATE_WARMUP'] = os.environ.get('TEMPLATE_WARMUP', '1') != '0'
+    app.config['SALES_MODEL_VERSION'] = os.environ.get('SALES_MODEL_VERSION')
+    if config:
+        app.config.update(config)
+
+    # Registered first so its after_request hook runs last and times the others
+    metrics.init_app(app)
+    template_warmer.init_app(app)
+    blobs.init_app(app)
+    artifacts.init_app(app)
+    assets.init_app(app)
+    compressor.init_app(app)
+    page_cache.init_app(app)
+    notebook_renderer.init_app(app)
+    image_pipeline.init_app(app)
+    download_service.init_app(app)
+    models.init_app(app)
+    optimizer.init_app(app)
+    sensitivity_engine.init_app(app)
+    github.init_app(app)
+    analytics.init_app(app)
+
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    # Compile and render every template, and pre-render the cached pages,
+    # before the worker takes traffic
+    template_warmer.warm()
+    if app.config['TEMPLATE_WARMUP']:
+        page_cache.warm(app)
+        metrics.reset()
+    app.logger.info(f"App created in {time.perf_counter() - started:.3f}s")
+    return app
+
+
+def init_worker(app):
+    """Restart per-process machinery in a worker forked from a preloaded app.
+
+    Threads do not survive ``fork()`` and gunicorn resets the worker's signal
+    handlers, so the artifact watcher, the SIGUSR2 refresh handler and the
+    metrics snapshot thread are set up again here. The GitHub proxy and GA
+    sender notice the new pid by themselves.
+    """
+    if metrics.metrics_dir:
+        metrics.start_snapshotter()
+    artifacts.install_signal_handler()
+    if app.config['ARTIFACT_WATCH_INTERVAL']:
+        artifacts.start_watcher(app.config['ARTIFACT_WATCH_INTERVAL'])
+
+@route('/')
+@page_cache.cached('index.html')
 def index():
     return render_template('index.html', active_page='home')
 
-@app.route('/projects')
+@route('/projects')
+@page_cache.cached('projects.html')
 def projects():
     return render_template('projects.html', active_page='projects')
 
-@app.route('/skills')
+@route('/skills')
+@page_cache.cached('skills.html')
 def skills():
     return render_template('skills.html', active_page='skills')
 
-@app.route('/experience')
+@route('/experience')
+@page_cache.cached('experience.html')
 def experience():
     return render_template('experience.html', active_page='experience')
 
-@app.route('/contact')
+@route('/contact')
+@page_cache.cached('contact.html')
 def contact():
     return render_template('contact.html', active_page='contact')
 
-@app.route('/architecture')
+@route('/architecture')
+@page_cache.cached('architecture.html')
 def architecture():
     return render_template('architecture.html', active_page='projects')
 
-@app.route('/optimisation')
+@route('/optimisation')
+@page_cache.cached('visualization_wrapper.html', artifact='optimisation', compress=True)
 def optimisation():
     """Serve the Christmas budget optimisation HTML file directly with collapsible sections."""
     try:
-        # Check all possible locations for the optimization HTML
-        possible_paths = [
-            # Original paths that were not found
-            os.path.join('static', 'historical_projects', 'WooliesX-ChristmasCampaign', 'budget_optimisation.html'),
-            os.path.join('archive', 'historical_projects', 'WooliesX-ChristmasCampaign', 'budget_optimisation.html'),
-            # New paths based on found files
-            os.path.join('static', 'historical_projects', 'WooliesX-CampaignOptimisation', 'xmas_budget_optimisation2_collapsible.html'),
-            os.path.join('archive', 'historical_projects', 'WooliesX-CampaignOptimisation', 'xmas_budget_optimisation2.html')
-        ]
-        
-        optimization_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                optimization_path = path
-                break
-                
-        if optimization_path is None:
-            app.logger.error("Optimization HTML file not found in any location")
+        artifact = artifacts.get('optimisation')
+        if artifact is None:
+            current_app.logger.error("Optimization HTML file not found in any location")
             return "Optimization visualization not found", 404
         
-        with open(optimization_path, 'r') as f:
+        with instrumentation.timed('file'), open(artifact.path, 'r') as f:
             content = f.read()
         
         # Use the base template with GTM implementation
@@ -66,43 +233,132 @@ def optimisation():
                            active_page='projects',
                            visualization_content=content)
     except Exception as e:
-        app.logger.error(f"Error serving optimization page: {str(e)}")
+        current_app.logger.error(f"Error serving optimization page: {str(e)}")
         return f"Error: {str(e)}", 500
 
-@app.route('/resume')
+@route('/resume')
 def resume():
     # Redirect to the downloadable resume file
-    return redirect('/static/files/Angus_Gair_Resume.pdf')
+    return redirect(url_for('download', name='resume/Angus_Gair_Resume.pdf'))
+
+@route('/downloads/<path:name>')
+def download(name):
+    """Serve a resume or project document, honouring conditional and range requests."""
+    artifact = download_service.get(name)
+    if artifact is None:
+        abort(404)
+    return download_service.send(artifact)
+
+@route('/api/downloads')
+def download_counts():
+    """Download counts per file, across all workers."""
+    return jsonify(download_service.counts())
+
+@route('/images/<digest>/<path:name>')
+def image_derivative(digest, name):
+    """Serve a resized derivative of an image under static/images, encoding it on first use."""
+    resolved = image_pipeline.resolve(name)
+    if resolved is None:
+        abort(404)
+    filename, width, fmt = resolved
 
-@app.route('/api/github_repos')
+    artifact = image_pipeline.source(filename)
+    if fmt not in image_pipeline.formats or width not in image_pipeline.widths_for(artifact):
+        # Checked before the redirect so an unknown size is a 404 under any digest
+        abort(404)
+    if not artifact.sha256.startswith(digest):
+        # Linked from a page rendered before the image changed
+        return redirect(image_pipeline.url(filename, width, fmt))
+
+    path = image_pipeline.derivative(filename, width, fmt)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype=images.FORMATS[fmt]['mimetype'], max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@route('/api/github_repos')
 def github_repos():
     """Fetch GitHub repositories using GitHub API."""
     try:
-        github_username = 'analytics-designer'
-        response = requests.get(f'https://api.github.com/users/{github_username}/repos')
-        
-        if response.status_code == 200:
-            repos = response.json()
-            # Extract only the needed information
-            simplified_repos = []
-            for repo in repos:
-                simplified_repos.append({
-                    'name': repo['name'],
-                    'description': repo['description'] or 'No description provided',
-                    'url': repo['html_url'],
-                    'topics': repo.get('topics', []),
-                    'language': repo['language'],
-                    'fork': repo['fork']
-                })
-            return jsonify(simplified_repos)
-        else:
-            app.logger.warning(f"GitHub API returned status code {response.status_code}")
-            return jsonify({'error': 'Could not fetch repositories', 'status': response.status_code}), 500
+        return jsonify(github.get_repos())
+    except GitHubProxyError as e:
+        current_app.logger.warning(str(e))
+        return jsonify({'error': 'Could not fetch repositories', 'status': e.status}), 500
     except Exception as e:
-        app.logger.error(f"Error fetching GitHub repositories: {str(e)}")
+        current_app.logger.error(f"Error fetching GitHub repositories: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/tableau_views')
+@route('/api/optimise')
+def optimise_budget():
+    """
+    Best split of a daily budget across social media, SEM, email and display.
+
+    Query parameters: budget (required), days_to_christmas (required),
+    weekend, holiday, week, day_of_week (0 = Monday), steps (grid points per
+    channel) and refine (rounds of finer search around the best split).
+    """
+    if not budget_optimizer.available():
+        return jsonify({"error": "Optimiser unavailable"}), 503
+    try:
+        params = {
+            'total_budget': float(request.args['budget']),
+            'days_to_christmas': int(request.args['days_to_christmas']),
+            'is_weekend': int(request.args.get('weekend', 0)),
+            'is_holiday': int(request.args.get('holiday', 0)),
+            'week': int(request.args.get('week', budget_optimizer.DEFAULT_WEEK)),
+            'day_of_week': int(request.args.get('day_of_week', 0)),
+            'steps': int(request.args.get('steps', optimizer.steps)),
+            'refine': int(request.args.get('refine', 0)),
+        }
+    except KeyError as e:
+        return jsonify({"error": f"Missing parameter: {e.args[0]}"}), 400
+    except ValueError:
+        return jsonify({"error": "Parameters must be numbers"}), 400
+    try:
+        with instrumentation.timed('model'):
+            return jsonify(optimizer.optimize(**params))
+    except budget_optimizer.OptimizerError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error optimising budget: {str(e)}")
+        return jsonify({"error": "Optimisation failed"}), 500
+
+@route('/api/optimise/sensitivity')
+def optimise_sensitivity():
+    """
+    Stream the best budget split for every combination of scenario parameters.
+
+    Each of budget, days_to_christmas, weekend, holiday and week takes a list
+    (30,25,20) or an inclusive range with an optional step (30-5:5); steps and
+    day_of_week apply to every scenario. The response is one JSON record per
+    line: a "scenario" record each, then a "summary" record.
+    """
+    if not budget_optimizer.available():
+        return jsonify({"error": "Optimiser unavailable"}), 503
+    names = {'budget': 'total_budget', 'days_to_christmas': 'days_to_christmas',
+             'weekend': 'is_weekend', 'holiday': 'is_holiday', 'week': 'week'}
+    try:
+        values = {name: sensitivity.parse_values(request.args[arg], float if arg == 'budget' else int,
+                                                 limit=sensitivity_engine.max_scenarios)
+                  for arg, name in names.items() if arg in request.args}
+        steps = int(request.args.get('steps', optimizer.steps))
+        day_of_week = int(request.args.get('day_of_week', 0))
+        lines = sensitivity_engine.ndjson_lines(values, steps=steps, day_of_week=day_of_week)
+    except ValueError as e:
+        # OptimizerError is a ValueError
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        try:
+            yield from lines
+        except Exception as e:
+            current_app.logger.error(f"Error streaming sensitivity sweep: {str(e)}")
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@route('/api/tableau_views')
 def tableau_views():
     """Get available Tableau Public views for embedding."""
     try:
@@ -121,131 +377,146 @@ def tableau_views():
             }
         ])
     except Exception as e:
-        app.logger.error(f"Error fetching Tableau views: {str(e)}")
+        current_app.logger.error(f"Error fetching Tableau views: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/jupyter/<path:notebook_path>')
+@route('/jupyter/<path:notebook_path>')
 def serve_notebook(notebook_path):
     """Serve a Jupyter notebook file."""
     try:
-        # Construct the full path to the notebook
-        notebook_file = Path(f'static/historical_projects/{notebook_path}')
-        
-        # Check if the notebook exists
-        if not notebook_file.exists():
-            # Try the archived location
-            archived_notebook_file = Path(f'archive/historical_projects/{notebook_path}')
-            if archived_notebook_file.exists():
-                notebook_file = archived_notebook_file
-            else:
-                app.logger.error(f"Notebook not found at either location: {notebook_path}")
-                abort(404)
+        # Look the notebook up in the startup index (static shadows archive)
+        artifact = artifacts.get(f'notebooks/{notebook_path}')
+        if artifact is None:
+            current_app.logger.error(f"Notebook not found at either location: {notebook_path}")
+            abort(404)
         
         # For security reasons, validate that the path doesn't try to access files outside the intended directory
         if '../' in notebook_path or notebook_path.startswith('/'):
-            app.logger.error(f"Invalid notebook path: {notebook_path}")
+            current_app.logger.error(f"Invalid notebook path: {notebook_path}")
             abort(403)
         
+        # Serve the cached server-side rendering when available; the template
+        # falls back to rendering in the browser otherwise
+        rendered = None
+        if notebook_render.available():
+            rendered = notebook_renderer.render(artifact)
+        
         # Render the notebook display template
         return render_template('notebook.html', 
                                notebook_path=notebook_path, 
                                active_page='projects',
-                               notebook_name=os.path.basename(notebook_path))
+                               notebook_name=os.path.basename(notebook_path),
+                               rendered=rendered,
+                               notebook_css=notebook_renderer.stylesheet if rendered else '')
         
     except Exception as e:
-        app.logger.error(f"Error serving notebook: {str(e)}")
+        current_app.logger.error(f"Error serving notebook: {str(e)}")
         abort(500)
 
-@app.route('/api/notebooks/<path:notebook_path>')
+@route('/api/notebooks/<path:notebook_path>')
 def get_notebook_content(notebook_path):
-    """Get the content of a Jupyter notebook file."""
+    """
+    Stream the content of a Jupyter notebook file.
+
+    Query parameters:
+    - offset / limit: only return cells in [offset, offset + limit)
+    - outputs=false: drop code cell outputs (embedded plots, tables)
+    - format=ndjson: one JSON record per line ({"type": "cell", ...} or
+      {"type": "field", ...}) instead of a single notebook document
+    """
     try:
-        # Construct the full path to the notebook
-        notebook_file = Path(f'static/historical_projects/{notebook_path}')
-        
-        # Check if the notebook exists
-        if not notebook_file.exists():
-            # Try the archived location
-            archived_notebook_file = Path(f'archive/historical_projects/{notebook_path}')
-            if archived_notebook_file.exists():
-                notebook_file = archived_notebook_file
-            else:
-                app.logger.error(f"Notebook not found at either location: {notebook_path}")
-                return jsonify({"error": "Notebook not found"}), 404
+        # Look the notebook up in the startup index (static shadows archive)
+        artifact = artifacts.get(f'notebooks/{notebook_path}')
+        if artifact is None:
+            current_app.logger.error(f"Notebook not found at either location: {notebook_path}")
+            return jsonify({"error": "Notebook not found"}), 404
         
         # For security reasons, validate that the path doesn't try to access files outside the intended directory
         if '../' in notebook_path or notebook_path.startswith('/'):
-            app.logger.error(f"Invalid notebook path: {notebook_path}")
+            current_app.logger.error(f"Invalid notebook path: {notebook_path}")
             return jsonify({"error": "Invalid notebook path"}), 403
         
-        # Read the notebook content
-        with open(notebook_file, 'r') as f:
-            notebook_content = json.load(f)
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = request.args.get('limit', type=int)
+        except ValueError:
+            return jsonify({"error": "offset and limit must be integers"}), 400
+        if offset < 0 or (limit is not None and limit < 1):
+            return jsonify({"error": "offset must be >= 0 and limit >= 1"}), 400
+        outputs = request.args.get('outputs', 'true').lower() not in ('false', '0', 'no')
+        
+        # The file is read whole; only the decoding is incremental, one cell at a time while streaming
+        with instrumentation.timed('file'), open(artifact.path, 'r') as f:
+            text = f.read()
+        # Reject a malformed notebook while a proper error response can still be sent
+        try:
+            notebooks.validate(text)
+        except notebooks.NotebookFormatError as e:
+            current_app.logger.error(f"Invalid notebook {notebook_path}: {str(e)}")
+            return jsonify({"error": "Notebook could not be parsed"}), 500
+        events = notebooks.iter_cells(text, offset=offset, limit=limit, outputs=outputs)
+        
+        logger = current_app.logger
         
-        return jsonify(notebook_content)
+        def generate(chunks):
+            try:
+                yield from chunks
+            except notebooks.NotebookFormatError as e:
+                logger.error(f"Error streaming notebook {notebook_path}: {str(e)}")
+        
+        if request.args.get('format') == 'ndjson':
+            return Response(stream_with_context(generate(notebooks.ndjson_lines(events))),
+                            mimetype='application/x-ndjson')
+        paginated = 'offset' in request.args or 'limit' in request.args
+        return Response(stream_with_context(generate(notebooks.json_chunks(events, paginated=paginated))),
+                        mimetype='application/json')
     except Exception as e:
-        app.logger.error(f"Error fetching notebook content: {str(e)}")
+        current_app.logger.error(f"Error fetching notebook content: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/mmm_viz')
+@route('/mmm_viz')
 def mmm_viz():
     """Serve the Marketing Mix Modeling visualization page."""
     try:
-        # Check if file exists in the primary location
-        viz_path = 'static/historical_projects/WooliesX-CampaignOptimisation/mmm-viz.html'
-        
-        # If not found in primary, check the archived location
-        if not os.path.exists(viz_path):
-            viz_path = 'archive/visualizations/mmm-viz.html'
-            if not os.path.exists(viz_path):
-                app.logger.error("MMM visualization file not found")
-                return "MMM visualization not found", 404
+        # Check the visualization was found in the primary or archived location
+        if 'mmm_viz' not in artifacts:
+            current_app.logger.error("MMM visualization file not found")
+            return "MMM visualization not found", 404
                 
         # Use render_template for the mmm_viz.html which will include the visualization
         return render_template('mmm_viz.html', active_page='projects')
     except Exception as e:
-        app.logger.error(f"Error serving MMM visualization: {str(e)}")
+        current_app.logger.error(f"Error serving MMM visualization: {str(e)}")
         return str(e), 500
 
-@app.route('/interactive_chart')
+@route('/interactive_chart')
 def interactive_chart():
     """Serve the Interactive Chart page for the XGBoost project."""
     try:
-        # Check if file exists in the primary location
-        viz_path = 'static/historical_projects/wooliesx_budget_optimization/interactive_chart.html'
-        
-        # If not found in primary, check the archived location
-        if not os.path.exists(viz_path):
-            viz_path = 'archive/visualizations/interactive_chart.html'
-            if not os.path.exists(viz_path):
-                app.logger.error("Interactive chart file not found")
-                return "Interactive chart not found", 404
+        # Check the chart was found in the primary or archived location
+        if 'interactive_chart' not in artifacts:
+            current_app.logger.error("Interactive chart file not found")
+            return "Interactive chart not found", 404
                 
         # Use render_template for the interactive_chart.html which will include the visualization
         return render_template('interactive_chart.html', active_page='projects')
     except Exception as e:
-        app.logger.error(f"Error serving interactive chart: {str(e)}")
+        current_app.logger.error(f"Error serving interactive chart: {str(e)}")
         return str(e), 500
 
-@app.route('/retail_loyalty_analytics')
+@route('/retail_loyalty_analytics')
+@page_cache.cached('visualization_wrapper.html', artifact='retail_loyalty_analytics', compress=True)
 def retail_loyalty_analytics():
     """Serve the Retail Loyalty Analytics visualization page."""
     try:
-        # Check if file exists in the primary location
-        viz_path = 'static/visualizations/Retail_Loyalty_Program_Analytics.html'
-        
-        # If not found in primary, check the archived location
-        if not os.path.exists(viz_path):
-            viz_path = 'archive/visualizations/Retail_Loyalty_Program_Analytics.html'
-            # If still not found, check attached_assets
-            if not os.path.exists(viz_path):
-                viz_path = 'attached_assets/Retail_Loyalty_Program_Analytics.html'
-                if not os.path.exists(viz_path):
-                    app.logger.error("Retail loyalty analytics file not found in any location")
-                    return "Retail loyalty analytics visualization not found", 404
+        # Resolved from static, archive or attached_assets at startup
+        artifact = artifacts.get('retail_loyalty_analytics')
+        if artifact is None:
+            current_app.logger.error("Retail loyalty analytics file not found in any location")
+            return "Retail loyalty analytics visualization not found", 404
         
         # Read the HTML content
-        with open(viz_path, 'r') as f:
+        with instrumentation.timed('file'), open(artifact.path, 'r') as f:
             html_content = f.read()
         
         # Instead of returning HTML directly, use the base template
@@ -253,10 +524,10 @@ def retail_loyalty_analytics():
                                active_page='projects',
                                visualization_content=html_content)
     except Exception as e:
-        app.logger.error(f"Error serving retail loyalty analytics: {str(e)}")
+        current_app.logger.error(f"Error serving retail loyalty analytics: {str(e)}")
         return str(e), 500
 
-@app.route('/analytics-debug')
+@route('/analytics-debug')
 def analytics_debug():
     """
     Debug page for Google Analytics verification.
@@ -264,11 +535,14 @@ def analytics_debug():
     """
     return render_template('analytics_debug.html', active_page='debug')
 
-@app.route('/api/test-analytics-event', methods=['POST'])
+@route('/api/test-analytics-event', methods=['POST'])
 def test_analytics_event():
     """
     Endpoint to verify analytics tracking by sending a test event directly to the 
     Google Analytics Measurement Protocol API.
+    
+    The event is queued for the background dispatcher and the request returns
+    immediately with 202 Accepted.
     """
     try:
         # Get the measurement ID and API secret from the request
@@ -280,40 +554,33 @@ def test_analytics_event():
             return jsonify({"error": "Missing measurement_id or api_secret"}), 400
         
         # Create a test event
-        event_data = {
-            "client_id": "test-client-id-123456789",
-            "events": [{
-                "name": "test_event",
-                "params": {
-                    "test_param": "test_value",
-                    "timestamp_micros": int(time.time() * 1000000)
-                }
-            }]
+        event = {
+            "name": "test_event",
+            "params": {
+                "test_param": "test_value",
+                "timestamp_micros": int(time.time() * 1000000)
+            }
         }
         
-        # Send the event to GA4
-        response = requests.post(
-            f"https://www.google-analytics.com/mp/collect?measurement_id={measurement_id}&api_secret={api_secret}",
-            json=event_data
-        )
-        
-        if response.status_code == 204:
-            return jsonify({"success": True, "message": "Test event sent successfully"})
+        # Queue the event for GA4; delivery happens off the request thread
+        if analytics.enqueue(measurement_id, api_secret, "test-client-id-123456789", event):
+            return jsonify({"success": True, "message": "Test event queued"}), 202
         else:
-            return jsonify({"error": f"Failed to send test event: {response.text}"}), 500
+            return jsonify({"error": "Analytics queue is full, try again later"}), 503
             
     except Exception as e:
-        app.logger.error(f"Error sending test analytics event: {str(e)}")
+        current_app.logger.error(f"Error sending test analytics event: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/ecosystem')
+@route('/ecosystem')
+@page_cache.cached('ecosystem.html')
 def ecosystem():
     """
     Serve the ecosystem diagram page.
     """
     return render_template('ecosystem.html', active_page='projects')
 
-@app.route('/marketing_cost_forecast')
+@route('/marketing_cost_forecast')
 def marketing_cost_forecast():
     """
     Serve the Marketing Cost Forecast project visualization page.
@@ -321,32 +588,29 @@ def marketing_cost_forecast():
     """
     try:
         # Check if the visualization content exists
-        viz_path = 'attached_assets/marketing-cost-forecast/visual_representations/2_Data_Model_Diagram.md'
-        
-        if not os.path.exists(viz_path):
-            app.logger.error("Marketing Cost Forecast visualization file not found")
+        if 'marketing_cost_forecast' not in artifacts:
+            current_app.logger.error("Marketing Cost Forecast visualization file not found")
             return "Marketing Cost Forecast visualization not found", 404
                 
         # Use render_template for the marketing_cost_forecast.html which will include the visualization
         return render_template('marketing_cost_forecast.html', active_page='projects')
     except Exception as e:
-        app.logger.error(f"Error serving Marketing Cost Forecast visualization: {str(e)}")
+        current_app.logger.error(f"Error serving Marketing Cost Forecast visualization: {str(e)}")
         return str(e), 500
 
-@app.route('/listing.html')
+@route('/listing.html')
 def job_listing():
     """
     Serve the Data Analyst job listing from Charterhouse.
     """
     try:
-        job_listing_path = 'attached_assets/Data Analyst Job in Canberra at Charterhouse - SEEK.html'
-        
-        if not os.path.exists(job_listing_path):
-            app.logger.error("Job listing HTML file not found")
+        artifact = artifacts.get('job_listing')
+        if artifact is None:
+            current_app.logger.error("Job listing HTML file not found")
             return "Job listing not found", 404
             
         # Extract relevant content from the job listing HTML
-        with open(job_listing_path, 'r') as f:
+        with instrumentation.timed('file'), open(artifact.path, 'r') as f:
             content = f.read()
         
         # Get the job title using regex
@@ -362,8 +626,8 @@ def job_listing():
                                source="SEEK",
                                company="Charterhouse")
     except Exception as e:
-        app.logger.error(f"Error serving job listing: {str(e)}")
+        current_app.logger.error(f"Error serving job listing: {str(e)}")
         return str(e), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
@@ -10,8 +10,7 @@ import json
 import logging
 import time
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import gtm_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -21,36 +20,19 @@ logger = logging.getLogger('gtm-config-checker')
 # GTM and GA4 configuration
 GTM_CONTAINER_ID = 'GTM-PC9Q9VC3'
 GA4_MEASUREMENT_ID = 'G-3P8MK7MHQF'
-SERVICE_ACCOUNT_FILE = '../GoogleAnalytics/gair-com-au-153c7f6062f4.json'
 API_SCOPES = ['https://www.googleapis.com/auth/tagmanager.readonly']
 
-# Hardcoded paths from previous runs
-GTM_ACCOUNT_ID = '6275069304'
-GTM_CONTAINER_NUMERIC_ID = '209628263'
-
-def get_credentials():
-    """Get credentials for the Google Tag Manager API."""
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=API_SCOPES)
-        return credentials
-    except Exception as e:
-        logger.error(f"Error getting credentials: {e}")
-        raise
-
 def build_service():
-    """Build the Tag Manager service."""
-    credentials = get_credentials()
-    service = build('tagmanager', 'v2', credentials=credentials)
-    return service
+    """Build the Tag Manager service (shared, rate-limited client)."""
+    return gtm_client.build_service(API_SCOPES)
 
 def check_container_info():
     """Check the container information."""
     service = build_service()
     
-    # Use hardcoded paths
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if container_path is None:
+        return False
     
     try:
         container = service.accounts().containers().get(
@@ -72,9 +54,9 @@ def check_live_version():
     """Check if there's a published live version."""
     service = build_service()
     
-    # Use hardcoded paths
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if container_path is None:
+        return False
     
     try:
         # Get the container's latest published version
@@ -118,9 +100,9 @@ def check_variables():
     """Check the configured variables."""
     service = build_service()
     
-    # Use hardcoded paths
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if container_path is None:
+        return False
     
     try:
         # First, get an available workspace
@@ -187,9 +169,9 @@ def check_triggers():
     """Check the configured triggers."""
     service = build_service()
     
-    # Use hardcoded paths
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if container_path is None:
+        return False
     
     try:
         # First, get an available workspace
@@ -246,9 +228,9 @@ def check_tags():
     """Check the configured tags."""
     service = build_service()
     
-    # Use hardcoded paths
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if container_path is None:
+        return False
     
     try:
         # First, get an available workspace
@@ -12,8 +12,7 @@ These metrics will be sent to Google Analytics 4 for analysis.
 import os
 import time
 import logging
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
+import gtm_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -23,35 +22,16 @@ logger = logging.getLogger('ga4-event-configurator')
 # GTM and GA4 configuration
 GTM_CONTAINER_ID = 'GTM-PC9Q9VC3'
 GA4_MEASUREMENT_ID = 'G-3P8MK7MHQF'
-SERVICE_ACCOUNT_FILE = '../GoogleAnalytics/gair-com-au-153c7f6062f4.json'
 API_SCOPES = ['https://www.googleapis.com/auth/tagmanager.edit.containers',
               'https://www.googleapis.com/auth/tagmanager.publish']
 
-# Hardcoded paths from previous configurations
-GTM_ACCOUNT_ID = '6275069304'
-GTM_CONTAINER_NUMERIC_ID = '209628263'
-
-def get_credentials():
-    """Get credentials for the Google Tag Manager API."""
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=API_SCOPES)
-        return credentials
-    except Exception as e:
-        logger.error(f"Error getting credentials: {e}")
-        raise
-
 def build_service():
-    """Build the Tag Manager service."""
-    credentials = get_credentials()
-    service = build('tagmanager', 'v2', credentials=credentials)
-    return service
+    """Build the Tag Manager service (shared, rate-limited client)."""
+    return gtm_client.build_service(API_SCOPES)
 
 def get_account_and_container_paths(service):
     """Get account and container paths for the GTM container ID."""
-    # Hardcoded paths to avoid API quota limits
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
     return account_path, container_path
 
 def get_or_create_workspace(service, container_path):
@@ -281,6 +261,9 @@ def main():
         # Step 1: Set up service and get paths
         service = build_service()
         account_path, container_path = get_account_and_container_paths(service)
+        if not container_path:
+            logger.error("Container not found, exiting.")
+            return False
         
         # Step 2: Get or create a workspace
         workspace_path = get_or_create_workspace(service, container_path)
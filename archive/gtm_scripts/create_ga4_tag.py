@@ -9,8 +9,7 @@ It's designed to be more focused and simpler than the full configurator.
 import logging
 import time
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import gtm_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -20,7 +19,6 @@ logger = logging.getLogger('ga4-tag-creator')
 # GTM and GA4 configuration
 GTM_CONTAINER_ID = 'GTM-PC9Q9VC3'
 GA4_MEASUREMENT_ID = 'G-3P8MK7MHQF'
-SERVICE_ACCOUNT_FILE = '../GoogleAnalytics/gair-com-au-153c7f6062f4.json'
 API_SCOPES = [
     'https://www.googleapis.com/auth/tagmanager.edit.containers',
     'https://www.googleapis.com/auth/tagmanager.publish',
@@ -30,25 +28,9 @@ API_SCOPES = [
     'https://www.googleapis.com/auth/tagmanager.manage.accounts'
 ]
 
-# Hardcoded paths from previous runs
-GTM_ACCOUNT_ID = '6275069304'
-GTM_CONTAINER_NUMERIC_ID = '209628263'
-
-def get_credentials():
-    """Get credentials for the Google Tag Manager API."""
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=API_SCOPES)
-        return credentials
-    except Exception as e:
-        logger.error(f"Error getting credentials: {e}")
-        raise
-
 def build_service():
-    """Build the Tag Manager service."""
-    credentials = get_credentials()
-    service = build('tagmanager', 'v2', credentials=credentials)
-    return service
+    """Build the Tag Manager service (shared, rate-limited client)."""
+    return gtm_client.build_service(API_SCOPES)
 
 def get_or_create_workspace(service, container_path):
     """Get an existing workspace or create a new one."""
@@ -278,9 +260,10 @@ def main():
     # Build the service
     service = build_service()
     
-    # Use hardcoded paths
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if not container_path:
+        logger.error("Container not found. Exiting.")
+        return False
     
     # Get or create a workspace
     workspace_path = get_or_create_workspace(service, container_path)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Shared Google Tag Manager API client for the scripts in this directory.
+
+Every script used to re-implement ``get_credentials``/``build_service``,
+fetch the discovery document on each run and walk accounts and containers
+one request at a time. This module provides, once:
+
+1. A discovery document cached on disk, so building the service is offline
+2. A persisted account/container/workspace path cache (replaces the
+   hard-coded GTM_ACCOUNT_ID / GTM_CONTAINER_NUMERIC_ID)
+3. Request batching through the API's batch endpoint
+4. A rate-limit-aware limiter shared by every request, with backoff on 429s
+
+Services built here use :class:`LimitedHttpRequest`, so every existing
+``.execute()`` call in the scripts goes through the limiter without changes.
+
+The service objects are per thread because httplib2 connections are not
+thread-safe, so work can be spread over a thread pool.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from google.oauth2 import service_account
+from googleapiclient.discovery import V2_DISCOVERY_URI, build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+logger = logging.getLogger('gtm-client')
+
+# GTM and GA4 configuration
+GTM_CONTAINER_ID = 'GTM-PC9Q9VC3'
+GA4_MEASUREMENT_ID = 'G-3P8MK7MHQF'
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_ACCOUNT_FILE = os.path.join(SCRIPT_DIR, '..', 'GoogleAnalytics', 'gair-com-au-153c7f6062f4.json')
+READONLY_SCOPES = ['https://www.googleapis.com/auth/tagmanager.readonly']
+EDIT_SCOPES = ['https://www.googleapis.com/auth/tagmanager.edit.containers',
+               'https://www.googleapis.com/auth/tagmanager.publish']
+
+# Local caches
+CACHE_DIR = os.path.join(SCRIPT_DIR, '.gtm_cache')
+DISCOVERY_CACHE_FILE = os.path.join(CACHE_DIR, 'tagmanager_v2_discovery.json')
+PATH_CACHE_FILE = os.path.join(CACHE_DIR, 'paths.json')
+DISCOVERY_MAX_AGE = 7 * 24 * 3600
+
+# Tag Manager API quota is per project; stay comfortably under it
+DEFAULT_QPS = 4
+DEFAULT_CONCURRENCY = 4
+MAX_BATCH_SIZE = 20
+MAX_RETRIES = 5
+
+
+class RateLimiter:
+    """Token bucket (requests per second) combined with a concurrency cap."""
+
+    def __init__(self, qps=DEFAULT_QPS, concurrency=DEFAULT_CONCURRENCY):
+        self.qps = qps
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._tokens = float(qps)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def acquire_tokens(self, count=1):
+        """Block until ``count`` request tokens are available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(max(self.qps, count), self._tokens + (now - self._updated) * self.qps)
+                    self._updated = now
+                    if self._tokens >= count:
+                        self._tokens -= count
+                        return
+                    wait = (count - self._tokens) / self.qps
+            time.sleep(wait)
+
+    def back_off(self, seconds):
+        """Pause every caller after the API reported a rate limit."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @contextmanager
+    def reserve(self, count=1):
+        """Hold one concurrency slot while spending ``count`` request tokens."""
+        with self._slots:
+            self.acquire_tokens(count)
+            yield
+
+
+limiter = RateLimiter()
+_local = threading.local()
+
+
+def is_rate_limit_error(error):
+    """True for 429s and the 403 rateLimitExceeded/userRateLimitExceeded variants.
+
+    Any other HttpError (404, 400, a plain 403 permission error) is not a rate
+    limit, whatever its message says; the message heuristic is only used for
+    exceptions raised outside the HTTP layer.
+    """
+    if isinstance(error, HttpError):
+        if error.resp.status == 429:
+            return True
+        if error.resp.status == 403:
+            return 'ratelimitexceeded' in str(error).lower()
+        return False
+    return 'rate' in str(error).lower() or 'quota' in str(error).lower()
+
+
+class LimitedHttpRequest(HttpRequest):
+    """API request whose ``execute`` waits for the shared limiter and retries rate limits."""
+
+    def execute(self, http=None, num_retries=0):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with limiter.reserve():
+                    return super().execute(http=http, num_retries=num_retries)
+            except HttpError as e:
+                if attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    raise
+                wait = (2 ** attempt) + random.random()
+                logger.warning(f"Rate limit hit, backing off for {wait:.1f} seconds...")
+                limiter.back_off(wait)
+
+
+def get_credentials(scopes=READONLY_SCOPES):
+    """Get credentials for the Google Tag Manager API."""
+    try:
+        return service_account.Credentials.from_service_account_file(
+            SERVICE_ACCOUNT_FILE, scopes=scopes)
+    except Exception as e:
+        logger.error(f"Error getting credentials: {e}")
+        raise
+
+
+def load_discovery_document(refresh=False):
+    """Return the Tag Manager v2 discovery document, fetching it at most once a week."""
+    if not refresh and os.path.exists(DISCOVERY_CACHE_FILE):
+        if time.time() - os.path.getmtime(DISCOVERY_CACHE_FILE) < DISCOVERY_MAX_AGE:
+            with open(DISCOVERY_CACHE_FILE, 'r') as f:
+                return f.read()
+
+    url = V2_DISCOVERY_URI.format(api='tagmanager', apiVersion='v2')
+    logger.info(f"Fetching discovery document from {url}")
+    with urllib.request.urlopen(url, timeout=30) as response:
+        document = response.read().decode('utf-8')
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(DISCOVERY_CACHE_FILE, 'w') as f:
+        f.write(document)
+    return document
+
+
+def build_service(scopes=READONLY_SCOPES):
+    """Build (or reuse) this thread's Tag Manager service from the cached discovery document."""
+    key = tuple(scopes)
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+    if key not in services:
+        services[key] = build_from_document(load_discovery_document(),
+                                            credentials=get_credentials(list(scopes)),
+                                            requestBuilder=LimitedHttpRequest)
+    return services[key]
+
+
+def batch_execute(service, requests, retries=MAX_RETRIES):
+    """Send ``requests`` through the batch endpoint and return their results in order.
+
+    Each result is either the response body or the exception raised for that
+    request. Requests that failed with a rate limit are retried in a later
+    batch. Every sub-request is counted against the limiter.
+    """
+    results = [None] * len(requests)
+    pending = list(range(len(requests)))
+
+    for attempt in range(retries + 1):
+        retry = []
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            chunk = pending[start:start + MAX_BATCH_SIZE]
+
+            def callback(request_id, response, exception):
+                index = int(request_id)
+                if exception is not None and is_rate_limit_error(exception) and attempt < retries:
+                    retry.append(index)
+                results[index] = exception if exception is not None else response
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            with limiter.reserve(len(chunk)):
+                batch.execute()
+
+        if not retry:
+            break
+        wait = (2 ** attempt) + random.random()
+        logger.warning(f"{len(retry)} batched requests rate limited, retrying in {wait:.1f} seconds...")
+        limiter.back_off(wait)
+        pending = sorted(retry)
+    return results
+
+
+def list_all(list_method, result_key, **kwargs):
+    """Call a ``list`` method and follow ``nextPageToken`` until every item is collected."""
+    items = []
+    page_token = None
+    while True:
+        params = dict(kwargs, pageToken=page_token) if page_token else kwargs
+        response = list_method(**params).execute()
+        items.extend(response.get(result_key, []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return items
+
+
+def _load_path_cache():
+    try:
+        with open(PATH_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_path_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(PATH_CACHE_FILE, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+
+def resolve_container(service, public_id=GTM_CONTAINER_ID, refresh=False):
+    """Return ``(account_path, container_path, container)`` for a public container ID.
+
+    The answer is persisted under .gtm_cache so later runs skip the account
+    and container listing entirely. Containers of all accounts are listed
+    concurrently on a cache miss.
+    """
+    cache = _load_path_cache()
+    cached = cache.get(public_id)
+    if cached and not refresh:
+        return cached['account_path'], cached['container_path'], cached.get('container', {})
+
+    accounts = list_all(service.accounts().list, 'account')
+
+    def containers_for(account):
+        account_path = f"accounts/{account['accountId']}"
+        # Listing only needs read access; each pool thread gets its own service
+        thread_service = build_service(READONLY_SCOPES)
+        return account_path, list_all(thread_service.accounts().containers().list, 'container',
+                                      parent=account_path)
+
+    with ThreadPoolExecutor(max_workers=DEFAULT_CONCURRENCY) as pool:
+        for account_path, containers in pool.map(containers_for, accounts):
+            for container in containers:
+                if container.get('publicId') == public_id:
+                    container_path = f"{account_path}/containers/{container['containerId']}"
+                    logger.info(f"Found container: {container_path}")
+                    cache[public_id] = {
+                        'account_path': account_path,
+                        'container_path': container_path,
+                        'container': container,
+                    }
+                    _save_path_cache(cache)
+                    return account_path, container_path, container
+
+    logger.error(f"Container with ID {public_id} not found.")
+    return None, None, None
+
+
+def find_container(service, public_id=GTM_CONTAINER_ID):
+    """:func:`resolve_container` for the scripts: also ``(None, None, None)`` on API or credential errors."""
+    try:
+        return resolve_container(service, public_id)
+    except Exception as e:
+        logger.error(f"Error retrieving account and container paths: {e}")
+        return None, None, None
+
+
+def resolve_workspace(service, container_path, public_id=GTM_CONTAINER_ID, refresh=False):
+    """Return the path of the container's first (default) workspace, cached on disk."""
+    cache = _load_path_cache()
+    cached = cache.get(public_id, {})
+    if cached.get('workspace_path') and cached.get('container_path') == container_path and not refresh:
+        return cached['workspace_path']
+
+    workspaces = list_all(service.accounts().containers().workspaces().list, 'workspace',
+                          parent=container_path)
+    if not workspaces:
+        logger.error(f"No workspaces found in {container_path}")
+        return None
+
+    workspace_path = f"{container_path}/workspaces/{workspaces[0]['workspaceId']}"
+    cache.setdefault(public_id, {'container_path': container_path})['workspace_path'] = workspace_path
+    _save_path_cache(cache)
+    return workspace_path
+
+
+def fetch_workspace_state(service, workspace_path):
+    """List tags, triggers, variables and built-in variables in one batch.
+
+    Returns ``{'tag': [...], 'trigger': [...], 'variable': [...], 'builtInVariable': [...]}``.
+    Any listing that returned a further page is completed with follow-up calls.
+    """
+    workspaces = service.accounts().containers().workspaces()
+    listings = [
+        ('tag', workspaces.tags().list),
+        ('trigger', workspaces.triggers().list),
+        ('variable', workspaces.variables().list),
+        ('builtInVariable', workspaces.built_in_variables().list),
+    ]
+    responses = batch_execute(service, [method(parent=workspace_path) for _, method in listings])
+
+    state = {}
+    for (key, method), response in zip(listings, responses):
+        if isinstance(response, Exception):
+            raise response
+        items = response.get(key, [])
+        if response.get('nextPageToken'):
+            items += list_all(method, key, parent=workspace_path, pageToken=response['nextPageToken'])
+        state[key] = items
+    return state
@@ -9,14 +9,16 @@ It configures:
 3. Triggers for page view and custom events
 4. GA4 configuration tag
 5. Event tags for all tracked events (scroll depth, time on page, etc.)
+
+For repeatable runs, gtm_desired_state.py applies the same configuration from
+gtm_spec.json and only writes what the workspace is missing or has changed.
 """
 
 import os
 import json
 import logging
 import time
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
+import gtm_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -26,116 +28,17 @@ logger = logging.getLogger('gtm-configurator')
 # GTM and GA4 configuration
 GTM_CONTAINER_ID = 'GTM-PC9Q9VC3'
 GA4_MEASUREMENT_ID = 'G-3P8MK7MHQF'
-SERVICE_ACCOUNT_FILE = '../GoogleAnalytics/gair-com-au-153c7f6062f4.json'
 API_SCOPES = ['https://www.googleapis.com/auth/tagmanager.edit.containers',
               'https://www.googleapis.com/auth/tagmanager.publish']
 
-# Hardcoded paths from previous runs
-GTM_ACCOUNT_ID = '6275069304'
-GTM_CONTAINER_NUMERIC_ID = '209628263'
-
-def get_credentials():
-    """Get credentials for the Google Tag Manager API."""
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=API_SCOPES)
-        return credentials
-    except Exception as e:
-        logger.error(f"Error getting credentials: {e}")
-        raise
-
 def build_service():
-    """Build the Tag Manager service."""
-    credentials = get_credentials()
-    service = build('tagmanager', 'v2', credentials=credentials)
-    return service
+    """Build the Tag Manager service (shared, rate-limited client)."""
+    return gtm_client.build_service(API_SCOPES)
 
 def get_account_and_container_paths(service):
     """Get account and container paths for the GTM container ID."""
-    try:
-        # List all accounts accessible to the authenticated user
-        accounts = service.accounts().list().execute()
-        
-        # Search for the container in all accounts
-        container_path = None
-        account_path = None
-        
-        for account in accounts.get('account', []):
-            account_id = account['accountId']
-            account_path = f"accounts/{account_id}"
-            
-            try:
-                # List containers in this account
-                containers = service.accounts().containers().list(
-                    parent=account_path).execute()
-                
-                # Find the container with our Container ID (public ID)
-                for container in containers.get('container', []):
-                    if container.get('publicId') == GTM_CONTAINER_ID:
-                        container_id = container['containerId']
-                        container_path = f"{account_path}/containers/{container_id}"
-                        logger.info(f"Found container: {container_path}")
-                        return account_path, container_path
-            except Exception as container_error:
-                logger.warning(f"Error listing containers for account {account_id}: {container_error}")
-                
-                # If we hit a rate limit, wait and retry
-                if "rate" in str(container_error).lower() or "quota" in str(container_error).lower():
-                    wait_time = 60
-                    logger.warning(f"Rate limit hit, pausing for {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    
-                    try:
-                        # Retry listing containers
-                        containers = service.accounts().containers().list(
-                            parent=account_path).execute()
-                        
-                        # Find the container with our Container ID (public ID)
-                        for container in containers.get('container', []):
-                            if container.get('publicId') == GTM_CONTAINER_ID:
-                                container_id = container['containerId']
-                                container_path = f"{account_path}/containers/{container_id}"
-                                logger.info(f"Found container: {container_path}")
-                                return account_path, container_path
-                    except Exception as retry_error:
-                        logger.error(f"Error on retry: {retry_error}")
-        
-        if not container_path:
-            logger.error(f"Container with ID {GTM_CONTAINER_ID} not found.")
-            return None, None
-            
-    except Exception as e:
-        logger.error(f"Error retrieving account and container paths: {e}")
-        
-        # If we hit a rate limit, wait and retry
-        if "rate" in str(e).lower() or "quota" in str(e).lower():
-            wait_time = 60
-            logger.warning(f"Rate limit hit, pausing for {wait_time} seconds before retry...")
-            time.sleep(wait_time)
-            
-            try:
-                # Retry listing accounts
-                accounts = service.accounts().list().execute()
-                
-                for account in accounts.get('account', []):
-                    account_id = account['accountId']
-                    account_path = f"accounts/{account_id}"
-                    
-                    # List containers in this account
-                    containers = service.accounts().containers().list(
-                        parent=account_path).execute()
-                    
-                    # Find the container with our Container ID (public ID)
-                    for container in containers.get('container', []):
-                        if container.get('publicId') == GTM_CONTAINER_ID:
-                            container_id = container['containerId']
-                            container_path = f"{account_path}/containers/{container_id}"
-                            logger.info(f"Found container on retry: {container_path}")
-                            return account_path, container_path
-            except Exception as retry_error:
-                logger.error(f"Error on retry: {retry_error}")
-        
-        return None, None
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    return account_path, container_path
 
 def create_workspace(service, container_path):
     """Create a new workspace for the configuration."""
@@ -635,10 +538,11 @@ def main_step_1():
     # Build the service
     service = build_service()
     
-    # Use hardcoded paths to avoid API rate limits
-    account_path = f"accounts/{GTM_ACCOUNT_ID}"
-    container_path = f"{account_path}/containers/{GTM_CONTAINER_NUMERIC_ID}"
-    logger.info(f"Using hardcoded container path: {container_path}")
+    account_path, container_path, _ = gtm_client.find_container(service, GTM_CONTAINER_ID)
+    if not container_path:
+        logger.error("Container not found, exiting.")
+        return False, None, None
+    logger.info(f"Using container path: {container_path}")
     
     # Create a workspace
     workspace_path = create_workspace(service, container_path)
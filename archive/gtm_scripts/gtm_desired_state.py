@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Declarative GTM configuration: make a workspace match gtm_spec.json.
+
+gtm_configurator.py creates every variable, trigger and tag one call at a
+time and has to be re-run in steps. This script instead:
+
+1. Lists the workspace's tags, triggers, variables and built-in variables
+   in one batched request (gtm_client.fetch_workspace_state)
+2. Diffs them against the spec by name
+3. Issues only the create/update/delete calls needed, in dependency order
+   (built-in variables, variables, triggers, then tags), with independent
+   calls of each phase running in parallel
+
+A workspace that already matches the spec costs a single batched listing.
+
+Tags name their firing triggers (``firingTrigger``) instead of using trigger
+IDs; the IDs are filled in at apply time. Entities that exist in the
+workspace but not in the spec are left alone unless ``--prune`` is given.
+
+For offline runs, ``--record FILE`` saves the fetched workspace state and
+``--recorded FILE`` replays a saved state through :class:`FakeTagManager`,
+an in-memory stand-in for the Tag Manager API that also counts calls.
+
+Usage:
+    python gtm_desired_state.py --dry-run
+    python gtm_desired_state.py --publish
+    python gtm_desired_state.py --recorded snapshot.json
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import gtm_client
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('gtm-desired-state')
+
+SPEC_FILE = os.path.join(gtm_client.SCRIPT_DIR, 'gtm_spec.json')
+
+# Entity kinds in the order they must be created; deletes run in reverse
+KINDS = ['builtInVariable', 'variable', 'trigger', 'tag']
+SPEC_KEYS = {'builtInVariable': 'builtInVariables', 'variable': 'variables',
+             'trigger': 'triggers', 'tag': 'tags'}
+ID_FIELDS = {'variable': 'variableId', 'trigger': 'triggerId', 'tag': 'tagId'}
+
+# Fields the spec manages; anything else the API returns is ignored by the diff
+MANAGED_FIELDS = ['name', 'type', 'notes', 'parameter', 'customEventFilter', 'filter',
+                  'autoEventFilter', 'firingTrigger', 'blockingTrigger']
+
+
+@dataclass(frozen=True)
+class Change:
+    """One API write needed to bring the workspace in line with the spec."""
+    action: str
+    kind: str
+    name: str
+    body: dict = field(default=None, compare=False)
+    path: str = None
+    fingerprint: str = None
+
+
+def load_spec(path=SPEC_FILE):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _canonical(entity, trigger_names=None):
+    """Reduce an entity to its managed fields in a comparable form.
+
+    Top-level parameters are sorted by key (the API does not preserve their
+    order) and trigger IDs are replaced by trigger names.
+    """
+    entity = dict(entity)
+    if trigger_names is not None:
+        for ids_key, names_key in (('firingTriggerId', 'firingTrigger'), ('blockingTriggerId', 'blockingTrigger')):
+            if ids_key in entity:
+                entity[names_key] = [trigger_names.get(i, i) for i in entity.pop(ids_key)]
+    canonical = {key: entity[key] for key in MANAGED_FIELDS if entity.get(key)}
+    if 'parameter' in canonical:
+        canonical['parameter'] = sorted(canonical['parameter'], key=lambda p: p.get('key', ''))
+    for key in ('firingTrigger', 'blockingTrigger'):
+        if key in canonical:
+            canonical[key] = sorted(canonical[key])
+    return canonical
+
+
+def plan(spec, state, prune=False):
+    """Return the list of :class:`Change` objects that turn ``state`` into ``spec``."""
+    changes = []
+
+    enabled = {v['type'] for v in state.get('builtInVariable', [])}
+    wanted = spec.get('builtInVariables', [])
+    missing = [t for t in wanted if t not in enabled]
+    if missing:
+        changes.append(Change('create', 'builtInVariable', ', '.join(missing), body={'type': missing}))
+    extra = sorted(enabled - set(wanted))
+    if prune and extra:
+        changes.append(Change('delete', 'builtInVariable', ', '.join(extra), body={'type': extra}))
+
+    trigger_names = {t['triggerId']: t['name'] for t in state.get('trigger', [])}
+    for kind in KINDS[1:]:
+        existing = {entity['name']: entity for entity in state.get(kind, [])}
+        desired = spec.get(SPEC_KEYS[kind], [])
+        for body in desired:
+            current = existing.get(body['name'])
+            if current is None:
+                changes.append(Change('create', kind, body['name'], body=body))
+            elif _canonical(current, trigger_names) != _canonical(body):
+                changes.append(Change('update', kind, body['name'], body=body,
+                                      path=current['path'], fingerprint=current.get('fingerprint')))
+        if prune:
+            desired_names = {body['name'] for body in desired}
+            for name, current in existing.items():
+                if name not in desired_names:
+                    changes.append(Change('delete', kind, name, path=current['path']))
+    return changes
+
+
+def _resolve_triggers(body, trigger_ids):
+    """Replace trigger names in a tag body with the workspace's trigger IDs."""
+    body = copy.deepcopy(body)
+    for names_key, ids_key in (('firingTrigger', 'firingTriggerId'), ('blockingTrigger', 'blockingTriggerId')):
+        if names_key in body:
+            names = body.pop(names_key)
+            unknown = [n for n in names if n not in trigger_ids]
+            if unknown:
+                raise ValueError(f"Tag {body['name']} references unknown triggers: {', '.join(unknown)}")
+            body[ids_key] = [trigger_ids[n] for n in names]
+    return body
+
+
+def _tag_waves(changes):
+    """Split tag writes so tags referenced by other tags (e.g. GA4 Configuration) go first."""
+    referenced = set()
+    for change in changes:
+        for param in (change.body or {}).get('parameter', []):
+            if param.get('type') == 'tag_reference':
+                referenced.add(param.get('value'))
+    first = [c for c in changes if c.name in referenced]
+    return [wave for wave in (first, [c for c in changes if c.name not in referenced]) if wave]
+
+
+def _execute_change(service, workspace_path, change, trigger_ids):
+    workspaces = service.accounts().containers().workspaces()
+    if change.kind == 'builtInVariable':
+        builtins = workspaces.built_in_variables()
+        if change.action == 'create':
+            return builtins.create(parent=workspace_path, type=change.body['type']).execute()
+        return builtins.delete(path=f"{workspace_path}/built_in_variables",
+                               type=change.body['type']).execute()
+
+    collection = {'variable': workspaces.variables, 'trigger': workspaces.triggers,
+                  'tag': workspaces.tags}[change.kind]()
+    if change.action == 'delete':
+        return collection.delete(path=change.path).execute()
+    body = _resolve_triggers(change.body, trigger_ids) if change.kind == 'tag' else change.body
+    if change.action == 'create':
+        return collection.create(parent=workspace_path, body=body).execute()
+    return collection.update(path=change.path, fingerprint=change.fingerprint, body=body).execute()
+
+
+def apply(changes, workspace_path, state, service_factory, workers=gtm_client.DEFAULT_CONCURRENCY):
+    """Execute ``changes`` phase by phase, running each phase's calls in parallel.
+
+    ``service_factory`` is called in each worker thread to get a service
+    (gtm_client keeps one per thread). Returns ``(applied, failed)`` lists.
+    """
+    trigger_ids = {t['name']: t['triggerId'] for t in state.get('trigger', [])}
+    applied, failed = [], []
+
+    deletes = [c for c in changes if c.action == 'delete']
+    writes = [c for c in changes if c.action != 'delete']
+    phases = [[c for c in deletes if c.kind == kind] for kind in reversed(KINDS)]
+    for kind in KINDS:
+        phase = [c for c in writes if c.kind == kind]
+        phases.extend(_tag_waves(phase) if kind == 'tag' else [phase])
+
+    def run(change):
+        try:
+            return change, _execute_change(service_factory(), workspace_path, change, trigger_ids), None
+        except Exception as e:
+            return change, None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for phase in phases:
+            for change, result, error in pool.map(run, phase):
+                if error is not None:
+                    logger.error(f"Failed to {change.action} {change.kind} {change.name}: {error}")
+                    failed.append(change)
+                    continue
+                logger.info(f"{change.action.capitalize()}d {change.kind}: {change.name}")
+                applied.append(change)
+                if change.kind == 'trigger' and change.action != 'delete':
+                    trigger_ids[change.name] = result['triggerId']
+    return applied, failed
+
+
+def publish(service, container_path, workspace_path):
+    """Create a version from the workspace and publish it."""
+    version = service.accounts().containers().workspaces().create_version(
+        path=workspace_path,
+        body={"name": "GTM API Configuration", "notes": "Applied from gtm_spec.json"}
+    ).execute()
+    version_id = version.get('containerVersion', {}).get('containerVersionId')
+    if not version_id:
+        logger.error("No version created, cannot publish")
+        return False
+    service.accounts().containers().versions().publish(
+        path=f"{container_path}/versions/{version_id}"
+    ).execute()
+    logger.info(f"Published version: {version_id}")
+    return True
+
+
+class _FakeRequest:
+    def __init__(self, fake, method, target, call):
+        self._fake = fake
+        self.method = method
+        self.target = target
+        self._call = call
+
+    def execute(self, http=None, num_retries=0):
+        with self._fake.lock:
+            self._fake.calls.append((self.method, self.target))
+            return self._call()
+
+
+class _FakeBatch:
+    def __init__(self, callback):
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self, http=None):
+        for request_id, request in self._requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as e:
+                response, exception = None, e
+            self._callback(request_id, response, exception)
+
+
+class _FakeCollection:
+    def __init__(self, fake, kind):
+        self._fake = fake
+        self._kind = kind
+        self._id_field = ID_FIELDS[kind]
+        self._url_part = {'variable': 'variables', 'trigger': 'triggers', 'tag': 'tags'}[kind]
+
+    def _items(self):
+        return self._fake.state.setdefault(self._kind, [])
+
+    def _find(self, path):
+        for item in self._items():
+            if item['path'] == path:
+                return item
+        raise KeyError(f"{path} not found")
+
+    def list(self, parent, pageToken=None):
+        return _FakeRequest(self._fake, f'{self._kind}.list', parent,
+                            lambda: {self._kind: copy.deepcopy(self._items())})
+
+    def create(self, parent, body):
+        def call():
+            if any(item['name'] == body['name'] for item in self._items()):
+                raise ValueError(f"Duplicate {self._kind} name: {body['name']}")
+            entity_id = str(next(self._fake.ids))
+            entity = dict(copy.deepcopy(body), path=f"{parent}/{self._url_part}/{entity_id}",
+                          fingerprint=str(next(self._fake.ids)))
+            entity[self._id_field] = entity_id
+            self._items().append(entity)
+            return copy.deepcopy(entity)
+        return _FakeRequest(self._fake, f'{self._kind}.create', parent, call)
+
+    def update(self, path, body, fingerprint=None):
+        def call():
+            entity = self._find(path)
+            if fingerprint is not None and fingerprint != entity.get('fingerprint'):
+                raise ValueError(f"Fingerprint mismatch for {path}")
+            preserved = {key: entity[key] for key in ('path', self._id_field)}
+            entity.clear()
+            entity.update(copy.deepcopy(body), fingerprint=str(next(self._fake.ids)), **preserved)
+            return copy.deepcopy(entity)
+        return _FakeRequest(self._fake, f'{self._kind}.update', path, call)
+
+    def delete(self, path):
+        def call():
+            self._items().remove(self._find(path))
+            return {}
+        return _FakeRequest(self._fake, f'{self._kind}.delete', path, call)
+
+
+class _FakeBuiltInVariables:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def _items(self):
+        return self._fake.state.setdefault('builtInVariable', [])
+
+    def list(self, parent, pageToken=None):
+        return _FakeRequest(self._fake, 'builtInVariable.list', parent,
+                            lambda: {'builtInVariable': copy.deepcopy(self._items())})
+
+    def create(self, parent, type):
+        def call():
+            created = [{'type': t, 'name': t, 'path': f"{parent}/built_in_variables"}
+                       for t in type if t not in {v['type'] for v in self._items()}]
+            self._items().extend(created)
+            return {'builtInVariable': created}
+        return _FakeRequest(self._fake, 'builtInVariable.create', parent, call)
+
+    def delete(self, path, type):
+        def call():
+            self._fake.state['builtInVariable'] = [v for v in self._items() if v['type'] not in type]
+            return {}
+        return _FakeRequest(self._fake, 'builtInVariable.delete', path, call)
+
+
+class FakeTagManager:
+    """In-memory Tag Manager API covering the calls this script makes.
+
+    Built from a recorded workspace state (the output of
+    ``gtm_client.fetch_workspace_state``); every executed request is
+    appended to ``calls`` as ``(method, path)``. It stands in for both the
+    service object and ``service.accounts().containers()``.
+    """
+
+    def __init__(self, state):
+        self.state = copy.deepcopy(state)
+        self.calls = []
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1000)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as f:
+            recording = json.load(f)
+        return cls(recording['state']), recording['container_path'], recording['workspace_path']
+
+    def accounts(self):
+        return self
+
+    def containers(self):
+        return self
+
+    def workspaces(self):
+        return self
+
+    def tags(self):
+        return _FakeCollection(self, 'tag')
+
+    def triggers(self):
+        return _FakeCollection(self, 'trigger')
+
+    def variables(self):
+        return _FakeCollection(self, 'variable')
+
+    def built_in_variables(self):
+        return _FakeBuiltInVariables(self)
+
+    def versions(self):
+        return self
+
+    def create_version(self, path, body):
+        return _FakeRequest(self, 'workspace.create_version', path,
+                            lambda: {'containerVersion': {'containerVersionId': str(next(self.ids))}})
+
+    def publish(self, path):
+        return _FakeRequest(self, 'version.publish', path, lambda: {})
+
+    def new_batch_http_request(self, callback):
+        return _FakeBatch(callback)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Make a GTM workspace match a declarative spec.')
+    parser.add_argument('--spec', default=SPEC_FILE, help='spec file (default: %(default)s)')
+    parser.add_argument('--workspace', help='workspace path (default: the container\'s first workspace)')
+    parser.add_argument('--dry-run', action='store_true', help='print the plan without applying it')
+    parser.add_argument('--prune', action='store_true', help='delete entities that are not in the spec')
+    parser.add_argument('--publish', action='store_true', help='create and publish a version after applying')
+    parser.add_argument('--workers', type=int, default=gtm_client.DEFAULT_CONCURRENCY,
+                        help='parallel API calls per phase (default: %(default)s)')
+    parser.add_argument('--record', metavar='FILE', help='save the fetched workspace state to FILE')
+    parser.add_argument('--recorded', metavar='FILE',
+                        help='run against a recorded workspace state instead of the live API')
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+
+    if args.recorded:
+        fake, container_path, workspace_path = FakeTagManager.from_file(args.recorded)
+        service = fake
+        service_factory = lambda: fake
+    else:
+        service = gtm_client.build_service(gtm_client.EDIT_SCOPES)
+        service_factory = lambda: gtm_client.build_service(gtm_client.EDIT_SCOPES)
+        public_id = spec.get('container', gtm_client.GTM_CONTAINER_ID)
+        _, container_path, _ = gtm_client.find_container(service, public_id)
+        if not container_path:
+            return False
+        workspace_path = args.workspace or gtm_client.resolve_workspace(service, container_path, public_id)
+        if not workspace_path:
+            return False
+
+    state = gtm_client.fetch_workspace_state(service, workspace_path)
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump({'container_path': container_path, 'workspace_path': workspace_path,
+                       'state': state}, f, indent=2)
+        logger.info(f"Recorded workspace state to {args.record}")
+
+    changes = plan(spec, state, prune=args.prune)
+    for change in changes:
+        print(f"{change.action:>6} {change.kind}: {change.name}")
+    if not changes:
+        print("Workspace already matches the spec.")
+
+    ok = True
+    if changes and not args.dry_run:
+        applied, failed = apply(changes, workspace_path, state, service_factory, workers=args.workers)
+        print(f"Applied {len(applied)} changes, {len(failed)} failed.")
+        ok = not failed
+    if ok and args.publish and changes and not args.dry_run:
+        ok = publish(service, container_path, workspace_path)
+
+    if args.recorded:
+        counts = Counter(method for method, _ in fake.calls)
+        print(f"{len(fake.calls)} API calls: " + ', '.join(f"{m} x{n}" for m, n in sorted(counts.items())))
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -7,8 +7,7 @@ and validating if the required tags, triggers, and variables are set up.
 
 import os
 import logging
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
+import gtm_client
 import json
 
 # Set up logging
@@ -18,58 +17,15 @@ logger = logging.getLogger('gtm-verifier')
 
 # GTM configuration
 GTM_CONTAINER_ID = 'GTM-PC9Q9VC3'
-SERVICE_ACCOUNT_FILE = '../GoogleAnalytics/gair-com-au-153c7f6062f4.json'
 API_SCOPES = ['https://www.googleapis.com/auth/tagmanager.readonly']
 
-def get_credentials():
-    """Get credentials for the Google Tag Manager API."""
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=API_SCOPES)
-        return credentials
-    except Exception as e:
-        logger.error(f"Error getting credentials: {e}")
-        raise
-
 def build_service():
-    """Build the Tag Manager service."""
-    credentials = get_credentials()
-    service = build('tagmanager', 'v2', credentials=credentials)
-    return service
+    """Build the Tag Manager service (shared, rate-limited client)."""
+    return gtm_client.build_service(API_SCOPES)
 
 def get_account_and_container_paths(service):
     """Get account and container paths for the GTM container ID."""
-    try:
-        # List all accounts accessible to the authenticated user
-        accounts = service.accounts().list().execute()
-        
-        container_path = None
-        account_path = None
-        container_info = None
-        
-        for account in accounts.get('account', []):
-            account_id = account['accountId']
-            account_path = f"accounts/{account_id}"
-            
-            # List containers in this account
-            containers = service.accounts().containers().list(
-                parent=account_path).execute()
-            
-            # Find the container with our Container ID (public ID)
-            for container in containers.get('container', []):
-                if container.get('publicId') == GTM_CONTAINER_ID:
-                    container_id = container['containerId']
-                    container_path = f"{account_path}/containers/{container_id}"
-                    container_info = container
-                    logger.info(f"Found container: {container_path}")
-                    return account_path, container_path, container_info
-        
-        logger.error(f"Container with ID {GTM_CONTAINER_ID} not found.")
-        return None, None, None
-            
-    except Exception as e:
-        logger.error(f"Error retrieving account and container paths: {e}")
-        return None, None, None
+    return gtm_client.find_container(service, GTM_CONTAINER_ID)
 
 def check_published_version(service, container_path):
     """Check if there's a published version for the container."""
@@ -0,0 +1,206 @@
+"""
+Startup-time index of the on-disk artifacts served by the portfolio routes.
+
+Routes used to probe a list of candidate locations with ``os.path.exists`` on
+every request. The registry resolves those candidates once at startup (and
+again on ``SIGUSR2`` or from an optional polling watcher) so the request path
+is a plain dictionary lookup with no filesystem stats.
+
+Paths that were collapsed into the content-addressed :mod:`blobstore` resolve
+to their stored object, with the digest taken from the store's index.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import signal
+import threading
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """A resolved artifact: where it lives and what it contains."""
+    name: str
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+
+    @property
+    def etag(self):
+        return self.sha256[:32]
+
+
+def hash_file(path):
+    """Return the hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactRegistry:
+    """Maps logical artifact names to resolved files.
+
+    Two kinds of entries can be registered:
+
+    * named artifacts, resolved from an ordered list of candidate paths
+      (the first existing candidate wins), and
+    * trees, where every file under a set of root directories with a matching
+      suffix is indexed as ``<prefix>/<relative path>``. Earlier roots shadow
+      later ones, mirroring the static -> archive fallback used by the routes.
+
+    With a :class:`blobstore.BlobStore`, a path missing on disk but present in
+    the store's index counts as existing.
+    """
+
+    def __init__(self, sources=None, trees=None, root='.', blobs=None):
+        self.root = root
+        self.blobs = blobs
+        self._sources = dict(sources or {})
+        self._trees = dict(trees or {})
+        self._index = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def init_app(self, app):
+        """Bind the registry to an app, build the index and install refresh hooks."""
+        self.root = app.root_path
+        app.extensions['artifacts'] = self
+        self.refresh()
+        self.install_signal_handler()
+
+        interval = app.config.get('ARTIFACT_WATCH_INTERVAL', 0)
+        if interval:
+            self.start_watcher(interval)
+
+    def register(self, name, candidates):
+        """Register a named artifact resolved from ordered candidate paths."""
+        self._sources[name] = list(candidates)
+
+    def register_tree(self, prefix, roots, suffixes=None):
+        """Index every file under ``roots`` as ``<prefix>/<relative path>``."""
+        self._trees[prefix] = (list(roots), tuple(suffixes) if suffixes else None)
+
+    def get(self, name):
+        """Return the :class:`Artifact` for ``name`` or ``None`` if it was not found."""
+        return self._index.get(name)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index.values())
+
+    def _abspath(self, path):
+        return os.path.join(self.root, path)
+
+    def _exists(self, path):
+        return os.path.isfile(self._abspath(path)) or (self.blobs is not None and path in self.blobs)
+
+    def _resolve(self, name, path):
+        full_path = self._abspath(path)
+        if not os.path.isfile(full_path) and self.blobs is not None:
+            entry = self.blobs.lookup(path)
+            return Artifact(name=name, path=self.blobs.object_path(entry.sha256), size=entry.size,
+                            mtime=entry.mtime, sha256=entry.sha256)
+        stat = os.stat(full_path)
+        return Artifact(name=name, path=full_path, size=stat.st_size,
+                        mtime=stat.st_mtime, sha256=hash_file(full_path))
+
+    def _walk_tree(self, prefix, roots, suffixes):
+        for root in roots:
+            base = self._abspath(root)
+            paths = set()
+            for dirpath, _, filenames in os.walk(base):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    paths.add(os.path.relpath(full_path, self.root).replace(os.sep, '/'))
+            if self.blobs is not None:
+                paths.update(self.blobs.walk(root))
+            for path in sorted(paths):
+                if suffixes and not path.endswith(suffixes):
+                    continue
+                yield f'{prefix}/{posixpath.relpath(path, root)}', path
+
+    def refresh(self):
+        """Rebuild the index from disk and swap it in atomically."""
+        if self.blobs is not None:
+            self.blobs.load()
+        index = {}
+        for name, candidates in self._sources.items():
+            for path in candidates:
+                if self._exists(path):
+                    index[name] = self._resolve(name, path)
+                    break
+            else:
+                logger.warning("Artifact %s not found in any location", name)
+
+        for prefix, (roots, suffixes) in self._trees.items():
+            for name, path in self._walk_tree(prefix, roots, suffixes):
+                if name not in index:
+                    index[name] = self._resolve(name, path)
+
+        with self._lock:
+            self._index = index
+        logger.info("Artifact index built with %d entries", len(index))
+        return index
+
+    def install_signal_handler(self, signum=signal.SIGUSR2):
+        """Refresh the index when the process receives ``signum``.
+
+        Signal handlers can only be installed from the main thread, so this is
+        a no-op anywhere else.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signum, lambda *_: self.refresh())
+        return True
+
+    def _signature(self):
+        """Cheap fingerprint of everything the index depends on."""
+        signature = []
+        paths = [path for candidates in self._sources.values() for path in candidates]
+        for roots, suffixes in self._trees.values():
+            paths.extend(path for _, path in self._walk_tree('', roots, suffixes))
+        if self.blobs is not None:
+            paths.append(self.blobs.index_path)
+        for path in paths:
+            try:
+                stat = os.stat(self._abspath(path))
+            except OSError:
+                signature.append((path, None))
+            else:
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return signature
+
+    def start_watcher(self, interval):
+        """Poll the candidate paths every ``interval`` seconds and refresh on change.
+
+        The polling happens on a daemon thread, off the request path.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return self._watcher
+
+        def watch():
+            last = self._signature()
+            while True:
+                time.sleep(interval)
+                try:
+                    current = self._signature()
+                    if current != last:
+                        self.refresh()
+                        last = current
+                except Exception as e:
+                    logger.error(f"Artifact watcher failed: {str(e)}")
+
+        self._watcher = threading.Thread(target=watch, name='artifact-watcher', daemon=True)
+        self._watcher.start()
+        return self._watcher
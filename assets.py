@@ -0,0 +1,201 @@
+"""
+Build step and template helper for fingerprinted static assets.
+
+``python assets.py`` minifies everything under ``static/css`` and
+``static/js``, writes each file to ``static/dist`` with a content hash in its
+name (``css/custom.3f2a9c1b0d.css``), stores ``.gz``/``.br`` siblings next to
+it and records the mapping in ``static/dist/manifest.json``.
+
+Templates call ``asset_url('css/custom.css')`` instead of
+``url_for('static', filename=...)``. With a manifest present that resolves to
+the fingerprinted file, which is served with a one-year ``immutable``
+``Cache-Control``; a new deploy changes the URL rather than the content
+behind it. Without a manifest (a fresh checkout, or during development) it
+falls back to the plain static URL.
+
+JavaScript is minified only when the optional ``rjsmin`` package is
+installed; CSS uses ``rcssmin`` when available and a conservative built-in
+minifier otherwise.
+"""
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+from flask import request, url_for
+
+import compression
+
+try:
+    import rcssmin
+except ImportError:  # pragma: no cover - optional dependency
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # pragma: no cover - optional dependency
+    rjsmin = None
+
+SOURCE_DIRS = ('css', 'js')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+IMMUTABLE_MAX_AGE = 31536000
+
+_css_comment = re.compile(r'/\*.*?\*/', re.DOTALL)
+_css_space = re.compile(r'\s+')
+_css_punctuation = re.compile(r'\s*([{};,])\s*')
+_css_url = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    text = _css_comment.sub('', text)
+    text = _css_space.sub(' ', text)
+    text = _css_punctuation.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    return text
+
+
+def rebase_css_urls(text, source, target):
+    """Rewrite relative ``url()`` references so they still resolve from ``target``.
+
+    ``source`` and ``target`` are paths relative to the static folder.
+    """
+    source_dir, target_dir = posixpath.dirname(source), posixpath.dirname(target)
+
+    def rebase(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z]+:|/|#|data:)', url, re.IGNORECASE):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(source_dir, url))
+        return f'url({quote}{posixpath.relpath(resolved, target_dir)}{quote})'
+
+    return _css_url.sub(rebase, text)
+
+
+def fingerprint(path, content):
+    """``css/custom.css`` -> ``css/custom.<hash>.css``."""
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{digest}{ext}'
+
+
+def build(static_folder, source_dirs=SOURCE_DIRS, clean=True):
+    """Build every asset under ``source_dirs`` into ``static/dist``; returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for source_dir in source_dirs:
+        for dirpath, _, filenames in os.walk(os.path.join(static_folder, source_dir)):
+            for filename in sorted(filenames):
+                ext = os.path.splitext(filename)[1]
+                if ext not in ('.css', '.js'):
+                    continue
+                source = posixpath.relpath(os.path.join(dirpath, filename), static_folder).replace(os.sep, '/')
+                with open(os.path.join(static_folder, source), 'r', encoding='utf-8') as f:
+                    text = f.read()
+
+                if ext == '.css':
+                    text = rebase_css_urls(minify_css(text), source, posixpath.join(DIST_DIR, source))
+                else:
+                    text = minify_js(text)
+                content = text.encode('utf-8')
+
+                target = fingerprint(source, content)
+                output = os.path.join(dist, *target.split('/'))
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+                with open(output, 'wb') as f:
+                    f.write(content)
+                for encoding, body in compression.encode_variants(content).items():
+                    suffix = '.br' if encoding == 'br' else '.gz'
+                    with open(output + suffix, 'wb') as f:
+                        f.write(body)
+                manifest[source] = posixpath.join(DIST_DIR, target)
+
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if clean:
+        _remove_stale(dist, manifest)
+    return manifest
+
+
+def _remove_stale(dist, manifest):
+    """Delete fingerprinted files (and their compressed siblings) a previous build left behind."""
+    current = {posixpath.relpath(path, DIST_DIR) for path in manifest.values()}
+    for dirpath, _, filenames in os.walk(dist):
+        for filename in filenames:
+            relative = posixpath.relpath(os.path.join(dirpath, filename), dist).replace(os.sep, '/')
+            if relative == MANIFEST_NAME:
+                continue
+            base = re.sub(r'\.(gz|br)$', '', relative)
+            if base not in current:
+                os.remove(os.path.join(dirpath, filename))
+
+
+class AssetManifest:
+    """Resolves static paths to their fingerprinted build output."""
+
+    def __init__(self):
+        self.manifest = {}
+        self._path = None
+        self._mtime = None
+
+    def init_app(self, app):
+        self._path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+        self.reload()
+        app.add_template_global(self.asset_url)
+        app.after_request(self._cache_headers)
+        app.extensions['assets'] = self
+
+    def reload(self):
+        """Load the manifest if it exists and changed since the last load."""
+        try:
+            mtime = os.path.getmtime(self._path)
+        except OSError:
+            self.manifest, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(self._path, 'r') as f:
+                self.manifest = json.load(f)
+            self._mtime = mtime
+
+    def asset_url(self, filename):
+        """``url_for('static', ...)`` for the fingerprinted copy of ``filename`` when one was built."""
+        return url_for('static', filename=self.manifest.get(filename, filename))
+
+    def _cache_headers(self, response):
+        # Fingerprinted files never change under the same URL
+        if request.endpoint == 'static' and response.status_code in (200, 304) and \
+                request.view_args.get('filename', '').startswith(f'{DIST_DIR}/'):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Minify, fingerprint and precompress static assets.')
+    parser.add_argument('--static-folder', default=os.path.join(root, 'static'),
+                        help='static folder to build from and into (default: %(default)s)')
+    parser.add_argument('--keep-stale', action='store_true',
+                        help='keep files from previous builds that are no longer in the manifest')
+    args = parser.parse_args()
+
+    manifest = build(args.static_folder, clean=not args.keep_stale)
+    for source, target in sorted(manifest.items()):
+        print(f"{source} -> {target}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,960 @@
+/*
+ * Points Cost Forecast - Local (SQLite) Port
+ * ==========================================
+ *
+ * Purpose: Points_Cost_Forecast_Production.sql rewritten for SQLite so the whole
+ *          table DAG can run locally on fixture data (python forecast_pipeline.py).
+ *
+ * Dialect changes:
+ *  - BigQuery source tables are replaced by local src_* tables:
+ *      dim_date_v                    -> src_dim_date
+ *      BigW_Destination_Business     -> src_destination_business
+ *      fin_bigw_profit_v             -> src_fin_profit
+ *      bi_article_sales_bigw         -> src_article_sales
+ *      dim_article_master_v          -> src_article_master
+ *      bigw_campaign_details_...     -> src_campaign_plan
+ *      EDX_offer_details             -> src_edx_offer_details
+ *  - CURRENT_DATE() / CURRENT_TIMESTAMP() read run_context (as_of, extracted_at).
+ *  - SAFE_DIVIDE, INITCAP, SPLIT(...)[OFFSET(n)] and STRING_AGG(DISTINCT ...) are
+ *    functions registered by the pipeline (safe_divide, initcap, split_part,
+ *    string_agg_distinct); FORMAT_DATE('%a') is computed from strftime('%w');
+ *    GENERATE_UUID() is a random hex string; REGEXP_CONTAINS becomes LIKE.
+ *  - ORDER BY on table builds is dropped; order the dashboard queries instead.
+ *
+ * Fixes to the production logic (each marked "Port fix" below):
+ *  - Weekly facts join a one-row-per-week calendar, not dim_date's seven days.
+ *  - Category campaigns are charged to their own category, storewide ones are
+ *    spread by sales proportion once (not once per business/category row).
+ *  - dashboard_data joins on fiscal week (finance_mapped has no CalendarDay),
+ *    pre-aggregates each fact and spreads weekly values over days with
+ *    dim_day_of_week_weights, so rows no longer fan out. The last actual date
+ *    is the end of the latest week with actual sales, capped at as_of.
+ *  - campaign_costs_forecast_daily keeps FiscalWeekStartDate, and the sales
+ *    forecast used to spread storewide campaigns is summed per business/category
+ *    instead of picking one row with QUALIFY.
+ *
+ * Incremental refresh:
+ *  Each table is rebuilt in full, or - when annotated "-- refresh: <column>" -
+ *  only for the <column> values (a dim_date column) of the fiscal weeks whose
+ *  inputs changed. Those values are in the refresh_keys(key) table, and every
+ *  annotated statement must restrict its rows with "<column> IN (SELECT key FROM
+ *  refresh_keys)". The rows for one key may only depend on inputs for weeks
+ *  that share that key.
+ */
+
+-- =====================================================================================
+-- STEP 1: CREATE COMMON DIMENSION TABLES
+-- =====================================================================================
+
+-- Calendar dimension for FY24 and FY25
+CREATE TABLE dim_date AS
+SELECT
+    CalendarDay,
+    FiscalWeekYear,
+    FiscalWeek,
+    FiscalWeekEndDate,
+    FiscalYear,
+    CAST(FiscalYear AS TEXT) || substr('000' || BigWFiscalYearPeriod, -3) AS Fiscal_Period,
+    FiscalWeekStartDate,
+    BigWFiscalYear,
+    BigWFiscalYearPeriod,
+    BigWFiscalWeek,
+    substr('SunMonTueWedThuFriSat', 1 + 3 * strftime('%w', CalendarDay), 3) AS DayOfWeek,
+    WeekDayNumber
+FROM src_dim_date
+WHERE FiscalYear IN (2024, 2025);
+
+-- Business category mapping dimension
+CREATE TABLE dim_business_category AS
+SELECT DISTINCT
+    bd.Business,
+    bd.Category,
+    bd.SubCategory
+FROM src_destination_business bd
+UNION ALL
+SELECT 'General', 'General', 'General'
+UNION ALL
+SELECT NULL, NULL, NULL;
+
+-- Day-of-week weights for distributing weekly values to daily
+CREATE TABLE dim_day_of_week_weights AS
+SELECT
+    DayOfWeek,
+    CASE
+        WHEN DayOfWeek = 'Mon' THEN 0.11177997
+        WHEN DayOfWeek = 'Tue' THEN 0.127127373
+        WHEN DayOfWeek = 'Wed' THEN 0.134606815
+        WHEN DayOfWeek = 'Thu' THEN 0.163947143
+        WHEN DayOfWeek = 'Fri' THEN 0.153884247
+        WHEN DayOfWeek = 'Sat' THEN 0.178675994
+        WHEN DayOfWeek = 'Sun' THEN 0.129978458
+        ELSE 0
+    END AS daily_weight
+FROM (
+    SELECT DISTINCT substr('SunMonTueWedThuFriSat', 1 + 3 * strftime('%w', CalendarDay), 3) AS DayOfWeek
+    FROM src_dim_date
+);
+
+-- =====================================================================================
+-- STEP 2: EXTRACT FINANCE ACTUALS AND FORECASTS
+-- =====================================================================================
+
+-- Finance actuals - actual sales and financial metrics from the finance system
+-- refresh: FiscalWeekStartDate
+CREATE TABLE finance_actuals AS
+SELECT
+    dd.FiscalYear,
+    dd.FiscalWeekYear,
+    dd.FiscalWeek,
+    dd.FiscalWeekStartDate,
+    dd.Fiscal_Period,
+    fp.MerchandiseManager_Department AS Business_profit_v,
+    fp.Category,
+    substr(fp.Category, 3) AS CategoryWithoutCompanyCode,
+    fp.Category_Description AS Category_Description_profit_v,
+    CASE
+        WHEN fp.Sales_Channel LIKE 'HD%' THEN 'Online'
+        WHEN fp.Sales_Channel LIKE 'CC%' THEN 'Online'
+        ELSE 'Instore'
+    END AS SalesChannel_Cat,
+    SUM(fp.Sales_InclTax) AS Sales_InclGST,
+    SUM(fp.Sales_ExclTax) AS Net_Sales,
+    SUM(fp.Scanback) AS Scanback,
+    SUM(fp.Total_Discounts + fp.LoyaltyRewards) AS Total_Discounts_And_Rewards,
+    SUM(fp.COGS) AS COGS,
+    SUM(fp.Gross_Profit) AS Gross_Profit,
+    (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+FROM dim_date dd
+INNER JOIN src_fin_profit fp ON fp.Calendar_Day = dd.CalendarDay
+WHERE fp.SalesOrg IN ('1060')
+  AND fp.Calendar_Day BETWEEN '2023-06-26' AND (SELECT as_of FROM run_context)
+  AND fp.MerchandiseManager_Code NOT IN ('MM922_AU', 'MM003_AU')
+  AND fp.Category_Description != 'CIGARETTES'
+  AND fp.Value_Type_Description = 'Actuals'
+  AND dd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6,7,8,9,10;
+
+-- Finance forecast - forecasted sales for future periods
+-- refresh: FiscalWeekStartDate
+CREATE TABLE finance_forecast AS
+SELECT
+    dd.FiscalYear,
+    dd.FiscalWeekYear,
+    dd.FiscalWeek,
+    dd.FiscalWeekStartDate,
+    dd.Fiscal_Period,
+    fp.MerchandiseManager_Department AS Business_profit_v,
+    fp.Category,
+    substr(fp.Category, 3) AS CategoryWithoutCompanyCode,
+    fp.Category_Description AS Category_Description_profit_v,
+    SUM(COALESCE(fp.Sales_Merch_Forecast, 0)) AS Sales_Forecast,
+    (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+FROM dim_date dd
+INNER JOIN src_fin_profit fp ON fp.Calendar_Day = dd.CalendarDay
+WHERE fp.fiscal_year IN ('2024', '2025')
+  AND fp.Value_Type_Description = 'Merch Forecast'
+  AND fp.SalesOrg IN ('1060')
+  AND fp.MerchandiseManager_Code NOT IN ('MM922_AU', 'MM003_AU')
+  AND fp.Category_Description != 'CIGARETTES'
+  AND dd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6,7,8,9;
+
+-- Map finance data to business/category dimensions
+-- refresh: FiscalWeekStartDate
+CREATE TABLE finance_mapped AS
+-- Actuals with Business/Category mapping
+SELECT
+    fa.FiscalYear,
+    fa.FiscalWeekYear,
+    fa.FiscalWeek,
+    fa.FiscalWeekStartDate,
+    fa.Fiscal_Period,
+    COALESCE(bc.Business, 'General Merch') AS Business,
+    COALESCE(bc.Category, 'General Merch') AS Category,
+    fa.CategoryWithoutCompanyCode,
+    fa.Category_Description_profit_v,
+    fa.SalesChannel_Cat,
+    fa.Sales_InclGST,
+    fa.Net_Sales,
+    fa.Scanback,
+    fa.Total_Discounts_And_Rewards,
+    fa.COGS,
+    fa.Gross_Profit,
+    'Actual' AS DataType,
+    fa.data_extraction_timestamp
+FROM finance_actuals fa
+LEFT JOIN dim_business_category bc
+    ON UPPER(bc.SubCategory) = UPPER(fa.Category_Description_profit_v)
+WHERE fa.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+
+UNION ALL
+
+-- Forecasts with Business/Category mapping
+SELECT
+    ff.FiscalYear,
+    ff.FiscalWeekYear,
+    ff.FiscalWeek,
+    ff.FiscalWeekStartDate,
+    ff.Fiscal_Period,
+    COALESCE(bc.Business, 'General Merch') AS Business,
+    COALESCE(bc.Category, 'General Merch') AS Category,
+    ff.CategoryWithoutCompanyCode,
+    ff.Category_Description_profit_v,
+    NULL AS SalesChannel_Cat, -- Not available in forecasts
+    NULL AS Sales_InclGST, -- Using forecast instead
+    ff.Sales_Forecast AS Net_Sales,
+    NULL AS Scanback, -- Not available in forecasts
+    NULL AS Total_Discounts_And_Rewards, -- Not available in forecasts
+    NULL AS COGS, -- Not available in forecasts
+    NULL AS Gross_Profit, -- Not available in forecasts
+    'Forecast' AS DataType,
+    ff.data_extraction_timestamp
+FROM finance_forecast ff
+LEFT JOIN dim_business_category bc
+    ON UPPER(bc.SubCategory) = UPPER(ff.Category_Description_profit_v)
+WHERE ff.FiscalWeekStartDate IN (SELECT key FROM refresh_keys);
+
+-- Actual sales from article sales for a more granular view
+-- refresh: FiscalWeekStartDate
+CREATE TABLE article_sales_actuals AS
+SELECT
+    bas.start_txn_date,
+    dd.FiscalYear,
+    dd.FiscalWeekYear,
+    dd.FiscalWeek,
+    dd.FiscalWeekStartDate,
+    COALESCE(bd.Business, 'General Merch') AS Business,
+    COALESCE(bd.Category, 'General Merch') AS Category,
+    CASE
+        WHEN bas.sales_channel_desc IN ('HD', 'CC') THEN 'Online'
+        ELSE 'Instore'
+    END AS SalesChannel_Cat,
+    COALESCE(art.CategoryDescription, 'Unknown') AS CategoryDescription,
+    SUM(bas.tot_amt_incld_gst) AS tot_amt_incld_gst,
+    SUM(bas.tot_amt_excld_gst_wo_wow) AS tot_amt_excld_gst_wo_wow,
+    SUM(bas.tot_amt_excld_gst_wt_wow) AS tot_amt_excld_gst_wt_wow,
+    COUNT(DISTINCT bas.basket_key) AS basket_count,
+    COUNT(DISTINCT bas.crn) AS customer_count,
+    (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+FROM dim_date dd
+INNER JOIN src_article_sales bas
+    ON bas.start_txn_date = dd.CalendarDay
+LEFT JOIN src_article_master art
+    ON bas.prod_nbr = art.ArticleWITHUOM AND bas.division_nbr = art.SalesOrg
+LEFT JOIN dim_business_category bd
+    ON bd.SubCategory = initcap(art.CategoryDescription)
+WHERE bas.category <> 'Gift Cards'
+  AND bas.tot_amt_incld_gst > 0
+  AND bas.division_nbr = 1060
+  AND dd.FiscalYear IN (2024, 2025)
+  AND dd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6,7,8,9;
+
+-- Helper table of all time x business x category combinations
+-- refresh: FiscalWeekStartDate
+CREATE TABLE helper_dimension_combinations AS
+SELECT
+    dd.FiscalYear,
+    dd.FiscalWeekYear,
+    dd.FiscalWeek,
+    dd.FiscalWeekStartDate,
+    dd.FiscalWeekEndDate,
+    dd.CalendarDay,
+    bc.Business,
+    bc.Category
+FROM dim_date dd
+CROSS JOIN (
+    SELECT DISTINCT Business, Category
+    FROM dim_business_category
+    WHERE Business IS NOT NULL AND Category IS NOT NULL
+) bc
+WHERE dd.FiscalYear IN (2024, 2025)
+  AND dd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys);
+
+-- =====================================================================================
+-- STEP 3: PROCESS CAMPAIGN COSTS AND FORECASTS
+-- =====================================================================================
+
+-- Campaign details and campaign stream structure
+CREATE TABLE campaign_details AS
+SELECT
+    replace(replace(replace(campaignStream, char(13), ''), char(10), ''), char(9), '') AS campaignStream,
+    CampaignDetails,
+    fw_CampaignStartDate,
+    fw_CampaignStartDate AS FiscalWeekStartDate, -- For joining
+    year,
+    Campaign_Start_Date,
+    Campaign_End_Date,
+    split_part(campaignStream, '_', 1) AS CampaignType,
+    split_part(campaignStream, '_', 2) AS CampaignSubType,
+    Include_Categories,
+    CASE
+        WHEN campaignStream LIKE '%\_XBan\_%' ESCAPE '\' THEN 'XBan'
+        WHEN campaignStream LIKE '%\_ATL\_%' ESCAPE '\' THEN 'ATL'
+        WHEN campaignStream LIKE '%\_BTL\_%' ESCAPE '\' THEN 'BTL'
+        WHEN campaignStream LIKE '%\_Trade\_%' ESCAPE '\' THEN 'Trade'
+        WHEN campaignStream LIKE '%\_Category\_%' ESCAPE '\' THEN 'Category'
+        WHEN campaignStream LIKE '%\_EDX\_%' ESCAPE '\' THEN 'Everyday Extra'
+        ELSE NULL
+    END AS CampaignCategoryType,
+    CAST(julianday(Campaign_End_Date) - julianday(Campaign_Start_Date) AS INTEGER) + 1 AS campaign_duration,
+    costs_budget_fcast,
+    ROW_NUMBER() OVER () AS campaign_row_id
+FROM src_campaign_plan;
+
+-- Campaign costs forecast from the marketing plan
+-- refresh: FiscalWeekStartDate
+CREATE TABLE campaign_costs_forecast AS
+WITH forecast_base AS (
+    -- Campaign cost forecasts by week and category
+    SELECT
+        cd.campaignStream,
+        cd.CampaignCategoryType,
+        cd.Include_Categories,
+        cd.FiscalWeekStartDate,
+        bc.Business,
+        bc.Category,
+        wk.FiscalWeekYear,
+        wk.FiscalYear,
+        wk.FiscalWeek,
+        cd.costs_budget_fcast,
+        -- Apply standard costs based on forecast % of budget
+        cd.costs_budget_fcast * 0.0050 AS cost_50bps_forecast,
+        cd.costs_budget_fcast * 0.0020 AS cost_20bps_forecast,
+        cd.costs_budget_fcast * 0.0070 AS cost_70bps_forecast
+    FROM campaign_details cd
+    -- Port fix: one row per fiscal week, not one per day
+    INNER JOIN (
+        SELECT DISTINCT FiscalWeekStartDate, FiscalWeekYear, FiscalYear, FiscalWeek FROM dim_date
+    ) wk ON cd.FiscalWeekStartDate = wk.FiscalWeekStartDate
+    -- Port fix: category campaigns are charged to their category; storewide ones
+    -- keep a single row here and are spread by sales proportion below
+    LEFT JOIN (
+        SELECT DISTINCT Business, Category FROM dim_business_category WHERE Category IS NOT NULL
+    ) bc ON cd.Include_Categories <> 'Storewide' AND bc.Category = cd.Include_Categories
+    WHERE cd.costs_budget_fcast > 0
+      AND cd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+),
+
+-- Proportional allocation of storewide campaign costs to business/category,
+-- using the sales forecast as the driver
+sales_proportions AS (
+    SELECT
+        FiscalWeekYear,
+        Business,
+        Category,
+        Net_Sales,
+        SUM(Net_Sales) OVER (PARTITION BY FiscalWeekYear) AS total_sales_week,
+        safe_divide(Net_Sales, SUM(Net_Sales) OVER (PARTITION BY FiscalWeekYear)) AS sales_proportion
+    FROM (
+        -- Port fix: total forecast per business/category (the production QUALIFY
+        -- kept an arbitrary sub-category row)
+        SELECT FiscalWeekYear, Business, Category, SUM(Net_Sales) AS Net_Sales
+        FROM finance_mapped
+        WHERE DataType = 'Forecast'
+          AND FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+        GROUP BY 1, 2, 3
+    )
+)
+
+SELECT
+    f.campaignStream,
+    f.CampaignCategoryType,
+    f.FiscalWeekStartDate,
+    f.FiscalWeekYear,
+    f.FiscalYear,
+    f.FiscalWeek,
+    CASE
+        -- For storewide campaigns, distribute based on sales proportions
+        WHEN f.Include_Categories = 'Storewide' THEN sp.Business
+        -- For category specific campaigns, use the mapped business
+        ELSE f.Business
+    END AS Business,
+    CASE
+        WHEN f.Include_Categories = 'Storewide' THEN sp.Category
+        ELSE f.Category
+    END AS Category,
+    -- Apply proportional allocation for costs
+    CASE
+        WHEN f.Include_Categories = 'Storewide' THEN f.cost_50bps_forecast * COALESCE(sp.sales_proportion, 0)
+        ELSE f.cost_50bps_forecast
+    END AS cost_50bps_forecast,
+    CASE
+        WHEN f.Include_Categories = 'Storewide' THEN f.cost_20bps_forecast * COALESCE(sp.sales_proportion, 0)
+        ELSE f.cost_20bps_forecast
+    END AS cost_20bps_forecast,
+    CASE
+        WHEN f.Include_Categories = 'Storewide' THEN f.cost_70bps_forecast * COALESCE(sp.sales_proportion, 0)
+        ELSE f.cost_70bps_forecast
+    END AS cost_70bps_forecast,
+    (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+FROM forecast_base f
+LEFT JOIN sales_proportions sp
+    ON f.FiscalWeekYear = sp.FiscalWeekYear
+    -- Only join for storewide campaigns that need to be distributed
+    AND f.Include_Categories = 'Storewide';
+
+-- Daily forecast of campaign costs
+-- refresh: FiscalWeekStartDate
+CREATE TABLE campaign_costs_forecast_daily AS
+SELECT
+    dd.CalendarDay,
+    cf.campaignStream,
+    cf.CampaignCategoryType,
+    cf.Business,
+    cf.Category,
+    cf.FiscalWeekStartDate,
+    cf.FiscalWeekYear,
+    cf.FiscalYear,
+    cf.FiscalWeek,
+    dw.DayOfWeek,
+    dw.daily_weight,
+    -- Apply daily distribution weights
+    cf.cost_50bps_forecast * dw.daily_weight AS cost_50bps_forecast_daily,
+    cf.cost_20bps_forecast * dw.daily_weight AS cost_20bps_forecast_daily,
+    cf.cost_70bps_forecast * dw.daily_weight AS cost_70bps_forecast_daily,
+    cf.data_extraction_timestamp
+FROM campaign_costs_forecast cf
+INNER JOIN dim_date dd
+    ON cf.FiscalWeekStartDate = dd.FiscalWeekStartDate
+INNER JOIN dim_day_of_week_weights dw
+    ON dw.DayOfWeek = dd.DayOfWeek
+WHERE cf.FiscalWeekStartDate IN (SELECT key FROM refresh_keys);
+
+-- Campaign actuals - campaign cost actuals from the finance system
+-- refresh: FiscalWeekStartDate
+CREATE TABLE campaign_costs_actuals AS
+SELECT
+    dd.CalendarDay,
+    dd.FiscalWeekYear,
+    dd.FiscalYear,
+    dd.FiscalWeek,
+    dd.FiscalWeekStartDate,
+    COALESCE(bd.Business, 'General Merch') AS Business,
+    COALESCE(bd.Category, 'General Merch') AS Category,
+    fp.Controller_Description AS campaign_controller,
+    fp.Offer_ID_DC AS offer_id,
+    fp.Category_Description AS category_description,
+    CASE
+        WHEN fp.Sales_Channel LIKE 'HD%' THEN 'Online'
+        WHEN fp.Sales_Channel LIKE 'CC%' THEN 'Online'
+        ELSE 'Instore'
+    END AS SalesChannel_Cat,
+    -- Campaign costs from finance data
+    SUM(fp.LoyaltyRewards) AS loyalty_rewards_costs,
+    SUM(fp.Scanback) AS scanback_costs,
+    SUM(fp.Total_Discounts) AS total_discount_costs,
+    (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+FROM dim_date dd
+INNER JOIN src_fin_profit fp
+    ON fp.Calendar_Day = dd.CalendarDay
+LEFT JOIN dim_business_category bd
+    ON UPPER(bd.SubCategory) = UPPER(fp.Category_Description)
+WHERE fp.SalesOrg IN ('1060')
+  AND fp.Calendar_Day BETWEEN '2023-06-26' AND (SELECT as_of FROM run_context)
+  AND fp.MerchandiseManager_Code NOT IN ('MM922_AU', 'MM003_AU')
+  AND fp.Category_Description != 'CIGARETTES'
+  AND fp.Value_Type_Description = 'Actuals'
+  -- Filter for campaign-related costs
+  AND (fp.LoyaltyRewards > 0 OR fp.Scanback > 0 OR fp.Category_Description = 'Edr Promo Discount')
+  AND dd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6,7,8,9,10,11;
+
+-- =====================================================================================
+-- STEP 4: EXTRACT EVERYDAY EXTRA DATA
+-- =====================================================================================
+
+-- Everyday Extra offer details
+-- refresh: FiscalWeekStartDate
+CREATE TABLE everyday_extra_details AS
+WITH everyday_extra_raw AS (
+    SELECT
+        *,
+        -- Standardize order ID format
+        CASE WHEN channel = 'Online' THEN substr(edx.OrderID, 5) ELSE edx.OrderID END AS OrderId_standardized,
+        lower(hex(randomblob(16))) AS unique_id
+    FROM src_edx_offer_details edx
+    WHERE edx.FiscalWeekStartDate >= '2023-06-26'
+      AND edx.banner IN ('Big W')
+      AND edx.LoyaltyCustomerTypeDescription IN ('Customer', 'Staff')
+      AND edx.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+)
+
+SELECT
+    edx.crn,
+    edx.Banner,
+    edx.FiscalWeekStartDate,
+    edx.LoyaltyCustomerTypeDescription,
+    edx.offer_type,
+    edx.benefit,
+    edx.channel,
+    edx.OrderId_standardized,
+    edx.basketkey,
+    edx.ordervalue,
+    edx.reward_value,
+    edx.unique_id,
+    wk.FiscalYear,
+    wk.FiscalWeekYear,
+    wk.FiscalWeek,
+    CASE
+        WHEN edx.offer_type IN ('10% BigW', '10% BigW Online') THEN '10% Discount'
+        WHEN edx.offer_type LIKE '%3x%' THEN '3x Points'
+        WHEN edx.offer_type LIKE '%2x%' THEN '2x Points'
+        ELSE edx.offer_type
+    END AS offer_type_category,
+    CASE
+        WHEN edx.LoyaltyCustomerTypeDescription = 'Staff' THEN 'Team'
+        ELSE 'Subscriber'
+    END AS customer_type,
+    (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+FROM everyday_extra_raw edx
+-- Port fix: one row per fiscal week, not one per day
+INNER JOIN (
+    SELECT DISTINCT FiscalWeekStartDate, FiscalYear, FiscalWeekYear, FiscalWeek FROM dim_date
+) wk ON edx.FiscalWeekStartDate = wk.FiscalWeekStartDate;
+
+-- Everyday Extra costs at the business/category level
+-- refresh: FiscalWeekStartDate
+CREATE TABLE everyday_extra_costs AS
+-- First get EDX 10% discount baskets
+WITH edx_10_baskets AS (
+    SELECT
+        crn,
+        basketkey AS basket_key,
+        OrderId_standardized AS Basket_OrderID,
+        customer_type,
+        offer_type_category,
+        SUM(reward_value) AS reward_value
+    FROM everyday_extra_details
+    WHERE offer_type_category = '10% Discount'
+      AND FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+    GROUP BY 1, 2, 3, 4, 5
+),
+
+-- Sales data for baskets with EDX offers
+basket_sales AS (
+    SELECT
+        bas.start_txn_date,
+        bd.Business,
+        bd.Category,
+        bas.crn,
+        bas.basket_key,
+        bas.order_id AS Basket_OrderID,
+        dd.FiscalYear,
+        dd.FiscalWeekYear,
+        dd.FiscalWeek,
+        dd.FiscalWeekStartDate,
+        SUM(bas.tot_amt_incld_gst) AS total_sales,
+        COUNT(DISTINCT bas.prod_nbr) AS item_count
+    FROM dim_date dd
+    INNER JOIN src_article_sales bas
+        ON bas.start_txn_date = dd.CalendarDay
+    LEFT JOIN src_article_master art
+        ON bas.prod_nbr = art.ArticleWITHUOM AND bas.division_nbr = art.SalesOrg
+    LEFT JOIN dim_business_category bd
+        ON bd.SubCategory = initcap(art.CategoryDescription)
+    WHERE bas.category <> 'Gift Cards'
+      AND bas.tot_amt_incld_gst > 0
+      AND bas.division_nbr = 1060
+      AND dd.FiscalYear IN (2024, 2025)
+      AND dd.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+      -- Only include baskets with EDX orders
+      AND bas.order_id IN (SELECT Basket_OrderID FROM edx_10_baskets)
+    GROUP BY 1,2,3,4,5,6,7,8,9,10
+),
+
+-- Link baskets with EDX rewards and calculate distribution
+basket_costs_distribution AS (
+    SELECT
+        bs.*,
+        eb.reward_value,
+        eb.customer_type,
+        SUM(bs.total_sales) OVER (PARTITION BY bs.Basket_OrderID) AS total_sales_basket,
+        -- Distribution percentage for each category in the basket
+        safe_divide(bs.total_sales, SUM(bs.total_sales) OVER (PARTITION BY bs.Basket_OrderID)) AS distrib_percent,
+        -- Distribute the reward value proportionally to each category
+        eb.reward_value * safe_divide(bs.total_sales, SUM(bs.total_sales) OVER (PARTITION BY bs.Basket_OrderID)) AS reward_value_distrib
+    FROM basket_sales bs
+    INNER JOIN edx_10_baskets eb
+        ON bs.Basket_OrderID = eb.Basket_OrderID
+        AND bs.crn = eb.crn
+),
+
+-- Aggregate the EDX costs by time, business, category, and customer type
+edx_costs_aggregated AS (
+    SELECT
+        FiscalYear,
+        FiscalWeekYear,
+        FiscalWeek,
+        FiscalWeekStartDate,
+        Business,
+        Category,
+        customer_type,
+        SUM(reward_value_distrib) AS edx_10pct_cost,
+        SUM(total_sales) AS edx_10pct_sales,
+        COUNT(DISTINCT Basket_OrderID) AS basket_count,
+        (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+    FROM basket_costs_distribution
+    GROUP BY 1,2,3,4,5,6,7
+)
+
+SELECT * FROM edx_costs_aggregated;
+
+-- Everyday Extra forecast from FY24 rates and the sales forecast.
+-- Keyed on the fiscal week number: a changed FY24 week changes the rate applied
+-- to the same week of every year.
+-- refresh: FiscalWeek
+CREATE TABLE everyday_extra_forecast AS
+-- Historical EDX cost rates
+WITH edx_historical_rates AS (
+    SELECT
+        Business,
+        Category,
+        customer_type,
+        FiscalWeekNo,
+        AVG(safe_divide(edx_10pct_cost, edx_10pct_sales)) AS edx_cost_rate,
+        AVG(edx_10pct_sales) AS avg_edx_sales
+    FROM (
+        SELECT
+            Business,
+            Category,
+            customer_type,
+            FiscalWeek AS FiscalWeekNo,
+            edx_10pct_cost,
+            edx_10pct_sales
+        FROM everyday_extra_costs
+        WHERE FiscalYear = 2024 -- Use FY24 as the baseline
+          AND FiscalWeek IN (SELECT key FROM refresh_keys)
+    )
+    GROUP BY 1,2,3,4
+),
+
+-- Apply EDX rates to forecasted sales
+edx_forecast_base AS (
+    SELECT
+        f.FiscalYear,
+        f.FiscalWeekYear,
+        f.FiscalWeek,
+        f.FiscalWeekStartDate,
+        f.Business,
+        f.Category,
+        f.Net_Sales AS sales_forecast,
+        ehr.customer_type,
+        ehr.edx_cost_rate,
+        -- Historical rate applied to forecast sales with growth adjustments
+        CASE
+            WHEN ehr.customer_type = 'Subscriber' THEN f.Net_Sales * COALESCE(ehr.edx_cost_rate, 0) * 1.15 -- 15% growth factor
+            WHEN ehr.customer_type = 'Team' THEN f.Net_Sales * COALESCE(ehr.edx_cost_rate, 0) * 1.04 -- 4% growth factor
+            ELSE 0
+        END AS edx_10pct_cost_forecast,
+        (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+    FROM finance_mapped f
+    LEFT JOIN edx_historical_rates ehr
+        ON f.Business = ehr.Business
+        AND f.Category = ehr.Category
+        AND f.FiscalWeek = ehr.FiscalWeekNo
+    WHERE f.DataType = 'Forecast'
+      AND f.FiscalYear IN (2024, 2025)
+      AND f.FiscalWeek IN (SELECT key FROM refresh_keys)
+)
+
+SELECT * FROM edx_forecast_base
+WHERE edx_10pct_cost_forecast > 0;
+
+-- =====================================================================================
+-- STEP 5: CREATE FINAL DASHBOARD TABLES
+-- =====================================================================================
+
+-- Final dashboard data combining all elements.
+-- Port fix: facts are pre-aggregated per day (or week) and business/category before
+-- joining, and weekly values are spread over days with the day-of-week weights.
+-- refresh: FiscalWeekStartDate
+CREATE TABLE dashboard_data AS
+WITH last_actual_date AS (
+    -- Last day with actual sales: the end of the latest actual week, up to as_of
+    SELECT MIN(date(MAX(FiscalWeekStartDate), '+6 days'), (SELECT as_of FROM run_context)) AS last_actual_date
+    FROM finance_mapped
+    WHERE DataType = 'Actual'
+      AND Net_Sales > 0
+),
+
+finance_weekly AS (
+    SELECT
+        FiscalWeekStartDate,
+        Business,
+        Category,
+        SUM(CASE WHEN DataType = 'Actual' THEN Sales_InclGST END) AS Sales_InclGST_Actual,
+        SUM(CASE WHEN DataType = 'Actual' THEN Net_Sales END) AS Net_Sales_Actual,
+        SUM(CASE WHEN DataType = 'Forecast' THEN Net_Sales END) AS Net_Sales_Forecast
+    FROM finance_mapped
+    WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+    GROUP BY 1, 2, 3
+),
+
+campaign_actuals_daily AS (
+    SELECT
+        CalendarDay,
+        Business,
+        Category,
+        SUM(loyalty_rewards_costs) AS loyalty_rewards_costs,
+        SUM(scanback_costs) AS scanback_costs,
+        SUM(total_discount_costs) AS total_discount_costs
+    FROM campaign_costs_actuals
+    WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+    GROUP BY 1, 2, 3
+),
+
+campaign_forecast_daily AS (
+    SELECT
+        CalendarDay,
+        Business,
+        Category,
+        SUM(cost_50bps_forecast_daily) AS cost_50bps_forecast_daily,
+        SUM(cost_70bps_forecast_daily) AS cost_70bps_forecast_daily,
+        string_agg_distinct(campaignStream, ', ') AS campaign_streams
+    FROM campaign_costs_forecast_daily
+    WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+    GROUP BY 1, 2, 3
+),
+
+edx_actuals_weekly AS (
+    SELECT FiscalWeekStartDate, Business, Category, SUM(edx_10pct_cost) AS edx_10pct_cost
+    FROM everyday_extra_costs
+    WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+    GROUP BY 1, 2, 3
+),
+
+edx_forecast_weekly AS (
+    SELECT FiscalWeekStartDate, Business, Category, SUM(edx_10pct_cost_forecast) AS edx_10pct_cost_forecast
+    FROM everyday_extra_forecast
+    WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+    GROUP BY 1, 2, 3
+),
+
+-- Combine actuals and forecasts with campaign costs
+combined_data AS (
+    SELECT
+        hdc.CalendarDay,
+        hdc.FiscalYear,
+        hdc.FiscalWeekYear,
+        hdc.FiscalWeek,
+        hdc.FiscalWeekStartDate,
+        hdc.FiscalWeekEndDate,
+        hdc.Business,
+        hdc.Category,
+        -- Financial metrics
+        COALESCE(fm.Sales_InclGST_Actual, 0) * dw.daily_weight AS Sales_InclGST_Actual,
+        COALESCE(fm.Net_Sales_Actual, 0) * dw.daily_weight AS Net_Sales_Actual,
+        -- Use forecast or actual based on the date
+        CASE
+            WHEN hdc.CalendarDay <= lad.last_actual_date THEN COALESCE(fm.Net_Sales_Actual, 0)
+            ELSE COALESCE(fm.Net_Sales_Forecast, 0)
+        END * dw.daily_weight AS Net_Sales,
+        -- Campaign costs - actuals and forecast
+        COALESCE(ca.loyalty_rewards_costs, 0) AS loyalty_rewards_costs_actual,
+        COALESCE(ca.scanback_costs, 0) AS scanback_costs_actual,
+        COALESCE(ca.total_discount_costs, 0) AS discount_costs_actual,
+        COALESCE(cf.cost_50bps_forecast_daily, 0) AS campaign_costs_forecast_50bps,
+        COALESCE(cf.cost_70bps_forecast_daily, 0) AS campaign_costs_forecast_70bps,
+        -- EDX costs - actual and forecast
+        COALESCE(ec.edx_10pct_cost, 0) * dw.daily_weight AS edx_10pct_costs_actual,
+        COALESCE(ef.edx_10pct_cost_forecast, 0) * dw.daily_weight AS edx_10pct_costs_forecast,
+        -- Actual vs Forecast flag
+        CASE
+            WHEN hdc.CalendarDay <= lad.last_actual_date THEN 'Actual'
+            ELSE 'Forecast'
+        END AS Data_Type,
+        -- Fiscal period for rollups
+        dd.Fiscal_Period,
+        -- Campaign streams if applicable
+        cf.campaign_streams,
+        (SELECT extracted_at FROM run_context) AS data_extraction_timestamp
+    FROM helper_dimension_combinations hdc
+    INNER JOIN dim_date dd
+        ON hdc.CalendarDay = dd.CalendarDay
+    INNER JOIN dim_day_of_week_weights dw
+        ON dw.DayOfWeek = dd.DayOfWeek
+    CROSS JOIN last_actual_date lad
+    LEFT JOIN finance_weekly fm
+        ON hdc.FiscalWeekStartDate = fm.FiscalWeekStartDate
+        AND hdc.Business = fm.Business
+        AND hdc.Category = fm.Category
+    LEFT JOIN campaign_actuals_daily ca
+        ON hdc.CalendarDay = ca.CalendarDay
+        AND hdc.Business = ca.Business
+        AND hdc.Category = ca.Category
+    LEFT JOIN campaign_forecast_daily cf
+        ON hdc.CalendarDay = cf.CalendarDay
+        AND hdc.Business = cf.Business
+        AND hdc.Category = cf.Category
+    LEFT JOIN edx_actuals_weekly ec
+        ON hdc.FiscalWeekStartDate = ec.FiscalWeekStartDate
+        AND hdc.Business = ec.Business
+        AND hdc.Category = ec.Category
+    LEFT JOIN edx_forecast_weekly ef
+        ON hdc.FiscalWeekStartDate = ef.FiscalWeekStartDate
+        AND hdc.Business = ef.Business
+        AND hdc.Category = ef.Category
+    WHERE hdc.FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+)
+
+SELECT
+    *,
+    -- Total loyalty costs (actual or forecast)
+    CASE
+        WHEN Data_Type = 'Actual' THEN
+            loyalty_rewards_costs_actual + scanback_costs_actual + edx_10pct_costs_actual
+        ELSE
+            CASE
+                -- For the preferred forecast version, use 50bps
+                WHEN FiscalYear = 2025 THEN campaign_costs_forecast_50bps + edx_10pct_costs_forecast
+                ELSE campaign_costs_forecast_70bps + edx_10pct_costs_forecast
+            END
+    END AS total_loyalty_costs,
+    -- Loyalty costs as % of sales
+    safe_divide(
+        CASE
+            WHEN Data_Type = 'Actual' THEN
+                loyalty_rewards_costs_actual + scanback_costs_actual + edx_10pct_costs_actual
+            ELSE
+                CASE
+                    WHEN FiscalYear = 2025 THEN campaign_costs_forecast_50bps + edx_10pct_costs_forecast
+                    ELSE campaign_costs_forecast_70bps + edx_10pct_costs_forecast
+                END
+        END,
+        Net_Sales
+    ) * 100 AS loyalty_costs_pct_of_sales
+FROM combined_data;
+
+-- Aggregated summaries for the dashboard
+-- Daily summary
+-- refresh: FiscalWeekStartDate
+CREATE TABLE dashboard_summary_daily AS
+SELECT
+    CalendarDay,
+    FiscalYear,
+    FiscalWeekYear,
+    FiscalWeek,
+    FiscalWeekStartDate,
+    FiscalWeekEndDate,
+    Fiscal_Period,
+    Data_Type,
+    SUM(Net_Sales) AS Net_Sales,
+    SUM(loyalty_rewards_costs_actual) AS loyalty_rewards_costs_actual,
+    SUM(scanback_costs_actual) AS scanback_costs_actual,
+    SUM(edx_10pct_costs_actual) AS edx_10pct_costs_actual,
+    SUM(campaign_costs_forecast_50bps) AS campaign_costs_forecast_50bps,
+    SUM(campaign_costs_forecast_70bps) AS campaign_costs_forecast_70bps,
+    SUM(edx_10pct_costs_forecast) AS edx_10pct_costs_forecast,
+    SUM(total_loyalty_costs) AS total_loyalty_costs,
+    safe_divide(SUM(total_loyalty_costs), SUM(Net_Sales)) * 100 AS loyalty_costs_pct_of_sales,
+    MAX(data_extraction_timestamp) AS data_extraction_timestamp
+FROM dashboard_data
+WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6,7,8;
+
+-- Weekly summary
+-- refresh: FiscalWeekStartDate
+CREATE TABLE dashboard_summary_weekly AS
+SELECT
+    FiscalYear,
+    FiscalWeekYear,
+    FiscalWeek,
+    FiscalWeekStartDate,
+    FiscalWeekEndDate,
+    Fiscal_Period,
+    -- Whether the week is fully actual, fully forecast, or mixed
+    CASE
+        WHEN COUNT(DISTINCT Data_Type) > 1 THEN 'Mixed'
+        ELSE MAX(Data_Type)
+    END AS Data_Type,
+    SUM(Net_Sales) AS Net_Sales,
+    SUM(loyalty_rewards_costs_actual) AS loyalty_rewards_costs_actual,
+    SUM(scanback_costs_actual) AS scanback_costs_actual,
+    SUM(edx_10pct_costs_actual) AS edx_10pct_costs_actual,
+    SUM(campaign_costs_forecast_50bps) AS campaign_costs_forecast_50bps,
+    SUM(campaign_costs_forecast_70bps) AS campaign_costs_forecast_70bps,
+    SUM(edx_10pct_costs_forecast) AS edx_10pct_costs_forecast,
+    SUM(total_loyalty_costs) AS total_loyalty_costs,
+    safe_divide(SUM(total_loyalty_costs), SUM(Net_Sales)) * 100 AS loyalty_costs_pct_of_sales,
+    MAX(data_extraction_timestamp) AS data_extraction_timestamp
+FROM dashboard_data
+WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6;
+
+-- Business summary
+-- refresh: FiscalWeekStartDate
+CREATE TABLE dashboard_summary_business AS
+SELECT
+    FiscalYear,
+    FiscalWeekYear,
+    FiscalWeek,
+    FiscalWeekStartDate,
+    FiscalWeekEndDate,
+    Fiscal_Period,
+    Business,
+    Data_Type,
+    SUM(Net_Sales) AS Net_Sales,
+    SUM(loyalty_rewards_costs_actual) AS loyalty_rewards_costs_actual,
+    SUM(scanback_costs_actual) AS scanback_costs_actual,
+    SUM(edx_10pct_costs_actual) AS edx_10pct_costs_actual,
+    SUM(campaign_costs_forecast_50bps) AS campaign_costs_forecast_50bps,
+    SUM(campaign_costs_forecast_70bps) AS campaign_costs_forecast_70bps,
+    SUM(edx_10pct_costs_forecast) AS edx_10pct_costs_forecast,
+    SUM(total_loyalty_costs) AS total_loyalty_costs,
+    safe_divide(SUM(total_loyalty_costs), SUM(Net_Sales)) * 100 AS loyalty_costs_pct_of_sales,
+    MAX(data_extraction_timestamp) AS data_extraction_timestamp
+FROM dashboard_data
+WHERE FiscalWeekStartDate IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2,3,4,5,6,7,8;
+
+-- Period summary for quarterly/monthly views
+-- refresh: Fiscal_Period
+CREATE TABLE dashboard_summary_period AS
+SELECT
+    FiscalYear,
+    Fiscal_Period,
+    CASE
+        WHEN COUNT(DISTINCT Data_Type) > 1 THEN 'Mixed'
+        ELSE MAX(Data_Type)
+    END AS Data_Type,
+    SUM(Net_Sales) AS Net_Sales,
+    SUM(loyalty_rewards_costs_actual) AS loyalty_rewards_costs_actual,
+    SUM(scanback_costs_actual) AS scanback_costs_actual,
+    SUM(edx_10pct_costs_actual) AS edx_10pct_costs_actual,
+    SUM(campaign_costs_forecast_50bps) AS campaign_costs_forecast_50bps,
+    SUM(campaign_costs_forecast_70bps) AS campaign_costs_forecast_70bps,
+    SUM(edx_10pct_costs_forecast) AS edx_10pct_costs_forecast,
+    SUM(total_loyalty_costs) AS total_loyalty_costs,
+    safe_divide(SUM(total_loyalty_costs), SUM(Net_Sales)) * 100 AS loyalty_costs_pct_of_sales,
+    MAX(data_extraction_timestamp) AS data_extraction_timestamp
+FROM dashboard_data
+WHERE Fiscal_Period IN (SELECT key FROM refresh_keys)
+GROUP BY 1,2;
+
+-- Annual summary
+-- refresh: FiscalYear
+CREATE TABLE dashboard_summary_annual AS
+SELECT
+    FiscalYear,
+    CASE
+        WHEN COUNT(DISTINCT Data_Type) > 1 THEN 'Mixed'
+        ELSE MAX(Data_Type)
+    END AS Data_Type,
+    SUM(Net_Sales) AS Net_Sales,
+    SUM(loyalty_rewards_costs_actual) AS loyalty_rewards_costs_actual,
+    SUM(scanback_costs_actual) AS scanback_costs_actual,
+    SUM(edx_10pct_costs_actual) AS edx_10pct_costs_actual,
+    SUM(campaign_costs_forecast_50bps) AS campaign_costs_forecast_50bps,
+    SUM(campaign_costs_forecast_70bps) AS campaign_costs_forecast_70bps,
+    SUM(edx_10pct_costs_forecast) AS edx_10pct_costs_forecast,
+    SUM(total_loyalty_costs) AS total_loyalty_costs,
+    safe_divide(SUM(total_loyalty_costs), SUM(Net_Sales)) * 100 AS loyalty_costs_pct_of_sales,
+    MAX(data_extraction_timestamp) AS data_extraction_timestamp
+FROM dashboard_data
+WHERE FiscalYear IN (SELECT key FROM refresh_keys)
+GROUP BY 1;
+
+-- View for dashboard users to easily access the data
+CREATE VIEW dashboard_view AS
+SELECT * FROM dashboard_data;
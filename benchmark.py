@@ -0,0 +1,427 @@
+"""
+Load-test every route of the site under gunicorn and keep the results per commit.
+
+The harness starts a stub server standing in for the GitHub API and the GA4
+Measurement Protocol, launches ``gunicorn main:app`` pointed at it, warms
+each route up and then drives it with concurrent keep-alive clients. It
+reports throughput, p50/p95/p99 latency and error counts per route, plus the
+resident memory of every gunicorn worker, and saves the run to
+``instance/benchmarks/<commit>.json`` so later commits can be compared
+against it.
+
+Usage:
+    python benchmark.py [--requests N] [--concurrency N] [--workers N] [--compare REF]
+    python benchmark.py --compare HEAD~1 --fail-on-regression 15
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from gtm_test import URLS_TO_CHECK, print_colored
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, 'instance', 'benchmarks')
+SERVER_LOG = os.path.join(RESULTS_DIR, 'gunicorn.log')
+
+# (method, path, JSON body) for the API endpoints, in addition to the pages
+API_REQUESTS = [
+    ('GET', '/api/github_repos', None),
+    ('GET', '/api/tableau_views', None),
+    ('GET', '/api/downloads', None),
+    ('GET', '/api/optimise?budget=150000&days_to_christmas=14', None),
+    # 90 scenarios: enough to stream several records, small enough to time per request
+    ('GET', '/api/optimise/sensitivity?budget=100000,150000,200000&days_to_christmas=1-30', None),
+    ('POST', '/api/test-analytics-event', {'measurement_id': 'G-BENCHMARK', 'api_secret': 'benchmark'}),
+]
+NOTEBOOK_ROOT = 'static/historical_projects'
+
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 8
+WARMUP_REQUESTS = 5
+STARTUP_TIMEOUT = 30
+# Large enough that it can't sit in socket buffers while a slow client reads it
+SLOW_CLIENT_PATH = '/static/images/xgboost_chart.png'
+SLOW_CLIENT_RATE = 64 * 1024
+SLOW_CLIENT_BUFFER = 16 * 1024
+
+
+def api_requests():
+    """The API endpoints, including the notebook API for the first notebook found."""
+    requests_to_run = list(API_REQUESTS)
+    notebooks = sorted(glob.glob(os.path.join(ROOT, NOTEBOOK_ROOT, '**', '*.ipynb'), recursive=True))
+    if notebooks:
+        relative = os.path.relpath(notebooks[0], os.path.join(ROOT, NOTEBOOK_ROOT)).replace(os.sep, '/')
+        requests_to_run.append(('GET', f'/api/notebooks/{relative}?limit=20', None))
+    return requests_to_run
+
+
+def stub_repos(count=30):
+    return [{
+        'name': f'repo-{i}',
+        'description': f'Benchmark repository {i}',
+        'html_url': f'https://github.com/benchmark/repo-{i}',
+        'language': 'Python',
+        'stargazers_count': i,
+        'forks_count': i // 2,
+        'updated_at': '2025-01-01T00:00:00Z',
+        'fork': False,
+    } for i in range(count)]
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """GitHub ``/users/<name>/repos`` and GA4 ``/mp/collect`` with canned responses."""
+
+    protocol_version = 'HTTP/1.1'
+    repos = json.dumps(stub_repos()).encode('utf-8')
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if '/repos' in self.path:
+            self._reply(200, self.repos, {'Content-Type': 'application/json', 'ETag': '"benchmark"'})
+        else:
+            self._reply(404, b'')
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(204 if self.path.startswith('/mp/collect') else 404, b'')
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_upstream(latency=0.0):
+    """Serve the stub upstream on a free port, answering after ``latency`` seconds."""
+    handler = type('StubUpstream', (StubUpstreamHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, name='stub-upstream', daemon=True).start()
+    return server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port, upstream_url, workers=None, gunicorn_args=()):
+    """Launch gunicorn and wait until it answers; returns the process.
+
+    gunicorn reads ``gunicorn.conf.py``; ``workers`` and ``gunicorn_args`` override it.
+    """
+    env = dict(os.environ,
+               GITHUB_API_URL=upstream_url,
+               GA_MP_ENDPOINT=f'{upstream_url}/mp/collect')
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               *(['--workers', str(workers)] if workers else []), *gunicorn_args, 'main:app']
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    # A file rather than a pipe: an unread pipe would eventually block gunicorn's logging
+    with open(SERVER_LOG, 'wb') as log:
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(SERVER_LOG, 'r', errors='replace') as log:
+                raise RuntimeError(f"gunicorn exited: {log.read()}")
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not start within {STARTUP_TIMEOUT}s")
+
+
+def worker_memory(master_pid):
+    """``[{pid, rss_kb, peak_rss_kb}]`` for each child of the gunicorn master (Linux only)."""
+    workers = []
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path, 'r') as f:
+                # The command name may contain spaces; the parent pid follows its closing parenthesis
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid != master_pid:
+                continue
+            pid = int(stat_path.split('/')[2])
+            with open(f'/proc/{pid}/status', 'r') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except (OSError, ValueError, IndexError):
+            continue
+        workers.append({'pid': pid,
+                        'rss_kb': int(status['VmRSS'].split()[0]),
+                        'peak_rss_kb': int(status['VmHWM'].split()[0])})
+    return sorted(workers, key=lambda worker: worker['pid'])
+
+
+def slow_client(port, stop, rate=SLOW_CLIENT_RATE, path=SLOW_CLIENT_PATH):
+    """Download ``path`` over and over at ``rate`` bytes/s until ``stop`` is set, like a client on a slow link.
+
+    A small receive buffer keeps the kernel from absorbing the response, so
+    the server really has to wait for the client.
+    """
+    chunk = SLOW_CLIENT_BUFFER // 4
+    while not stop.is_set():
+        try:
+            with socket.socket() as sock:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_CLIENT_BUFFER)
+                sock.connect(('127.0.0.1', port))
+                sock.sendall(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+                while not stop.is_set() and sock.recv(chunk):
+                    time.sleep(chunk / rate)
+        except OSError:
+            time.sleep(0.1)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_route(base_url, method, path, body, total, concurrency):
+    """Send ``total`` requests to one route from ``concurrency`` clients; returns its summary."""
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            local.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            # Measure what a browser gets, compressed responses included
+            local.session.headers['Accept-Encoding'] = 'br, gzip'
+        return local.session
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            response = session().request(method, base_url + path, json=body, timeout=30)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(min(WARMUP_REQUESTS, total))))
+        started = time.perf_counter()
+        samples = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'method': method,
+        'requests': total,
+        'errors': sum(status is None or status >= 500 for _, status in samples),
+        'statuses': statuses,
+        'throughput': round(total / elapsed, 2),
+        'mean_ms': ms(sum(latencies) / len(latencies)),
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+    }
+
+
+def git_commit(ref='HEAD'):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', ref], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def git_dirty():
+    try:
+        return bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                            cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(total=DEFAULT_REQUESTS, concurrency=DEFAULT_CONCURRENCY, workers=None,
+                  gunicorn_args=(), paths=None, upstream_latency=0.0, slow_clients=0):
+    """Start the stack, benchmark every route and return the result document.
+
+    ``upstream_latency`` (seconds) delays every stub GitHub/GA response, and
+    ``slow_clients`` background clients keep downloading a large file at
+    a mobile-link rate while the routes are measured.
+    """
+    requests_to_run = [('GET', path, None) for path in (paths or URLS_TO_CHECK)]
+    if not paths:
+        requests_to_run += api_requests()
+
+    upstream = start_stub_upstream(upstream_latency)
+    port = free_port()
+    process = start_app(port, f'http://127.0.0.1:{upstream.server_port}', workers, gunicorn_args)
+    stop = threading.Event()
+    for i in range(slow_clients):
+        threading.Thread(target=slow_client, args=(port, stop), name=f'slow-client-{i}', daemon=True).start()
+    try:
+        routes = {}
+        for method, path, body in requests_to_run:
+            routes[f'{method} {path}'] = run_route(f'http://127.0.0.1:{port}', method, path, body,
+                                                   total, concurrency)
+        memory = worker_memory(process.pid)
+    finally:
+        stop.set()
+        process.terminate()
+        process.wait(timeout=30)
+        upstream.shutdown()
+
+    return {
+        'commit': git_commit(),
+        'dirty': git_dirty(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'requests': total, 'concurrency': concurrency, 'workers': workers,
+                   'gunicorn_args': list(gunicorn_args), 'upstream_latency': upstream_latency,
+                   'slow_clients': slow_clients},
+        'routes': routes,
+        'workers': memory,
+    }
+
+
+def save(result, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    name = result['commit'] or 'unversioned'
+    if result['dirty']:
+        name += '-dirty'
+    path = os.path.join(results_dir, f'{name}.json')
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def load(ref, results_dir=RESULTS_DIR):
+    """The stored run for a git ref (or a results file path), or ``None``."""
+    if os.path.isfile(ref):
+        path = ref
+    else:
+        commit = git_commit(ref) or ref
+        path = os.path.join(results_dir, f'{commit}.json')
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def print_report(result):
+    print_colored(f"\nBenchmark of {(result['commit'] or 'working tree')[:12]}"
+                  f"{' (dirty)' if result['dirty'] else ''}: {result['config']['requests']} requests per route, "
+                  f"concurrency {result['config']['concurrency']}, {len(result['workers'])} workers "
+                  f"{' '.join(result['config']['gunicorn_args'])}\n", 'BOLD')
+    print_colored("Route".ljust(40) + "req/s".rjust(10) + "p50 ms".rjust(10) + "p95 ms".rjust(10)
+                  + "p99 ms".rjust(10) + "errors".rjust(8) + "  statuses", 'BOLD')
+    print("-" * 110)
+    for route, stats in result['routes'].items():
+        color = 'RED' if stats['errors'] else 'GREEN'
+        print_colored(f"{route[:40].ljust(40)}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.2f}"
+                      f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['errors']:>8}  "
+                      f"{', '.join(f'{k}x{v}' for k, v in sorted(stats['statuses'].items()))}", color)
+    if result['workers']:
+        print("\nWorker memory:")
+        for worker in result['workers']:
+            print(f"  pid {worker['pid']}: RSS {worker['rss_kb'] / 1024:.1f} MiB "
+                  f"(peak {worker['peak_rss_kb'] / 1024:.1f} MiB)")
+
+
+def compare(result, baseline, threshold):
+    """Print per-route changes against ``baseline``; returns the routes that regressed past ``threshold`` %."""
+    print_colored(f"\nCompared with {(baseline['commit'] or 'unversioned')[:12]} ({baseline['timestamp']}):\n", 'BOLD')
+    print_colored("Route".ljust(40) + "req/s".rjust(12) + "p50".rjust(12) + "p95".rjust(12), 'BOLD')
+    regressions = []
+    change = lambda new, old: (new - old) / old * 100 if old else 0.0
+    for route, stats in result['routes'].items():
+        old = baseline['routes'].get(route)
+        if old is None:
+            continue
+        throughput = change(stats['throughput'], old['throughput'])
+        p50 = change(stats['p50_ms'], old['p50_ms'])
+        p95 = change(stats['p95_ms'], old['p95_ms'])
+        regressed = threshold is not None and (p50 > threshold or p95 > threshold or -throughput > threshold)
+        if regressed:
+            regressions.append(route)
+        print_colored(f"{route[:40].ljust(40)}{throughput:>+11.1f}%{p50:>+11.1f}%{p95:>+11.1f}%",
+                      'RED' if regressed else 'END')
+    old_rss = sum(w['rss_kb'] for w in baseline.get('workers', []))
+    new_rss = sum(w['rss_kb'] for w in result['workers'])
+    if old_rss and new_rss:
+        print(f"\nTotal worker RSS: {new_rss / 1024:.1f} MiB ({change(new_rss, old_rss):+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every route of the site under gunicorn.')
+    parser.add_argument('paths', nargs='*', help='only benchmark these paths (default: every page and API)')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS,
+                        help='measured requests per route (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='concurrent clients (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='gunicorn workers (default: from gunicorn.conf.py)')
+    parser.add_argument('--gunicorn-arg', action='append', default=[], dest='gunicorn_args',
+                        help='extra gunicorn argument, e.g. --gunicorn-arg=--threads=4 (repeatable)')
+    parser.add_argument('--upstream-latency', type=float, default=0.0, metavar='SECONDS',
+                        help='delay every stub GitHub/GA response (default: %(default)s)')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help=f'clients downloading {SLOW_CLIENT_PATH} at {SLOW_CLIENT_RATE // 1024} KiB/s '
+                             f'throughout the run (default: %(default)s)')
+    parser.add_argument('--compare', metavar='REF',
+                        help='compare with the stored run for a git ref or results file')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PERCENT',
+                        help='exit non-zero if a route got this much slower than the --compare run')
+    parser.add_argument('--no-save', action='store_true', help='do not store this run')
+    parser.add_argument('--json', action='store_true', help='print the result document instead of a table')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        baseline = load(args.compare)
+        if baseline is None:
+            parser.error(f"no stored benchmark for {args.compare} in {RESULTS_DIR}")
+
+    result = run_benchmark(args.requests, args.concurrency, args.workers, args.gunicorn_args, args.paths,
+                           args.upstream_latency, args.slow_clients)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    if not args.no_save:
+        print(f"\nSaved to {os.path.relpath(save(result), ROOT)}", file=sys.stderr if args.json else sys.stdout)
+
+    if baseline is not None:
+        regressions = compare(result, baseline, args.fail_on_regression)
+        if regressions:
+            print_colored(f"\n{len(regressions)} routes regressed by more than {args.fail_on_regression}%", 'RED')
+            return False
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
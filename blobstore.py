@@ -0,0 +1,251 @@
+"""
+Content-addressed store for files that are mirrored between ``static/``,
+``archive/`` and ``attached_assets/``.
+
+Each unique file is kept once under ``blobs/objects/<aa>/<sha256[2:]>`` and
+``blobs/index.json`` maps the logical paths it used to live at (relative to
+the app root, e.g. ``static/images/xgboost_chart.png``) to its digest. The
+artifact registry and the ``static`` endpoint fall back to the index when a
+path is missing on disk, so routes keep using the same logical paths.
+
+``python blobstore.py migrate`` hashes the mirrored trees and moves every
+file whose content appears more than once into the store, deleting the
+copies; ``--dry-run`` only reports what would be collapsed. ``verify``
+re-hashes the objects and ``restore`` writes the files back to their logical
+paths.
+"""
+import argparse
+import json
+import mimetypes
+import os
+import posixpath
+import shutil
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+from flask import send_file
+
+from artifacts import hash_file
+
+DEFAULT_DIR = 'blobs'
+INDEX_NAME = 'index.json'
+OBJECTS_DIR = 'objects'
+INDEX_VERSION = 1
+MIRROR_ROOTS = ['static', 'archive', 'attached_assets']
+# Build output and caches are regenerated, never deduplicated
+EXCLUDE = ['static/dist']
+
+
+@dataclass(frozen=True)
+class BlobEntry:
+    """Where a logical path's content lives in the store."""
+    sha256: str
+    size: int
+    mtime: float
+
+
+class BlobStore:
+    """Logical-path index over a directory of content-addressed objects."""
+
+    def __init__(self, root=None):
+        self.root = root
+        self.paths = {}
+        self._mtime = None
+
+    def init_app(self, app):
+        """Load the index and serve stored files from the ``static`` endpoint."""
+        self.root = app.config.get('BLOB_STORE_DIR') or os.path.join(app.root_path, DEFAULT_DIR)
+        self.load()
+        app.extensions['blobs'] = self
+
+        static_view = app.view_functions.get('static')
+        if static_view is None:
+            return
+        static_prefix = os.path.relpath(app.static_folder, app.root_path).replace(os.sep, '/')
+
+        def static(filename):
+            entry = self.lookup(posixpath.join(static_prefix, filename))
+            if entry is None or os.path.isfile(os.path.join(app.static_folder, filename)):
+                return static_view(filename=filename)
+            return send_file(self.object_path(entry.sha256),
+                             mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                             etag=entry.sha256[:32], last_modified=entry.mtime,
+                             max_age=app.get_send_file_max_age(filename), conditional=True)
+
+        app.view_functions['static'] = static
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_NAME)
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, OBJECTS_DIR, sha256[:2], sha256[2:])
+
+    def load(self):
+        """(Re)load the index if it changed on disk; a missing index is an empty store."""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            self.paths, self._mtime = {}, None
+            return self.paths
+        if mtime != self._mtime:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            self.paths = {path: BlobEntry(**entry) for path, entry in data['paths'].items()}
+            self._mtime = mtime
+        return self.paths
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION,
+                       'paths': {path: asdict(entry) for path, entry in sorted(self.paths.items())}},
+                      f, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._mtime = os.path.getmtime(self.index_path)
+
+    def lookup(self, path):
+        """The :class:`BlobEntry` for a logical path, or ``None``."""
+        return self.paths.get(path)
+
+    def __contains__(self, path):
+        return path in self.paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def walk(self, root):
+        """Logical paths stored under the directory ``root``."""
+        prefix = root.rstrip('/') + '/'
+        return sorted(path for path in self.paths if path.startswith(prefix))
+
+    def put(self, path, source, sha256=None):
+        """Store the file at ``source`` under the logical ``path``; returns its entry."""
+        sha256 = sha256 or hash_file(source)
+        target = self.object_path(sha256)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, target)
+        stat = os.stat(source)
+        entry = self.paths[path] = BlobEntry(sha256=sha256, size=stat.st_size, mtime=stat.st_mtime)
+        return entry
+
+    def objects(self):
+        """Digests referenced by the index."""
+        return {entry.sha256 for entry in self.paths.values()}
+
+
+def _scan(app_root, roots, exclude=EXCLUDE):
+    """``{sha256: [logical paths]}`` for every file under ``roots``."""
+    groups = defaultdict(list)
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(app_root, root)):
+            relative_dir = os.path.relpath(dirpath, app_root).replace(os.sep, '/')
+            dirnames[:] = [d for d in dirnames
+                           if posixpath.join(relative_dir, d) not in exclude and d != '__pycache__']
+            for filename in filenames:
+                path = posixpath.join(relative_dir, filename)
+                groups[hash_file(os.path.join(app_root, path))].append(path)
+    return groups
+
+
+def migrate(store, app_root, roots=MIRROR_ROOTS, everything=False, dry_run=False):
+    """Move duplicated files (or, with ``everything``, all files) into the store.
+
+    Returns ``(moved paths, bytes saved)``; nothing is written with ``dry_run``.
+    """
+    moved, saved = [], 0
+    stored = store.objects()
+    for sha256, paths in sorted(_scan(app_root, roots).items()):
+        if len(paths) < 2 and sha256 not in stored and not everything:
+            continue
+        size = os.path.getsize(os.path.join(app_root, paths[0]))
+        saved += size * (len(paths) - (sha256 not in stored))
+        for path in sorted(paths):
+            full_path = os.path.join(app_root, path)
+            if not dry_run:
+                store.put(path, full_path, sha256=sha256)
+            moved.append((path, sha256, size))
+    if not dry_run and moved:
+        # The index is written before the copies go, so an interruption loses nothing
+        store.save()
+        for path, _, _ in moved:
+            os.remove(os.path.join(app_root, path))
+    return moved, saved
+
+
+def verify(store):
+    """Digests whose object is missing or no longer matches its name."""
+    return sorted(sha256 for sha256 in store.objects()
+                  if not os.path.isfile(store.object_path(sha256))
+                  or hash_file(store.object_path(sha256)) != sha256)
+
+
+def restore(store, app_root, prefix=''):
+    """Write stored files back to their logical paths and drop them from the index."""
+    restored = []
+    for path in store.walk(prefix) if prefix else sorted(store.paths):
+        entry = store.paths.pop(path)
+        full_path = os.path.join(app_root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        shutil.copyfile(store.object_path(entry.sha256), full_path)
+        os.utime(full_path, (entry.mtime, entry.mtime))
+        restored.append(path)
+    store.save()
+
+    # Objects no other path refers to are no longer needed
+    referenced = store.objects()
+    for dirpath, _, filenames in os.walk(os.path.join(store.root, OBJECTS_DIR)):
+        for filename in filenames:
+            if os.path.basename(dirpath) + filename not in referenced:
+                os.remove(os.path.join(dirpath, filename))
+    return restored
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Manage the content-addressed store for mirrored files.')
+    parser.add_argument('--store', default=os.path.join(root, DEFAULT_DIR),
+                        help='store directory (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = commands.add_parser('migrate', help='collapse duplicated files into the store')
+    migrate_parser.add_argument('roots', nargs='*', default=MIRROR_ROOTS,
+                                help='directories to scan, relative to the app (default: %(default)s)')
+    migrate_parser.add_argument('--all', action='store_true', dest='everything',
+                                help='store every file, not only duplicated ones')
+    migrate_parser.add_argument('--dry-run', action='store_true', help='report without changing anything')
+
+    commands.add_parser('verify', help='re-hash every stored object')
+
+    restore_parser = commands.add_parser('restore', help='write stored files back to their paths')
+    restore_parser.add_argument('prefix', nargs='?', default='',
+                                help='only restore paths under this directory')
+    args = parser.parse_args()
+
+    store = BlobStore(args.store)
+    store.load()
+
+    if args.command == 'migrate':
+        moved, saved = migrate(store, root, args.roots, everything=args.everything, dry_run=args.dry_run)
+        for path, sha256, size in moved:
+            print(f"{path} -> {sha256[:12]} ({size} bytes)")
+        action = 'Would store' if args.dry_run else 'Stored'
+        print(f"{action} {len(moved)} files as {len({m[1] for m in moved})} blobs, saving {saved} bytes")
+    elif args.command == 'verify':
+        bad = verify(store)
+        for sha256 in bad:
+            print(f"missing or corrupt: {sha256}")
+        print(f"{len(store.objects()) - len(bad)}/{len(store.objects())} objects OK")
+        return not bad
+    else:
+        for path in restore(store, root, args.prefix):
+            print(f"restored {path}")
+    return True
+
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
@@ -0,0 +1,336 @@
+"""
+Channel budget optimiser for the WooliesX Christmas campaign model.
+
+``budget_optimization_model.ipynb`` searches for the best split of a daily
+budget across social media, SEM, email and display with three nested loops,
+calling ``scaler.transform`` and ``model.predict`` once per candidate. Here
+the whole candidate grid is built as one NumPy matrix and scored in a single
+batched predict call; optional refinement rounds zoom in on the best
+candidate with a finer grid, still within the channel bounds, which gives a
+constrained continuous search for a few more batches.
+
+The model is the latest version published to a
+:class:`model_registry.ModelRegistry` (``python model_registry.py publish``),
+or any fitted ``model``/``scaler`` pair with the scikit-learn interface
+(``predict`` / ``transform``), e.g. the notebook's ``XGBRegressor`` and
+``StandardScaler``. Without either, a ridge regression is fitted with NumPy
+on the notebook's simulated campaign data on first use; that data is linear
+in spend, so the surrogate ranks allocations the same way the notebook's
+model does.
+
+NumPy is optional and only imported when an optimisation runs.
+
+Usage:
+    python budget_optimizer.py [--budget 150000] [--days 14] [--steps 10] [--refine 2]
+"""
+import argparse
+import functools
+import importlib.util
+import json
+import threading
+import time
+from datetime import date, timedelta
+
+CHANNELS = ('social_media', 'sem', 'email', 'display')
+
+# Feature order used in training (cell 11 of the notebook)
+FEATURES = ['social_media_spend', 'sem_spend', 'email_spend', 'display_spend',
+            'days_to_christmas', 'is_weekend', 'is_public_holiday',
+            'total_marketing_spend', 'day_0', 'day_1', 'day_2', 'day_3', 'day_4', 'day_5', 'day_6',
+            'week_of_campaign', 'social_ratio', 'sem_ratio', 'email_ratio', 'display_ratio',
+            'prev_day_sales', 'prev_day_total_spend']
+
+# Share of the budget each channel may take. Social, SEM and email are
+# searched; display gets the remainder and must be positive (as in the notebook).
+BOUNDS = {
+    'social_media': (0.1, 0.4),
+    'sem': (0.1, 0.4),
+    'email': (0.1, 0.3),
+    'display': (0.0, 0.4),
+}
+MODEL_NAME = 'christmas_sales'
+# Week of the campaign assumed when a query does not give one (late November)
+DEFAULT_WEEK = 8
+DEFAULT_STEPS = 10
+MAX_STEPS = 40
+MAX_REFINE = 5
+
+# Placeholders the notebook uses for the lagged features when predicting
+PREV_DAY_SALES = 700000
+PREV_DAY_TOTAL_SPEND = 150000
+
+CAMPAIGN_START = date(2022, 10, 1)
+CAMPAIGN_END = date(2022, 12, 31)
+CHRISTMAS = date(2022, 12, 25)
+
+
+class OptimizerError(ValueError):
+    """Raised for scenario parameters the optimiser cannot search."""
+
+
+@functools.cache
+def available():
+    """Whether NumPy is installed; checked without importing it."""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def feature_matrix(spend, days_to_christmas, is_weekend=0, is_holiday=0, week=DEFAULT_WEEK, day_of_week=0,
+                   prev_day_sales=PREV_DAY_SALES, prev_day_total_spend=PREV_DAY_TOTAL_SPEND):
+    """Model inputs for ``spend`` (an ``(n, 4)`` array of channel spend), one row per allocation.
+
+    The scenario parameters are scalars or length-``n`` arrays.
+    """
+    import numpy as np
+
+    spend = np.asarray(spend, dtype=float)
+    n = len(spend)
+    total = spend.sum(axis=1)
+    X = np.zeros((n, len(FEATURES)))
+    X[:, 0:4] = spend
+    X[:, 4] = days_to_christmas
+    X[:, 5] = is_weekend
+    X[:, 6] = is_holiday
+    X[:, 7] = total
+    X[np.arange(n), 8 + np.broadcast_to(np.asarray(day_of_week, dtype=int), (n,))] = 1
+    X[:, 15] = week
+    np.divide(spend, total[:, None], out=X[:, 16:20], where=total[:, None] > 0)
+    X[:, 20] = prev_day_sales
+    X[:, 21] = prev_day_total_spend
+    return X
+
+
+def allocation_grid(steps=DEFAULT_STEPS, bounds=None, centre=None, span=None):
+    """Candidate budget shares as an ``(m, 4)`` array, rows summing to 1.
+
+    Social, SEM and email each take ``steps`` evenly spaced values over their
+    bounds (or over ``centre +/- span``, clipped to the bounds); display gets
+    the remainder, and rows where it falls outside its bounds are dropped.
+    """
+    import numpy as np
+
+    bounds = bounds or BOUNDS
+    axes = []
+    for i, channel in enumerate(CHANNELS[:3]):
+        low, high = bounds[channel]
+        if centre is not None:
+            low, high = max(low, centre[i] - span[i]), min(high, centre[i] + span[i])
+        axes.append(np.linspace(low, high, steps))
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+    display = 1 - grid.sum(axis=1)
+    low, high = bounds['display']
+    keep = (display > low) & (display <= high)
+    return np.column_stack([grid[keep], display[keep]])
+
+
+class Standardizer:
+    """Zero-mean, unit-variance scaling, as ``sklearn.preprocessing.StandardScaler``."""
+
+    def fit(self, X):
+        import numpy as np
+
+        self.mean_ = X.mean(axis=0)
+        scale = X.std(axis=0)
+        self.scale_ = np.where(scale > 0, scale, 1.0)
+        return self
+
+    def transform(self, X):
+        return (X - self.mean_) / self.scale_
+
+
+class RidgeSalesModel:
+    """Linear sales model on standardised features, fitted in closed form."""
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def fit(self, X, y):
+        import numpy as np
+
+        design = np.column_stack([X, np.ones(len(X))])
+        penalty = self.alpha * np.eye(design.shape[1])
+        penalty[-1, -1] = 0  # the intercept is not penalised
+        weights = np.linalg.solve(design.T @ design + penalty, design.T @ y)
+        self.coef_, self.intercept_ = weights[:-1], weights[-1]
+        return self
+
+    def predict(self, X):
+        return X @ self.coef_ + self.intercept_
+
+
+def simulate_campaign(seed=42):
+    """The notebook's simulated daily campaign data: ``(X, y)`` over its feature order."""
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+    days = [CAMPAIGN_START + timedelta(days=i) for i in range((CAMPAIGN_END - CAMPAIGN_START).days + 1)]
+    n = len(days)
+    spend = np.column_stack([
+        rng.normal(50000, 15000, n),
+        rng.normal(40000, 10000, n),
+        rng.normal(20000, 5000, n),
+        rng.normal(35000, 12000, n),
+    ])
+    day_of_week = np.array([d.weekday() for d in days])
+    days_to_christmas = np.array([(CHRISTMAS - d).days for d in days])
+    is_weekend = (day_of_week >= 5).astype(int)
+    is_holiday = rng.choice([0, 1], size=n, p=[0.95, 0.05])
+
+    sales = (500000 + spend @ np.array([2.3, 3.1, 4.5, 1.8])
+             + np.exp(-days_to_christmas / 30) * 200000
+             + 50000 * is_weekend + 100000 * is_holiday)
+    sales = np.maximum(0, sales + rng.normal(0, 50000, n))
+
+    total = spend.sum(axis=1)
+    X = feature_matrix(spend, days_to_christmas, is_weekend, is_holiday,
+                       week=np.arange(n) // 7, day_of_week=day_of_week,
+                       prev_day_sales=np.concatenate([[0], sales[:-1]]),
+                       prev_day_total_spend=np.concatenate([[0], total[:-1]]))
+    return X, sales
+
+
+def fit_surrogate(X=None, y=None):
+    """``(model, scaler)``: the NumPy ridge model, fitted on the simulated campaign by default."""
+    if X is None:
+        X, y = simulate_campaign()
+    scaler = Standardizer().fit(X)
+    return RidgeSalesModel().fit(scaler.transform(X), y), scaler
+
+
+class Predictor:
+    """A fitted model and its scaler, applied to raw feature rows."""
+
+    def __init__(self, model, scaler, label='surrogate'):
+        self.model = model
+        self.scaler = scaler
+        self.label = label
+
+    def predict(self, X):
+        import numpy as np
+
+        return np.asarray(self.model.predict(self.scaler.transform(X)), dtype=float)
+
+
+class BudgetOptimizer:
+    """Batched grid search over channel allocations for a fitted sales model."""
+
+    def __init__(self, model=None, scaler=None, registry=None, model_name=MODEL_NAME, version=None,
+                 steps=DEFAULT_STEPS, max_steps=MAX_STEPS, max_refine=MAX_REFINE):
+        self.model = model
+        self.scaler = scaler
+        self.registry = registry
+        self.model_name = model_name
+        self.version = version
+        self.steps = steps
+        self.max_steps = max_steps
+        self.max_refine = max_refine
+        self._predictor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.version = app.config.get('SALES_MODEL_VERSION') or self.version
+        if self.version and self.registry is not None:
+            # Fail at startup rather than on every request for a version that was never published
+            self.version = self.registry.resolve(self.model_name, self.version)
+        self.steps = app.config.get('OPTIMIZER_GRID_STEPS', self.steps)
+        self.max_steps = app.config.get('OPTIMIZER_MAX_STEPS', self.max_steps)
+        app.extensions['budget_optimizer'] = self
+
+    @property
+    def predictor(self):
+        """The model in use, loaded (or fitted) on first use."""
+        if self._predictor is None:
+            with self._lock:
+                if self._predictor is None:
+                    self._predictor = self._load()
+        return self._predictor
+
+    def _load(self):
+        if self.model is None and self.registry is not None:
+            loaded = self.registry.load(self.model_name, self.version)
+            if loaded is not None:
+                return loaded
+        if self.model is not None:
+            model, scaler, label = self.model, self.scaler, 'custom'
+        else:
+            (model, scaler), label = fit_surrogate(), 'surrogate'
+        return Predictor(model, scaler, label)
+
+    def predict(self, X):
+        """Predicted sales for each row of a feature matrix, in one call."""
+        return self.predictor.predict(X)
+
+    def predict_sales(self, spend, **scenario):
+        return self.predict(feature_matrix(spend, **scenario))
+
+    def optimize(self, total_budget, days_to_christmas, is_weekend=0, is_holiday=0, week=DEFAULT_WEEK, day_of_week=0,
+                 steps=None, refine=0):
+        """Best allocation of ``total_budget`` for one day, plus the equal-split baseline.
+
+        Each round scores its whole grid in a single predict call; every
+        refinement round re-centres a grid one spacing wide on the best share
+        so far, so the resolution improves by ``steps / 2`` per round.
+        """
+        import numpy as np
+
+        steps = self.steps if steps is None else steps
+        if not 0 < total_budget < float('inf'):
+            raise OptimizerError('total_budget must be positive')
+        if not 2 <= steps <= self.max_steps:
+            raise OptimizerError(f'steps must be between 2 and {self.max_steps}')
+        if not 0 <= refine <= self.max_refine:
+            raise OptimizerError(f'refine must be between 0 and {self.max_refine}')
+        if not 0 <= day_of_week <= 6:
+            raise OptimizerError('day_of_week must be between 0 (Monday) and 6')
+        scenario = dict(days_to_christmas=days_to_christmas, is_weekend=is_weekend, is_holiday=is_holiday,
+                        week=week, day_of_week=day_of_week)
+
+        started = time.perf_counter()
+        baseline = float(self.predict_sales(np.full((1, 4), total_budget / 4), **scenario)[0])
+        best_shares, best_sales, candidates = None, -np.inf, 0
+        span = [(high - low) / (steps - 1) for low, high in (BOUNDS[c] for c in CHANNELS[:3])]
+        shares = allocation_grid(steps)
+        for _ in range(refine + 1):
+            if len(shares):
+                sales = self.predict_sales(shares * total_budget, **scenario)
+                candidates += len(shares)
+                index = int(np.argmax(sales))
+                if sales[index] > best_sales:
+                    best_shares, best_sales = shares[index], float(sales[index])
+            if best_shares is None:
+                break
+            shares = allocation_grid(steps, centre=best_shares, span=span)
+            span = [2 * s / (steps - 1) for s in span]
+
+        if best_shares is None:
+            raise OptimizerError('no allocation satisfies the channel bounds')
+        return {
+            'allocation': {c: float(s * total_budget) for c, s in zip(CHANNELS, best_shares)},
+            'shares': {c: float(s) for c, s in zip(CHANNELS, best_shares)},
+            'predicted_sales': best_sales,
+            'roi': best_sales / total_budget,
+            'baseline': {'predicted_sales': baseline, 'roi': baseline / total_budget},
+            'improvement': (best_sales - baseline) / baseline if baseline else None,
+            'candidates': candidates,
+            'model': self.predictor.label,
+            'seconds': time.perf_counter() - started,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the best channel split of a daily budget.')
+    parser.add_argument('--budget', type=float, default=150000, help='daily budget (default: %(default)s)')
+    parser.add_argument('--days', type=int, default=14, help='days to Christmas (default: %(default)s)')
+    parser.add_argument('--weekend', action='store_true')
+    parser.add_argument('--holiday', action='store_true')
+    parser.add_argument('--week', type=int, default=DEFAULT_WEEK, help='week of the campaign (default: %(default)s)')
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS, help='grid points per channel')
+    parser.add_argument('--refine', type=int, default=0, help='refinement rounds around the best candidate')
+    args = parser.parse_args()
+
+    result = BudgetOptimizer().optimize(args.budget, args.days, int(args.weekend), int(args.holiday), args.week,
+                                        steps=args.steps, refine=args.refine)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Helpers for producing and negotiating compressed response bodies.
+
+:class:`ResponseCompressor` applies them to every response of an app:
+
+* static files are answered with their precompressed ``.br``/``.gz`` sibling
+  when one exists (``python assets.py`` writes them for ``static/dist``);
+* other compressible responses above a size threshold are compressed on the
+  fly, with the compressed bodies kept in a byte-bounded LRU keyed by the
+  SHA-256 of the identity body, so a page is compressed once per content.
+
+Responses that are streamed, partial (``206``/``Range``), already encoded or
+marked ``no-transform`` are passed through untouched. ``Vary: Accept-Encoding``
+is added to every response whose representation depends on the header.
+
+Brotli is optional: when the ``brotli`` package is not installed only gzip
+variants are produced.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Server preference order when the client rates several encodings equally
+PREFERRED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Faster settings for bodies compressed while a request waits
+DYNAMIC_LEVELS = {'gzip': 6, 'br': 5}
+
+SIBLING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/csv', 'text/markdown',
+    'text/javascript', 'application/javascript', 'application/json', 'application/xml',
+    'application/x-ndjson', 'image/svg+xml',
+])
+
+
+def compress(body, encoding, level=None):
+    """Compress ``body`` with ``encoding`` (``'gzip'`` or ``'br'``).
+
+    ``level`` overrides the default (maximum) gzip level or brotli quality.
+    """
+    if encoding == 'gzip':
+        # mtime=0 keeps the output byte-identical across runs
+        return gzip.compress(body, compresslevel=level or GZIP_LEVEL, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=level or BROTLI_QUALITY)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def encode_variants(body, encodings=PREFERRED_ENCODINGS):
+    """Return ``{encoding: bytes}`` for every supported encoding.
+
+    Variants that do not come out smaller than the identity body are dropped.
+    """
+    variants = {}
+    for encoding in encodings:
+        compressed = compress(body, encoding)
+        if len(compressed) < len(body):
+            variants[encoding] = compressed
+    return variants
+
+
+def negotiate(accept_encodings, available):
+    """Pick the best encoding in ``available`` for a parsed Accept-Encoding header.
+
+    Returns ``None`` when the identity body should be sent. Ties in client
+    quality are broken by :data:`PREFERRED_ENCODINGS`.
+    """
+    best, best_quality = None, 0
+    for encoding in PREFERRED_ENCODINGS:
+        if encoding not in available:
+            continue
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class ResponseCompressor:
+    """``after_request`` layer that content-encodes responses for the client."""
+
+    def __init__(self, min_size=1024, max_bytes=4 * 1024 * 1024, mimetypes=COMPRESSIBLE_MIMETYPES):
+        self.min_size = min_size
+        self.max_bytes = max_bytes
+        self.mimetypes = mimetypes
+        self.hits = 0
+        self.misses = 0
+        self._bodies = OrderedDict()
+        self._size = 0
+        self._siblings = {}
+        self._lock = threading.Lock()
+        self._static_folder = None
+        self._stat_siblings = False
+
+    def init_app(self, app):
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.max_bytes = app.config.get('COMPRESS_CACHE_MAX_BYTES', self.max_bytes)
+        self._static_folder = app.static_folder
+        # Look for new sibling files on every request only while developing
+        self._stat_siblings = app.debug
+        app.after_request(self.process_response)
+        app.extensions['compressor'] = self
+
+    def _compressed(self, body, encoding):
+        """Compressed ``body``, from the LRU when this content was compressed before."""
+        key = (hashlib.sha256(body).digest(), encoding)
+        with self._lock:
+            cached = self._bodies.get(key)
+            if cached is not None:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        compressed = compress(body, encoding, DYNAMIC_LEVELS[encoding])
+        if len(compressed) <= self.max_bytes:
+            with self._lock:
+                if key not in self._bodies:
+                    self._bodies[key] = compressed
+                    self._size += len(compressed)
+                while self._size > self.max_bytes:
+                    _, evicted = self._bodies.popitem(last=False)
+                    self._size -= len(evicted)
+        return compressed
+
+    def _sibling_encodings(self, filename):
+        """Encodings with a precompressed sibling of ``filename`` in the static folder."""
+        available = None if self._stat_siblings else self._siblings.get(filename)
+        if available is None:
+            path = os.path.join(self._static_folder, filename)
+            available = frozenset(encoding for encoding, suffix in SIBLING_SUFFIXES.items()
+                                  if encoding in PREFERRED_ENCODINGS and os.path.isfile(path + suffix))
+            self._siblings[filename] = available
+        return available
+
+    def process_response(self, response):
+        if request.endpoint == 'static' and response.status_code < 400 and \
+                self._sibling_encodings(request.view_args['filename']):
+            # A URL with a .br/.gz sibling varies by encoding, including its 206 and 304 responses
+            response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or request.range is not None or \
+                response.content_encoding or response.cache_control.no_transform:
+            return response
+        if response.mimetype not in self.mimetypes:
+            return response
+        if request.endpoint == 'static' and response.direct_passthrough:
+            return self._serve_sibling(response)
+        if response.is_streamed or response.direct_passthrough:
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.accept_encodings, PREFERRED_ENCODINGS)
+        if encoding is None:
+            return response
+
+        compressed = self._compressed(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+        response.set_data(compressed)
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # The encoded body is a different representation with its own validator
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+            response.make_conditional(request)
+        return response
+
+    def _serve_sibling(self, response):
+        filename = request.view_args['filename']
+        available = self._sibling_encodings(filename)
+        if not available:
+            return response
+        encoding = negotiate(request.accept_encodings, available)
+        if encoding is None:
+            response.vary.add('Accept-Encoding')
+            return response
+
+        sibling = send_from_directory(self._static_folder, filename + SIBLING_SUFFIXES[encoding],
+                                      mimetype=response.mimetype)
+        response.close()
+        if 'Content-Disposition' in response.headers:
+            sibling.headers['Content-Disposition'] = response.headers['Content-Disposition']
+        sibling.content_encoding = encoding
+        sibling.vary.add('Accept-Encoding')
+        sibling.cache_control.no_cache = response.cache_control.no_cache
+        sibling.cache_control.max_age = response.cache_control.max_age
+        return sibling
@@ -0,0 +1,122 @@
+"""
+Download serving for the resume, project PDFs and workbook/presentation files.
+
+Files are looked up in the artifact registry (``downloads/<tree>/<path>``), so
+the ETag comes from the content hash computed at startup and no request
+touches the filesystem until the body is sent. Responses support conditional
+requests and single byte ranges (``206 Partial Content``), which lets PDF
+viewers fetch only the pages they display.
+
+Bodies are handed to the server's ``wsgi.file_wrapper``, so gunicorn sends
+them with ``sendfile(2)`` instead of reading them through Python. For a range
+the file is positioned at the first byte and the ``Content-Length`` bounds the
+transfer; servers that do not honour that (anything but gunicorn) get a
+bounded chunked reader instead.
+
+Downloads of the whole file (a ``200``, or a range covering every byte) are
+counted per file in a small SQLite database shared by all workers. Partial
+ranges are not counted: a PDF viewer fetching a document in pieces, or a
+client resuming a download, would otherwise count several times.
+"""
+import mimetypes
+import os
+import posixpath
+import sqlite3
+from contextlib import closing
+
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+SUFFIXES = ['.pdf', '.pptx', '.twbx', '.xlsx', '.docx']
+CHUNK_SIZE = 64 * 1024
+
+# Shown in the browser; everything else is offered as an attachment
+INLINE_MIMETYPES = frozenset(['application/pdf'])
+
+mimetypes.add_type('application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx')
+mimetypes.add_type('application/x-twbx', '.twbx')
+
+
+def _read_range(file, length):
+    """Yield ``length`` bytes from ``file``'s current position, then close it."""
+    try:
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+class DownloadService:
+    """Serves registry artifacts with ranges and zero-copy transfer, and counts downloads."""
+
+    def __init__(self, registry, prefix='downloads', max_age=3600, db_path=None):
+        self.registry = registry
+        self.prefix = prefix
+        self.max_age = max_age
+        self.db_path = db_path
+
+    def init_app(self, app):
+        self.max_age = app.config.get('DOWNLOAD_MAX_AGE', self.max_age)
+        self.db_path = app.config.get('DOWNLOAD_STATS_DB') or os.path.join(app.instance_path, 'downloads.sqlite3')
+        app.extensions['downloads'] = self
+
+    def get(self, name):
+        return self.registry.get(f'{self.prefix}/{name}')
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=5)
+        connection.execute('CREATE TABLE IF NOT EXISTS downloads (name TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+        return connection
+
+    def record(self, name):
+        with closing(self._connect()) as connection, connection:
+            connection.execute('INSERT INTO downloads (name, count) VALUES (?, 1) '
+                               'ON CONFLICT(name) DO UPDATE SET count = count + 1', (name,))
+
+    def counts(self):
+        """``{name: downloads}`` across every worker."""
+        with closing(self._connect()) as connection:
+            return dict(connection.execute('SELECT name, count FROM downloads ORDER BY name'))
+
+    def send(self, artifact):
+        """Build the (possibly partial or ``304``) response for an artifact."""
+        mimetype = mimetypes.guess_type(artifact.name)[0] or 'application/octet-stream'
+        response = Response(mimetype=mimetype, direct_passthrough=True)
+        response.headers.set('Content-Disposition',
+                             'inline' if mimetype in INLINE_MIMETYPES else 'attachment',
+                             filename=posixpath.basename(artifact.name))
+        response.set_etag(artifact.etag)
+        response.last_modified = artifact.mtime
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+
+        # Let werkzeug evaluate If-None-Match/If-Range/Range against the
+        # validators; it sets the status, Content-Range and Content-Length
+        response.make_conditional(request, accept_ranges=True, complete_length=artifact.size)
+        if response.status_code == 206:
+            start, stop = response.content_range.start, response.content_range.stop
+        elif response.status_code == 200:
+            start, stop = 0, artifact.size
+            response.content_length = artifact.size
+        else:
+            return response
+
+        if request.method == 'HEAD':
+            response.response = []
+            return response
+        if start == 0 and stop == artifact.size:
+            self.record(artifact.name[len(self.prefix) + 1:])
+
+        file = open(artifact.path, 'rb')
+        file.seek(start)
+        if stop == artifact.size or request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/'):
+            # gunicorn's sendfile starts at the current offset and stops at Content-Length
+            response.response = wrap_file(request.environ, file, CHUNK_SIZE)
+        else:
+            response.response = _read_range(file, stop - start)
+        return response
@@ -0,0 +1,309 @@
+"""
+Synthetic source data for the local points cost forecast pipeline.
+
+Creates the ``src_*`` tables that ``Points_Cost_Forecast_Local.sql`` reads in
+place of the BigQuery sources: the FY24-FY25 Big W calendar, the destination
+business mapping, an article master, daily finance actuals and merch
+forecasts, basket-level article sales, Everyday Extra offers tied to those
+baskets, and the FY25 campaign plan.
+
+Data arrives in batches, the way the daily extracts do: ``init`` loads
+everything up to an as-of date as batch 1, and each ``append`` adds the next
+days' actuals as a new batch. Fact tables carry a ``_batch`` column, which
+the pipeline uses as its watermark. ``replan`` edits campaigns in place, as a
+re-forecast of the plan would.
+
+Every day's rows come from their own seeded generator, so the same days
+always produce the same data however they were batched.
+"""
+import contextlib
+import datetime
+import random
+
+FISCAL_YEARS = {2024: ('2023-06-26', 52), 2025: ('2024-06-24', 53)}
+DEFAULT_AS_OF = '2025-03-16'
+SEED = 20250509
+SALES_ORG = 1060
+CHANNELS = ('Store', 'HD01', 'CC01')
+BASKETS_PER_DAY = 60
+CUSTOMERS = 2500
+
+# (Business, Category, SubCategory, weekly net sales)
+DESTINATIONS = [
+    ('Everyday Celebrations & Events', 'Pet', 'Pet Food', 180000),
+    ('Everyday Celebrations & Events', 'Pet', 'Pet Accessories', 90000),
+    ('Everyday Celebrations & Events', 'Party', 'Party Supplies', 70000),
+    ('Home & Living', 'Furniture', 'Bedroom', 150000),
+    ('Home & Living', 'Furniture', 'Outdoor Furniture', 110000),
+    ('Home & Living', 'Kitchen', 'Cookware', 130000),
+    ('Apparel', 'Apparel', 'Womenswear', 260000),
+    ('Apparel', 'Apparel', 'Menswear', 170000),
+    ('Apparel', 'Footwear', 'Kids Footwear', 80000),
+    ('Toys & Leisure', 'Toys', 'Construction Toys', 200000),
+    ('Toys & Leisure', 'Toys', 'Dolls', 120000),
+    ('Toys & Leisure', 'Sport', 'Fitness', 60000),
+]
+ARTICLES_PER_SUBCATEGORY = 20
+DAY_WEIGHTS = (0.112, 0.127, 0.135, 0.164, 0.154, 0.179, 0.130)  # Monday first
+
+SCHEMA = """
+CREATE TABLE src_dim_date (
+    CalendarDay TEXT PRIMARY KEY, FiscalWeekYear INTEGER, FiscalWeek INTEGER,
+    FiscalWeekStartDate TEXT, FiscalWeekEndDate TEXT, FiscalYear INTEGER,
+    BigWFiscalYear INTEGER, BigWFiscalYearPeriod INTEGER, BigWFiscalWeek INTEGER, WeekDayNumber INTEGER
+);
+CREATE TABLE src_destination_business (Business TEXT, Category TEXT, SubCategory TEXT);
+CREATE TABLE src_article_master (ArticleWITHUOM TEXT, SalesOrg INTEGER, CategoryDescription TEXT);
+CREATE TABLE src_fin_profit (
+    Calendar_Day TEXT, fiscal_year TEXT, SalesOrg TEXT, Sales_Channel TEXT,
+    MerchandiseManager_Code TEXT, MerchandiseManager_Department TEXT,
+    Category TEXT, Category_Description TEXT, Controller_Description TEXT, Offer_ID_DC TEXT,
+    Value_Type_Description TEXT, Sales_InclTax REAL, Sales_ExclTax REAL, Sales_Merch_Forecast REAL,
+    Scanback REAL, Total_Discounts REAL, LoyaltyRewards REAL, COGS REAL, Gross_Profit REAL,
+    _batch INTEGER
+);
+CREATE TABLE src_article_sales (
+    start_txn_date TEXT, division_nbr INTEGER, sales_channel_desc TEXT, category TEXT,
+    basket_key TEXT, order_id TEXT, crn TEXT, prod_nbr TEXT,
+    tot_amt_incld_gst REAL, tot_amt_excld_gst_wo_wow REAL, tot_amt_excld_gst_wt_wow REAL,
+    _batch INTEGER
+);
+CREATE TABLE src_edx_offer_details (
+    crn TEXT, Banner TEXT, FiscalWeekStartDate TEXT, LoyaltyCustomerTypeDescription TEXT,
+    offer_type TEXT, benefit TEXT, channel TEXT, OrderID TEXT, basketkey TEXT,
+    ordervalue REAL, reward_value REAL, _batch INTEGER
+);
+CREATE TABLE src_campaign_plan (
+    campaignStream TEXT, CampaignDetails TEXT, fw_CampaignStartDate TEXT, year INTEGER,
+    Campaign_Start_Date TEXT, Campaign_End_Date TEXT, Include_Categories TEXT, costs_budget_fcast REAL
+);
+CREATE TABLE _fixture_state (as_of TEXT, batch INTEGER);
+
+CREATE INDEX src_fin_profit_day ON src_fin_profit (Calendar_Day);
+CREATE INDEX src_fin_profit_batch ON src_fin_profit (_batch);
+CREATE INDEX src_article_sales_day ON src_article_sales (start_txn_date);
+CREATE INDEX src_article_sales_batch ON src_article_sales (_batch);
+CREATE INDEX src_article_master_article ON src_article_master (ArticleWITHUOM, SalesOrg);
+CREATE INDEX src_edx_offer_details_week ON src_edx_offer_details (FiscalWeekStartDate);
+CREATE INDEX src_edx_offer_details_batch ON src_edx_offer_details (_batch);
+"""
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def calendar():
+    """``src_dim_date`` rows: 4-week periods, with any extra weeks in period 13."""
+    rows = []
+    for year, (start, weeks) in FISCAL_YEARS.items():
+        start = _date(start)
+        for week in range(1, weeks + 1):
+            week_start = start + datetime.timedelta(weeks=week - 1)
+            week_end = week_start + datetime.timedelta(days=6)
+            period = min((week - 1) // 4 + 1, 13)
+            for offset in range(7):
+                day = week_start + datetime.timedelta(days=offset)
+                rows.append((day.isoformat(), year * 100 + week, week, week_start.isoformat(),
+                             week_end.isoformat(), year, year, period, week, offset + 1))
+    return rows
+
+
+def last_calendar_day():
+    start, weeks = FISCAL_YEARS[max(FISCAL_YEARS)]
+    return _date(start) + datetime.timedelta(weeks=weeks, days=-1)
+
+
+def _fiscal_year(day):
+    return max(year for year, (start, _) in FISCAL_YEARS.items() if _date(start) <= day)
+
+
+def _week_start(day):
+    start = _date(FISCAL_YEARS[_fiscal_year(day)][0])
+    return start + datetime.timedelta(weeks=(day - start).days // 7)
+
+
+def _seasonality(day):
+    """Christmas peak, a smaller end-of-financial-year bump and steady growth."""
+    christmas = datetime.date(day.year if day.month > 6 else day.year - 1, 12, 24)
+    peak = max(0.0, 1 - abs((day - christmas).days) / 45) * 0.8
+    eofy = 0.15 if day.month == 6 else 0.0
+    growth = 1 + 0.04 * (day - datetime.date(2023, 6, 26)).days / 365
+    return (1 + peak + eofy) * growth
+
+
+def _articles(index):
+    return [f'{100000 + index * 100 + n}-EA' for n in range(ARTICLES_PER_SUBCATEGORY)]
+
+
+def _finance_rows(day, batch):
+    """Finance actuals per sub-category and channel, plus rows the script filters out."""
+    rng = random.Random(f'{SEED}:finance:{day}')
+    year = str(_fiscal_year(day))
+    weight = DAY_WEIGHTS[day.weekday()] * _seasonality(day)
+    rows = []
+    for index, (business, _, subcategory, weekly) in enumerate(DESTINATIONS):
+        for channel, share in zip(CHANNELS, (0.82, 0.11, 0.07)):
+            net = round(weekly * weight * share * rng.uniform(0.85, 1.15), 2)
+            cogs = round(net * rng.uniform(0.58, 0.66), 2)
+            rows.append((day.isoformat(), year, str(SALES_ORG), channel, f'MM{101 + index}_AU', business.upper(),
+                         f'AU{110 + index}', subcategory.upper(), 'Loyalty', f'OF{rng.randint(1, 3)}', 'Actuals',
+                         round(net * 1.1, 2), net, None, round(net * rng.uniform(0.005, 0.015), 2),
+                         round(net * rng.uniform(0.02, 0.04), 2), round(net * rng.uniform(0.003, 0.008), 2),
+                         cogs, round(net - cogs, 2), batch))
+    # Excluded by the script: tobacco, consignment departments and other sales orgs
+    for code, description, org in (('MM001_AU', 'CIGARETTES', SALES_ORG), ('MM922_AU', 'PET FOOD', SALES_ORG),
+                                   ('MM101_AU', 'PET FOOD', 1070)):
+        net = round(rng.uniform(1000, 5000), 2)
+        rows.append((day.isoformat(), year, str(org), 'Store', code, 'OTHER', 'AU999', description, 'Loyalty',
+                     'OF1', 'Actuals', round(net * 1.1, 2), net, None, 10.0, 50.0, 5.0, net * 0.6, net * 0.4, batch))
+    return rows
+
+
+def _forecast_rows(day, batch):
+    rng = random.Random(f'{SEED}:forecast:{day}')
+    year = str(_fiscal_year(day))
+    weight = DAY_WEIGHTS[day.weekday()] * _seasonality(day)
+    return [(day.isoformat(), year, str(SALES_ORG), 'ALL', f'MM{101 + index}_AU', business.upper(),
+             f'AU{110 + index}', subcategory.upper(), 'Merch', None, 'Merch Forecast',
+             0.0, 0.0, round(weekly * weight * rng.uniform(0.95, 1.08), 2), 0.0, 0.0, 0.0, 0.0, 0.0, batch)
+            for index, (business, _, subcategory, weekly) in enumerate(DESTINATIONS)]
+
+
+def _basket_rows(day, batch):
+    """Article sales lines for the day's baskets and the Everyday Extra offers redeemed on them."""
+    rng = random.Random(f'{SEED}:baskets:{day}')
+    week_start = _week_start(day).isoformat()
+    baskets = int(BASKETS_PER_DAY * DAY_WEIGHTS[day.weekday()] * 7 * _seasonality(day))
+    sales, offers = [], []
+    for number in range(baskets):
+        channel = rng.choices(('Store', 'HD', 'CC'), (0.8, 0.12, 0.08))[0]
+        crn = f'33000{rng.randrange(CUSTOMERS):05d}'
+        basket_key = f'{day:%Y%m%d}{number:05d}'
+        order_id = f'{day:%y%m%d}{number:05d}'
+        total = 0.0
+        for _ in range(rng.randint(1, 4)):
+            if rng.random() < 0.03:
+                article, category = '999999-EA', 'Gift Cards'
+            else:
+                article, category = rng.choice(_articles(rng.randrange(len(DESTINATIONS)))), 'General Merch'
+            amount = round(rng.uniform(5, 120), 2)
+            total += amount
+            sales.append((day.isoformat(), SALES_ORG, channel, category, basket_key, order_id, crn, article,
+                          amount, round(amount / 1.1, 2), round(amount / 1.1 * 0.98, 2), batch))
+        if rng.random() < 0.1:
+            online = channel != 'Store'
+            staff = rng.random() < 0.1
+            offers.append((crn, 'Big W', week_start, 'Staff' if staff else 'Customer',
+                           '10% BigW Online' if online else '10% BigW', '10% off', 'Online' if online else 'Instore',
+                           f'BWOL{order_id}' if online else order_id, basket_key, round(total, 2),
+                           round(total * 0.1, 2), batch))
+        elif rng.random() < 0.05:
+            offers.append((crn, 'Big W', week_start, 'Customer', '3x Points BigW', '3x points', 'Instore',
+                           order_id, basket_key, round(total, 2), round(total * 0.015, 2), batch))
+    return sales, offers
+
+
+def campaign_plan():
+    """FY25 weekly campaign streams: storewide cross-banner and BTL, plus ATL per category."""
+    rng = random.Random(f'{SEED}:campaigns')
+    start, weeks = FISCAL_YEARS[2025]
+    rows = []
+    for week in range(weeks):
+        week_start = _date(start) + datetime.timedelta(weeks=week)
+        streams = [('FY25_XBan_Storewide', 'Storewide', 400000)]
+        if week % 2 == 0:
+            streams.append(('FY25_BTL_Storewide', 'Storewide', 150000))
+        for category in ('Pet', 'Toys', 'Apparel', 'Furniture'):
+            if rng.random() < 0.5:
+                streams.append((f'FY25_ATL_{category}', category, 80000))
+        for stream, categories, budget in streams:
+            rows.append((stream, f'{stream} wk{week + 1}', week_start.isoformat(), 2025, week_start.isoformat(),
+                         (week_start + datetime.timedelta(days=6)).isoformat(), categories,
+                         round(budget * _seasonality(week_start) * rng.uniform(0.8, 1.2), 2)))
+    return rows
+
+
+@contextlib.contextmanager
+def _transaction(conn):
+    conn.execute('BEGIN')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def _load_days(conn, first, last, batch, forecasts=False):
+    day = first
+    while day <= last:
+        conn.executemany(f'INSERT INTO src_fin_profit VALUES ({",".join("?" * 20)})', _finance_rows(day, batch))
+        sales, offers = _basket_rows(day, batch)
+        conn.executemany(f'INSERT INTO src_article_sales VALUES ({",".join("?" * 12)})', sales)
+        conn.executemany(f'INSERT INTO src_edx_offer_details VALUES ({",".join("?" * 12)})', offers)
+        day += datetime.timedelta(days=1)
+    if forecasts:
+        day, end = _date(FISCAL_YEARS[min(FISCAL_YEARS)][0]), last_calendar_day()
+        while day <= end:
+            conn.executemany(f'INSERT INTO src_fin_profit VALUES ({",".join("?" * 20)})', _forecast_rows(day, batch))
+            day += datetime.timedelta(days=1)
+
+
+def init(conn, as_of=DEFAULT_AS_OF):
+    """Create the source tables with actuals up to ``as_of`` as batch 1."""
+    as_of = _date(as_of)
+    conn.executescript(SCHEMA)
+    with _transaction(conn):
+        conn.executemany('INSERT INTO src_dim_date VALUES (?,?,?,?,?,?,?,?,?,?)', calendar())
+        conn.executemany('INSERT INTO src_destination_business VALUES (?,?,?)',
+                         [(business, category, subcategory) for business, category, subcategory, _ in DESTINATIONS])
+        conn.executemany('INSERT INTO src_article_master VALUES (?,?,?)',
+                         [(article, SALES_ORG, subcategory.upper())
+                          for index, (_, _, subcategory, _) in enumerate(DESTINATIONS) for article in _articles(index)]
+                         + [('999999-EA', SALES_ORG, 'GIFT CARDS')])
+        conn.executemany('INSERT INTO src_campaign_plan VALUES (?,?,?,?,?,?,?,?)', campaign_plan())
+        _load_days(conn, _date(FISCAL_YEARS[min(FISCAL_YEARS)][0]), as_of, 1, forecasts=True)
+        conn.execute('INSERT INTO _fixture_state VALUES (?, 1)', (as_of.isoformat(),))
+    conn.execute('ANALYZE')
+
+
+def state(conn):
+    """``(as_of, batch)`` of the fixture data, or None if ``conn`` has none."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = '_fixture_state'").fetchone():
+        return None
+    as_of, batch = conn.execute('SELECT as_of, batch FROM _fixture_state').fetchone()
+    return as_of, batch
+
+
+def append(conn, days=1):
+    """Load the next ``days`` days of actuals as a new batch and move as_of forward."""
+    as_of, batch = state(conn)
+    first = _date(as_of) + datetime.timedelta(days=1)
+    last = min(first + datetime.timedelta(days=days - 1), last_calendar_day())
+    if last < first:
+        return as_of
+    with _transaction(conn):
+        _load_days(conn, first, last, batch + 1)
+        conn.execute('UPDATE _fixture_state SET as_of = ?, batch = ?', (last.isoformat(), batch + 1))
+    return last.isoformat()
+
+
+def replan(conn, campaigns=1):
+    """Re-forecast ``campaigns`` future campaigns; every third one also moves a week later."""
+    as_of, batch = state(conn)
+    rng = random.Random(f'{SEED}:replan:{as_of}:{batch}')
+    rowids = [row[0] for row in conn.execute(
+        'SELECT rowid FROM src_campaign_plan WHERE fw_CampaignStartDate > ? ORDER BY rowid', (as_of,))]
+    chosen = rng.sample(rowids, min(campaigns, len(rowids)))
+    with _transaction(conn):
+        for number, rowid in enumerate(chosen):
+            conn.execute('UPDATE src_campaign_plan SET costs_budget_fcast = round(costs_budget_fcast * ?, 2) '
+                         'WHERE rowid = ?', (rng.uniform(0.7, 1.3), rowid))
+            if number % 3 == 2:
+                conn.execute("UPDATE src_campaign_plan SET fw_CampaignStartDate = date(fw_CampaignStartDate, '+7 days'), "
+                             "Campaign_Start_Date = date(Campaign_Start_Date, '+7 days'), "
+                             "Campaign_End_Date = date(Campaign_End_Date, '+7 days') "
+                             'WHERE rowid = ? AND fw_CampaignStartDate < ?',
+                             (rowid, (last_calendar_day() - datetime.timedelta(days=13)).isoformat()))
+    return len(chosen)
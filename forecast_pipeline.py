@@ -0,0 +1,692 @@
+"""
+Runs the points cost forecast SQL locally, rebuilding only what changed.
+
+``Points_Cost_Forecast_Production.sql`` recreates every table from full
+history on each run. ``Points_Cost_Forecast_Local.sql`` is its SQLite port,
+and this module executes it as a table DAG against a local database of
+``src_*`` source tables (``forecast_fixtures`` generates them).
+
+Each run works out which fiscal weeks changed since the last one:
+
+* fact sources (finance, article sales, Everyday Extra) carry a ``_batch``
+  column; rows above a source's watermark mark their weeks as changed
+* campaign plan rows are fingerprinted one by one, so an edited, added or
+  removed campaign marks its old and new weeks
+* a changed dimension source (calendar, business mapping, article master)
+  changes everything
+* a new as-of date marks the weeks between the old and the new one, for the
+  tables that read it
+
+and those weeks flow down the DAG. A table annotated ``-- refresh: <column>``
+deletes and re-inserts just the rows for the ``<column>`` values of the
+changed weeks (``FiscalWeekStartDate`` for most, ``Fiscal_Period`` and
+``FiscalYear`` for the summaries); the changed weeks it passes on are all
+weeks with those values. Other tables are rebuilt whenever an input changed,
+and skipped otherwise. A table whose input changed completely, or that does
+not exist yet, is rebuilt in full.
+
+The watermarks and per-table statistics live in ``_pipeline_watermarks``,
+and a run is a single transaction, so an interrupted run leaves the previous
+state intact and the next run picks up from it. Dashboard tables assume
+actuals arrive in order, at most a week behind the as-of date; use
+``run --full`` after restating history.
+
+Dependencies are read from the tables each statement selects from, so
+independent tables (the three dimensions, finance actuals and forecast, the
+Everyday Extra chain and the finance chain) can be built at the same time:
+``run --workers N`` builds up to N tables at once, each on its own
+connection, starting the ones with the most work downstream of them (by
+their last recorded times) first. Every run reports when each table started
+and how long it took, and the critical path: the chain of dependent tables
+that bounds the wall time however many workers there are.
+
+Usage:
+    python forecast_pipeline.py init [--as-of 2025-03-16]
+    python forecast_pipeline.py append [--days 1] [--replan 0]
+    python forecast_pipeline.py run [--full] [--as-of DATE] [--workers 4]
+    python forecast_pipeline.py status
+    python forecast_pipeline.py graph
+    python forecast_pipeline.py [--db PATH] [--script PATH] <command> ...
+    python forecast_pipeline.py bench [--workers 4]
+"""
+import argparse
+import datetime
+import hashlib
+import heapq
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import forecast_fixtures
+
+SCRIPT = os.path.join('attached_assets', 'marketing-cost-forecast', 'Points_Cost_Forecast_Local.sql')
+DEFAULT_DB = os.path.join('instance', 'points_cost_forecast.sqlite3')
+
+# How each source table signals change: (kind, date column mapped to fiscal weeks)
+SOURCES = {
+    'src_dim_date': ('dimension', None),
+    'src_destination_business': ('dimension', None),
+    'src_article_master': ('dimension', None),
+    'src_fin_profit': ('fact', 'Calendar_Day'),
+    'src_article_sales': ('fact', 'start_txn_date'),
+    'src_edx_offer_details': ('fact', 'FiscalWeekStartDate'),
+    'src_campaign_plan': ('plan', 'fw_CampaignStartDate'),
+}
+# Tables the engine provides to every statement
+CONTEXT_TABLES = {'run_context', 'refresh_keys'}
+# Everything changed; stands in for the set of all weeks
+ALL = 'ALL'
+# Columns left out when comparing incremental results with a full recompute
+VOLATILE_COLUMNS = {'data_extraction_timestamp', 'unique_id'}
+
+_TOKENS = re.compile(r"('(?:[^']|'')*')|/\*.*?\*/|--[^\n]*", re.S)
+_REFRESH = re.compile(r'--\s*refresh:\s*(\w+)')
+_CREATE = re.compile(r'^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(TABLE|VIEW)\s+(`[^`]+`|[\w.]+)\s+AS\s+(.*)$', re.S | re.I)
+_READS = re.compile(r'\b(?:FROM|JOIN)\s+(`[^`]+`|[\w.]+)', re.I)
+_CTES = re.compile(r'(?:\bWITH|,)\s*(\w+)\s+AS\s*\(', re.I)
+
+
+class PipelineError(ValueError):
+    """The script or the database is not in a state the pipeline can run."""
+
+
+@dataclass
+class Node:
+    """One ``CREATE TABLE``/``CREATE VIEW`` statement of the script."""
+
+    name: str
+    kind: str
+    sql: str
+    select: str
+    key: str = None
+    depends: list = field(default_factory=list)
+    sources: list = field(default_factory=list)
+
+    @property
+    def reads_as_of(self):
+        return 'as_of' in self.select
+
+
+def _table_name(identifier):
+    """``dim_date`` from ``dim_date`` or ```project.dataset.dim_date```."""
+    return identifier.strip('`').split('.')[-1]
+
+
+def _strip_comments(text):
+    """Drop comments (keeping ``-- refresh:`` annotations) without touching string literals."""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        return match.group(0) if _REFRESH.match(match.group(0)) else ' '
+    return _TOKENS.sub(replace, text)
+
+
+def parse_script(text):
+    """Nodes of a forecast script in script order, with the dependencies between them.
+
+    A node depends on every earlier node it reads with ``FROM`` or ``JOIN``;
+    any other table it reads, except its own CTEs and the engine's context
+    tables, is a source. Works on the production BigQuery script as well as
+    the local port.
+    """
+    nodes = []
+    for statement in _strip_comments(text).split(';'):
+        key = _REFRESH.search(statement)
+        statement = _REFRESH.sub(' ', statement).strip()
+        if not statement:
+            continue
+        match = _CREATE.match(statement)
+        if not match:
+            raise PipelineError(f'Expected CREATE TABLE or CREATE VIEW: {statement[:60]!r}')
+        kind, name, select = match.group(1).lower(), _table_name(match.group(2)), match.group(3).strip()
+        if select.startswith('(') and select.endswith(')'):
+            select = select[1:-1].strip()
+        known = {node.name for node in nodes}
+        ctes = {cte.lower() for cte in _CTES.findall(select)}
+        depends, sources = [], []
+        for table in map(_table_name, _READS.findall(select)):
+            if table in depends or table in sources or table in CONTEXT_TABLES or table.lower() in ctes:
+                continue
+            (depends if table in known else sources).append(table)
+        nodes.append(Node(name, kind, f'CREATE {kind.upper()} {name} AS {select}', select,
+                          key.group(1) if key else None, depends, sources))
+    return nodes
+
+
+def load_script(path=SCRIPT):
+    with open(path) as f:
+        return parse_script(f.read())
+
+
+# SQL functions the port relies on, standing in for BigQuery built-ins
+
+def safe_divide(numerator, denominator):
+    if numerator is None or not denominator:
+        return None
+    return numerator / denominator
+
+
+def initcap(text):
+    if text is None:
+        return None
+    return re.sub(r"[^\s\[\](){}/|<>!?@\"^#$&~_,.:;*%+-]+", lambda m: m[0][:1].upper() + m[0][1:].lower(), text)
+
+
+def split_part(text, delimiter, index):
+    parts = (text or '').split(delimiter)
+    return parts[index - 1] if text is not None and 0 < index <= len(parts) else None
+
+
+class StringAggDistinct:
+    """``STRING_AGG(DISTINCT value, separator)``, in sorted order so rebuilds are reproducible."""
+
+    def __init__(self):
+        self.values, self.separator = set(), ','
+
+    def step(self, value, separator):
+        if value is not None:
+            self.values.add(value)
+        self.separator = separator
+
+    def finalize(self):
+        return self.separator.join(sorted(self.values)) if self.values else None
+
+
+def connect(path=DEFAULT_DB, **kwargs):
+    """A connection with the port's SQL functions, in autocommit mode so runs manage their own transaction."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, **kwargs)
+    conn.create_function('safe_divide', 2, safe_divide, deterministic=True)
+    conn.create_function('initcap', 1, initcap, deterministic=True)
+    conn.create_function('split_part', 3, split_part, deterministic=True)
+    conn.create_aggregate('string_agg_distinct', 2, StringAggDistinct)
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
+
+
+def _union(*changes):
+    if any(change == ALL for change in changes):
+        return ALL
+    return set().union(*changes)
+
+
+def _digest(rows):
+    h = hashlib.blake2b(digest_size=16)
+    for row in sorted(map(repr, rows)):
+        h.update(row.encode())
+    return h.hexdigest()
+
+
+def run_graph(nodes, run, workers=1, priority=None):
+    """Call ``run(node)`` for each node once its dependencies have finished, at most ``workers`` at a time.
+
+    Of the nodes that are ready, the one with the most work downstream of it
+    (``priority``, in seconds) starts first, so the critical path does not
+    queue behind short side branches; ties go in script order. Returns, per
+    node, ``run``'s result plus its ``started`` and ``finished`` offsets,
+    ``seconds`` and the ``worker`` thread.
+    """
+    priority = priority or {}
+    by_name = {node.name: node for node in nodes}
+    order = {node.name: index for index, node in enumerate(nodes)}
+    waiting = {node.name: set(node.depends) for node in nodes}
+    dependants = {node.name: [] for node in nodes}
+    for node in nodes:
+        for name in node.depends:
+            dependants[name].append(node.name)
+    ready = [(-priority.get(name, 0), order[name], name) for name, depends in waiting.items() if not depends]
+    heapq.heapify(ready)
+    origin = time.perf_counter()
+    results = {}
+
+    def timed(name):
+        started = time.perf_counter() - origin
+        result = run(by_name[name])
+        finished = time.perf_counter() - origin
+        return dict(result, started=started, finished=finished, seconds=finished - started,
+                    worker=threading.current_thread().name)
+
+    def finish(name, result):
+        results[name] = result
+        for child in dependants[name]:
+            waiting[child].discard(name)
+            if not waiting[child]:
+                heapq.heappush(ready, (-priority.get(child, 0), order[child], child))
+
+    if workers <= 1:
+        while ready:
+            name = heapq.heappop(ready)[2]
+            finish(name, timed(name))
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='forecast') as pool:
+        running = {}
+        while ready or running:
+            while ready and len(running) < workers:
+                name = heapq.heappop(ready)[2]
+                running[pool.submit(timed, name)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.result())
+    return results
+
+
+def downstream_seconds(nodes, seconds):
+    """Each node's own time plus that of the longest chain of nodes depending on it."""
+    dependants = {node.name: [] for node in nodes}
+    for node in nodes:
+        for name in node.depends:
+            dependants[name].append(node.name)
+    result = {}
+    for node in reversed(nodes):
+        result[node.name] = (seconds.get(node.name) or 0) + max(
+            (result[name] for name in dependants[node.name]), default=0)
+    return result
+
+
+def critical_path(nodes, seconds):
+    """The chain of dependent nodes with the most time in total, and that total.
+
+    However many workers there are, a run takes at least this long.
+    """
+    longest = {}
+    for node in nodes:
+        before = max(node.depends, key=lambda name: longest[name][0], default=None)
+        longest[node.name] = ((seconds.get(node.name) or 0) + (longest[before][0] if before else 0), before)
+    if not longest:
+        return [], 0.0
+    name = max(longest, key=lambda name: longest[name][0])
+    total, path = longest[name][0], []
+    while name:
+        path.append(name)
+        name = longest[name][1]
+    return path[::-1], total
+
+
+def levels(nodes):
+    """Groups of nodes that can run together: each depends only on nodes in earlier groups."""
+    depth = {}
+    for node in nodes:
+        depth[node.name] = 1 + max((depth[name] for name in node.depends), default=-1)
+    groups = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+    for node in nodes:
+        groups[depth[node.name]].append(node.name)
+    return groups
+
+
+class Pipeline:
+    """Executes the script's nodes against a database, tracking per-source watermarks."""
+
+    def __init__(self, conn, nodes=None, staged=False):
+        self.conn = conn
+        self.nodes = nodes if nodes is not None else load_script()
+        self.staged = staged
+        self.stats = []
+
+    # -- state -------------------------------------------------------------
+
+    def _setup(self, as_of, extracted_at):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS _pipeline_watermarks (
+                name TEXT PRIMARY KEY, mode TEXT, watermark TEXT, fingerprint TEXT,
+                rows INTEGER, seconds REAL, refreshed_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS _pipeline_campaigns (fingerprint TEXT, week TEXT);
+            CREATE TEMP TABLE IF NOT EXISTS run_context (as_of TEXT, extracted_at TEXT);
+            CREATE TEMP TABLE IF NOT EXISTS refresh_keys (key PRIMARY KEY);
+            CREATE TEMP TABLE IF NOT EXISTS changed_weeks (week TEXT PRIMARY KEY);
+            DELETE FROM run_context;
+        """)
+        self.conn.execute('INSERT INTO run_context VALUES (?, ?)', (as_of, extracted_at))
+
+    def watermarks(self):
+        if not self._exists('_pipeline_watermarks'):
+            return {}
+        cursor = self.conn.execute('SELECT * FROM _pipeline_watermarks ORDER BY rowid')
+        columns = [c[0] for c in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor}
+
+    def _record(self, name, **values):
+        values['refreshed_at'] = self.extracted_at
+        columns = ', '.join(values)
+        self.conn.execute(
+            f'INSERT INTO _pipeline_watermarks (name, {columns}) VALUES (?{", ?" * len(values)}) '
+            f'ON CONFLICT (name) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in values)}',
+            (name, *values.values()))
+
+    def _exists(self, name):
+        return self.conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (name,)).fetchone() is not None
+
+    def _columns(self, name):
+        return [row[1] for row in self.conn.execute(f'PRAGMA table_info({name})')]
+
+    # -- change detection ----------------------------------------------------
+
+    def _weeks(self, sql, params=()):
+        """Fiscal week start dates of the calendar days selected by ``sql``."""
+        return {row[0] for row in self.conn.execute(
+            f'SELECT DISTINCT FiscalWeekStartDate FROM src_dim_date WHERE CalendarDay IN ({sql})', params)}
+
+    def source_changes(self, name, previous, full):
+        """Weeks changed in source ``name`` since ``previous`` (its watermark row), and its new watermark."""
+        kind, column = SOURCES.get(name, ('dimension', None))
+        if not self._exists(name):
+            raise PipelineError(f'Source table {name} does not exist; run "init" first')
+        if kind == 'fact':
+            watermark = self.conn.execute(f'SELECT MAX(_batch) FROM {name}').fetchone()[0]
+            if full or previous is None or previous['watermark'] is None:
+                return ALL, {'watermark': watermark}
+            weeks = self._weeks(f'SELECT {column} FROM {name} WHERE _batch > ?', (int(previous['watermark']),))
+            return weeks, {'watermark': watermark}
+        if kind == 'plan':
+            index = self._columns(name).index(column)
+            rows = [(_digest([row]), row[index]) for row in self.conn.execute(f'SELECT * FROM {name}')]
+            self._campaigns = rows
+            if full or previous is None:
+                return ALL, {'fingerprint': _digest(rows)}
+            old = self.conn.execute('SELECT fingerprint, week FROM _pipeline_campaigns').fetchall()
+            days = sorted({day for _, day in set(rows).symmetric_difference(old)})
+            weeks = self._weeks(', '.join('?' * len(days)), days) if days else set()
+            return weeks, {'fingerprint': _digest(rows)}
+        fingerprint = _digest(self.conn.execute(f'SELECT * FROM {name}'))
+        if full or previous is None or previous['fingerprint'] != fingerprint:
+            return ALL, {'fingerprint': fingerprint}
+        return set(), {'fingerprint': fingerprint}
+
+    def as_of_changes(self, previous, full):
+        if full or previous is None:
+            return ALL
+        old, new = sorted((previous['watermark'], self.as_of))
+        if old == new:
+            return set()
+        return self._weeks('SELECT CalendarDay FROM src_dim_date WHERE CalendarDay BETWEEN ? AND ?', (old, new))
+
+    # -- execution -----------------------------------------------------------
+
+    def _set_changed_weeks(self, weeks):
+        self.conn.execute('DELETE FROM changed_weeks')
+        self.conn.executemany('INSERT INTO changed_weeks VALUES (?)', ((w,) for w in weeks))
+
+    def _set_refresh_keys(self, key, everything):
+        self.conn.execute('DELETE FROM refresh_keys')
+        if key:
+            where = '' if everything else ' WHERE FiscalWeekStartDate IN (SELECT week FROM changed_weeks)'
+            self.conn.execute(f'INSERT INTO refresh_keys SELECT DISTINCT {key} FROM dim_date{where}')
+
+    def _index(self, node):
+        columns = set(self._columns(node.name))
+        for column in sorted({node.key, 'FiscalWeekStartDate'} & columns):
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS {node.name}_{column} ON {node.name} ({column})')
+
+    def _write(self, select, *statements):
+        """Execute ``statements``, with ``{select}`` standing for the node's query; returns the last cursor.
+
+        A staged pipeline (one of several running at once) first materialises
+        the query into a temp table, which needs no lock on the database, and
+        only holds the write lock to copy it into place.
+        """
+        if not self.staged:
+            for statement in statements:
+                cursor = self.conn.execute(statement.format(select=select))
+            return cursor
+        self.conn.execute('DROP TABLE IF EXISTS temp.staged')
+        self.conn.execute(f'CREATE TEMP TABLE staged AS {select}')
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in statements:
+                cursor = self.conn.execute(statement.format(select='SELECT * FROM temp.staged'))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return cursor
+
+    def refresh(self, node, changes):
+        """Bring ``node`` up to date with ``changes`` to its inputs; returns ``(mode, rows, changes out)``."""
+        if node.kind == 'view':
+            if changes == ALL or not self._exists(node.name):
+                self.conn.execute(f'DROP VIEW IF EXISTS {node.name}')
+                self.conn.execute(node.sql)
+                return 'full', None, changes
+            return 'skipped', None, set()
+
+        if changes == ALL or not self._exists(node.name):
+            self._set_refresh_keys(node.key, everything=True)
+            self._write(node.select, f'DROP TABLE IF EXISTS {node.name}', f'CREATE TABLE {node.name} AS {{select}}')
+            self._index(node)
+            rows = self.conn.execute(f'SELECT COUNT(*) FROM {node.name}').fetchone()[0]
+            return 'full', rows, ALL
+        if not changes:
+            return 'skipped', 0, set()
+        if node.key is None:
+            rows = self._write(node.select, f'DELETE FROM {node.name}', f'INSERT INTO {node.name} {{select}}').rowcount
+            return 'rebuilt', rows, changes
+
+        self._set_changed_weeks(changes)
+        self._set_refresh_keys(node.key, everything=False)
+        rows = self._write(node.select, f'DELETE FROM {node.name} WHERE {node.key} IN (SELECT key FROM refresh_keys)',
+                           f'INSERT INTO {node.name} {{select}}').rowcount
+        weeks = {row[0] for row in self.conn.execute(
+            f'SELECT DISTINCT FiscalWeekStartDate FROM dim_date WHERE {node.key} IN (SELECT key FROM refresh_keys)')}
+        return 'incremental', rows, weeks
+
+    def run(self, as_of=None, full=False, workers=1):
+        """Refresh every node; returns per-node statistics in script order.
+
+        With one worker the whole run is one transaction. With more, nodes
+        whose inputs are ready run concurrently on their own connections and
+        each commits its table as it finishes; the watermarks are still only
+        advanced once every node has succeeded, so a failed run is repeated
+        in full by the next one.
+        """
+        self.as_of = as_of or datetime.date.today().isoformat()
+        self.extracted_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+        self._campaigns = None
+        self.stats = []
+        self._setup(self.as_of, self.extracted_at)
+        self.conn.execute('BEGIN' if workers > 1 else 'BEGIN IMMEDIATE')
+        try:
+            previous = self.watermarks()
+            changes, watermarks = {}, {}
+            for name in sorted({source for node in self.nodes for source in node.sources}):
+                changes[name], watermarks[name] = self.source_changes(name, previous.get(name), full)
+            as_of_changes = self.as_of_changes(previous.get('run_context.as_of'), full)
+            priority = downstream_seconds(self.nodes, {name: row['seconds'] for name, row in previous.items()})
+
+            def task(pipeline, node):
+                inputs = [changes[name] for name in node.depends + node.sources]
+                if node.reads_as_of:
+                    inputs.append(as_of_changes)
+                mode, rows, changes[node.name] = pipeline.refresh(node, _union(set(), *inputs))
+                return {'mode': mode, 'rows': rows,
+                        'weeks': 'all' if changes[node.name] == ALL else len(changes[node.name])}
+
+            if workers > 1:
+                self.conn.execute('COMMIT')
+                timings = self._run_parallel(task, workers, priority)
+                self.conn.execute('BEGIN IMMEDIATE')
+            else:
+                timings = run_graph(self.nodes, lambda node: task(self, node), 1, priority)
+            self.stats = [dict(name=node.name, **timings[node.name]) for node in self.nodes]
+
+            for name, watermark in watermarks.items():
+                self._record(name, mode='source', **watermark)
+            self._record('run_context.as_of', mode='source', watermark=self.as_of)
+            for stat in self.stats:
+                self._record(stat['name'], mode=stat['mode'], rows=stat['rows'], seconds=stat['seconds'])
+            self._record('_run', mode='full' if full else 'incremental',
+                         seconds=max((s['finished'] for s in self.stats), default=0))
+            if self._campaigns is not None:
+                self.conn.execute('DELETE FROM _pipeline_campaigns')
+                self.conn.executemany('INSERT INTO _pipeline_campaigns VALUES (?, ?)', self._campaigns)
+            self.conn.execute('COMMIT')
+        except BaseException:
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            raise
+        return self.stats
+
+    def _run_parallel(self, task, workers, priority):
+        """:func:`run_graph` with a staged pipeline on its own connection per worker thread."""
+        path = self.conn.execute('PRAGMA database_list').fetchone()[2]
+        local, pipelines = threading.local(), []
+
+        def run(node):
+            if not hasattr(local, 'pipeline'):
+                # Closed from the calling thread once the pool has finished
+                local.pipeline = Pipeline(connect(path, check_same_thread=False), self.nodes, staged=True)
+                local.pipeline._setup(self.as_of, self.extracted_at)
+                pipelines.append(local.pipeline)
+            return task(local.pipeline, node)
+
+        try:
+            return run_graph(self.nodes, run, workers, priority)
+        finally:
+            for pipeline in pipelines:
+                pipeline.conn.close()
+
+    def contents(self):
+        """Each table's rows in a canonical order, without timestamps and random ids."""
+        result = {}
+        for node in self.nodes:
+            if node.kind != 'table':
+                continue
+            columns = [c for c in self._columns(node.name) if c not in VOLATILE_COLUMNS]
+            rows = self.conn.execute(f'SELECT {", ".join(columns)} FROM {node.name}').fetchall()
+            result[node.name] = sorted(rows, key=lambda row: [(v is None, type(v).__name__, round(v, 2)
+                                                               if isinstance(v, float) else v) for v in row])
+        return result
+
+
+def same_rows(a, b):
+    """Whether two :meth:`Pipeline.contents` row lists match, allowing for float summation order."""
+    return len(a) == len(b) and all(
+        len(x) == len(y) and all(math.isclose(v, w, rel_tol=1e-9, abs_tol=1e-6)
+                                 if isinstance(v, float) and isinstance(w, float) else v == w
+                                 for v, w in zip(x, y))
+        for x, y in zip(a, b))
+
+
+def _print_stats(stats, nodes):
+    for stat in stats:
+        rows = '' if stat['rows'] is None else stat['rows']
+        print(f"{stat['name']:32s} {stat['mode']:12s} {rows:>8}  {stat['started'] * 1000:9.1f} "
+              f"+{stat['seconds'] * 1000:8.1f} ms  {stat['worker']:12s} weeks out: {stat['weeks']}")
+    path, seconds = critical_path(nodes, {s['name']: s['seconds'] for s in stats})
+    print(f"wall {max((s['finished'] for s in stats), default=0) * 1000:.1f} ms, "
+          f"work {sum(s['seconds'] for s in stats) * 1000:.1f} ms, critical path {seconds * 1000:.1f} ms:")
+    print('  ' + ' -> '.join(path))
+
+
+def benchmark(days=1, replan=0, workers=1, as_of=forecast_fixtures.DEFAULT_AS_OF):
+    """Full build, then ``days`` more days of data: incremental run vs full recompute, with a content check."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(os.path.join(tmp, 'bench.sqlite3'))
+        forecast_fixtures.init(conn, as_of)
+        pipeline = Pipeline(conn)
+
+        def timed(**kwargs):
+            started = time.perf_counter()
+            pipeline.run(workers=workers, **kwargs)
+            return round((time.perf_counter() - started) * 1000, 1)
+
+        initial = timed(as_of=as_of, full=True)
+        new_as_of = forecast_fixtures.append(conn, days)
+        if replan:
+            forecast_fixtures.replan(conn, replan)
+        incremental = timed(as_of=new_as_of)
+        incremental_stats = pipeline.stats
+        after_incremental = pipeline.contents()
+        recompute = timed(as_of=new_as_of, full=True)
+        seconds = {s['name']: s['seconds'] for s in pipeline.stats}
+        path, path_seconds = critical_path(pipeline.nodes, seconds)
+        mismatched = [name for name, rows in pipeline.contents().items() if not same_rows(after_incremental[name], rows)]
+        conn.close()
+    return {
+        'as_of': new_as_of,
+        'workers': workers,
+        'full_ms': initial,
+        'incremental_ms': incremental,
+        'full_recompute_ms': recompute,
+        'speedup': round(recompute / incremental, 1),
+        'full_recompute_work_ms': round(sum(seconds.values()) * 1000, 1),
+        'critical_path_ms': round(path_seconds * 1000, 1),
+        'critical_path': path,
+        'incremental_nodes': {s['name']: s['mode'] for s in incremental_stats},
+        'matches_full_recompute': not mismatched,
+        'mismatched': mismatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the points cost forecast pipeline on a local SQLite database.')
+    parser.add_argument('--db', default=DEFAULT_DB, help='database file (default: %(default)s)')
+    parser.add_argument('--script', default=SCRIPT, help='SQL script to run (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    init = commands.add_parser('init', help='create the database with fixture source data')
+    init.add_argument('--as-of', default=forecast_fixtures.DEFAULT_AS_OF)
+    append = commands.add_parser('append', help='add the next days of fixture actuals as a new batch')
+    append.add_argument('--days', type=int, default=1)
+    append.add_argument('--replan', type=int, default=0, metavar='N', help='also re-forecast N future campaigns')
+    run = commands.add_parser('run', help='refresh the tables that changed (all of them with --full)')
+    run.add_argument('--full', action='store_true')
+    run.add_argument('--workers', type=int, default=1,
+                     help='tables to build at once; above 1 each table commits separately (default: %(default)s)')
+    run.add_argument('--as-of', help="defaults to the fixture data's as-of date, else today")
+    commands.add_parser('status', help='show watermarks and the last refresh of each table')
+    bench = commands.add_parser('bench', help='compare an incremental run with a full recompute')
+    bench.add_argument('--days', type=int, default=1)
+    bench.add_argument('--replan', type=int, default=0)
+    bench.add_argument('--workers', type=int, default=1)
+    commands.add_parser('graph', help="show the script's tables, their dependencies and what can run together")
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        import json
+        print(json.dumps(benchmark(args.days, args.replan, args.workers), indent=2))
+        return
+
+    if args.command == 'graph':
+        nodes = load_script(args.script)
+        for level, names in enumerate(levels(nodes)):
+            print(f'stage {level + 1}:')
+            for node in (node for node in nodes if node.name in names):
+                print(f"  {node.name:32s} <- {', '.join(node.depends + node.sources) or '-'}")
+        return
+
+    if args.command == 'init':
+        if os.path.exists(args.db):
+            parser.error(f'{args.db} already exists')
+        forecast_fixtures.init(connect(args.db), args.as_of)
+        print(f'Created {args.db} with source data up to {args.as_of}')
+        return
+
+    if not os.path.exists(args.db):
+        parser.error(f'{args.db} does not exist; run "init" first')
+    conn = connect(args.db)
+    if args.command == 'append':
+        as_of = forecast_fixtures.append(conn, args.days)
+        replanned = forecast_fixtures.replan(conn, args.replan) if args.replan else 0
+        print(f'Source data now up to {as_of}' + (f', {replanned} campaigns re-forecast' if replanned else ''))
+    elif args.command == 'run':
+        fixtures = forecast_fixtures.state(conn)
+        as_of = args.as_of or (fixtures[0] if fixtures else None)
+        nodes = load_script(args.script)
+        _print_stats(Pipeline(conn, nodes).run(as_of, full=args.full, workers=args.workers), nodes)
+    elif args.command == 'status':
+        for name, row in Pipeline(conn, []).watermarks().items():
+            detail = row['watermark'] if row['mode'] == 'source' else f"{row['rows']} rows"
+            seconds = '' if row['seconds'] is None else f"{row['seconds'] * 1000:9.1f} ms"
+            print(f"{name:32s} {row['mode']:12s} {detail or row['fingerprint'] or '':>20}  {seconds:12s}  "
+                  f"{row['refreshed_at']}")
+
+
+if __name__ == '__main__':
+    main()
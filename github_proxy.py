@@ -0,0 +1,292 @@
+"""
+Cached, connection-pooled proxy for the GitHub repositories API.
+
+The projects page asks ``/api/github_repos`` for the portfolio owner's public
+repositories on every load. Instead of a fresh upstream request each time the
+proxy keeps the simplified repository list in memory:
+
+* fresh for ``ttl`` seconds, served without touching GitHub;
+* then stale for up to ``stale_ttl`` more seconds, still served immediately
+  while a background thread revalidates it;
+* revalidation sends ``If-None-Match`` with the ETag of each page, so
+  unchanged pages come back as ``304 Not Modified`` and do not count against
+  the rate limit;
+* every page of results is followed via the ``Link: rel="next"`` header.
+
+``api_url`` can point at a local stub server for testing;
+``python github_proxy.py`` runs the proxy against a built-in stub and checks
+pagination, ETag revalidation and background refreshes. ``requests`` is
+imported when the first upstream call is made, not at worker boot.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api.github.com'
+DEFAULT_USERNAME = 'analytics-designer'
+
+
+class GitHubProxyError(Exception):
+    """Raised when GitHub cannot be reached or returns an unexpected status."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def simplify_repo(repo):
+    """Extract only the fields the projects page needs."""
+    return {
+        'name': repo['name'],
+        'description': repo['description'] or 'No description provided',
+        'url': repo['html_url'],
+        'topics': repo.get('topics', []),
+        'language': repo['language'],
+        'fork': repo['fork']
+    }
+
+
+class GitHubRepoProxy:
+    """In-process TTL cache with stale-while-revalidate in front of ``/users/<name>/repos``."""
+
+    def __init__(self, username=DEFAULT_USERNAME, token=None, api_url=DEFAULT_API_URL,
+                 ttl=300, stale_ttl=3600, timeout=5, per_page=100, pool_size=4):
+        self.username = username
+        self.token = token
+        self.api_url = api_url.rstrip('/')
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.per_page = per_page
+        self.pool_size = pool_size
+
+        self._repos = None
+        self._fetched_at = None
+        self._pages = {}
+        self._fetch_lock = threading.Lock()
+        self._refresh_wanted = threading.Event()
+        self._refresher = None
+        self._refresher_lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.username = app.config.get('GITHUB_USERNAME') or self.username
+        self.token = app.config.get('GITHUB_API_TOKEN') or self.token
+        self.api_url = (app.config.get('GITHUB_API_URL') or self.api_url).rstrip('/')
+        self.ttl = app.config.get('GITHUB_CACHE_TTL', self.ttl)
+        self.stale_ttl = app.config.get('GITHUB_CACHE_STALE_TTL', self.stale_ttl)
+        app.extensions['github_proxy'] = self
+
+    @property
+    def session(self):
+        """Pooled session, recreated in a forked worker so sockets are never shared."""
+        if self._session is None or self._pid != os.getpid():
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Accept'] = 'application/vnd.github+json'
+            if self.token:
+                session.headers['Authorization'] = f'Bearer {self.token}'
+            self._session = session
+            self._pid = os.getpid()
+            self._refresher = None
+        return self._session
+
+    def _age(self):
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    def get_repos(self):
+        """Return the simplified repository list, fetching only when the cache cannot serve it."""
+        age = self._age()
+        if age is not None and age < self.ttl:
+            return self._repos
+        if age is not None and age < self.ttl + self.stale_ttl:
+            self._request_refresh()
+            return self._repos
+        with self._fetch_lock:
+            # Another thread may have fetched while we waited for the lock
+            age = self._age()
+            if age is None or age >= self.ttl + self.stale_ttl:
+                self._refresh()
+        return self._repos
+
+    def _request_refresh(self):
+        # Several request threads can find the cache stale at once; start one refresher
+        with self._refresher_lock:
+            if self._refresher is None or not self._refresher.is_alive() or self._pid != os.getpid():
+                self._refresher = threading.Thread(target=self._refresh_loop, name='github-refresh', daemon=True)
+                self._refresher.start()
+        self._refresh_wanted.set()
+
+    def _refresh_loop(self):
+        while True:
+            self._refresh_wanted.wait()
+            self._refresh_wanted.clear()
+            try:
+                with self._fetch_lock:
+                    if self._age() is None or self._age() >= self.ttl:
+                        self._refresh()
+            except GitHubProxyError as e:
+                # Keep serving the stale list; the next request past the TTL retries
+                logger.warning(f"Background GitHub refresh failed: {str(e)}")
+            except Exception:
+                # Anything else (a malformed page, a bug) must not kill the refresher either
+                logger.exception("Unexpected error in background GitHub refresh")
+
+    def _refresh(self):
+        self._repos = [simplify_repo(repo) for repo in self._fetch_all_pages()]
+        self._fetched_at = time.monotonic()
+
+    def _fetch_all_pages(self):
+        url = f'{self.api_url}/users/{self.username}/repos?per_page={self.per_page}'
+        repos = []
+        while url:
+            page, url = self._fetch_page(url)
+            repos.extend(page)
+        return repos
+
+    def _fetch_page(self, url):
+        """Fetch one page, revalidating with the ETag from the previous fetch.
+
+        Returns the page's repositories and the URL of the next page (or ``None``).
+        """
+        import requests
+
+        cached = self._pages.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        try:
+            with instrumentation.timed('github'):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise GitHubProxyError(f"GitHub request failed: {str(e)}") from e
+
+        if response.status_code == 304 and cached:
+            return cached[1], cached[2]
+        if response.status_code != 200:
+            raise GitHubProxyError(f"GitHub API returned status code {response.status_code}",
+                                   status=response.status_code)
+
+        page = response.json()
+        next_url = response.links.get('next', {}).get('url')
+        etag = response.headers.get('ETag')
+        if etag:
+            self._pages[url] = (etag, page, next_url)
+        return page, next_url
+
+
+class StubGitHubHandler(BaseHTTPRequestHandler):
+    """``/users/<name>/repos`` split over two pages, with ETags and ``Link`` headers."""
+
+    protocol_version = 'HTTP/1.1'
+    pages = {}
+    hits = {}
+    fail = False
+
+    def do_GET(self):
+        page = self.pages.get(self.path)
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.fail:
+            return self._reply(200, b'not json')
+        if page is None:
+            return self._reply(404, b'')
+        body, etag, next_path = page
+        headers = {'ETag': etag, 'Content-Type': 'application/json'}
+        if next_path:
+            headers['Link'] = f'<http://{self.headers["Host"]}{next_path}>; rel="next"'
+        if self.headers.get('If-None-Match') == etag:
+            return self._reply(304, b'', headers)
+        self._reply(200, body, headers)
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check(username='stub-user'):
+    """Exercise the proxy against a local stub server; returns a list of failed checks."""
+    repo = lambda i: {'name': f'repo-{i}', 'description': None, 'html_url': f'https://github.com/{username}/repo-{i}',
+                      'language': 'Python', 'fork': False}
+    first = f'/users/{username}/repos?per_page=2'
+    second = f'/users/{username}/repos?per_page=2&page=2'
+    handler = type('StubGitHub', (StubGitHubHandler,), {
+        'pages': {first: (json.dumps([repo(0), repo(1)]).encode(), '"p1"', second),
+                  second: (json.dumps([repo(2)]).encode(), '"p2"', None)},
+        'hits': {},
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, name='stub-github', daemon=True).start()
+    proxy = GitHubRepoProxy(username, api_url=f'http://127.0.0.1:{server.server_port}',
+                            ttl=0.2, stale_ttl=60, per_page=2)
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+
+    def wait_for_refresh(fetched_at, seconds=5):
+        deadline = time.monotonic() + seconds
+        while proxy._fetched_at == fetched_at and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return proxy._fetched_at != fetched_at
+
+    try:
+        repos = proxy.get_repos()
+        expect([r['name'] for r in repos] == ['repo-0', 'repo-1', 'repo-2'], 'both pages followed via Link')
+        proxy.get_repos()
+        expect(handler.hits == {first: 1, second: 1}, 'fresh list served without an upstream request')
+
+        time.sleep(0.25)
+        fetched_at = proxy._fetched_at
+        threads = [threading.Thread(target=proxy.get_repos) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        expect(wait_for_refresh(fetched_at), 'stale list revalidated in the background')
+        expect(proxy.get_repos() == repos, 'list unchanged after a 304 revalidation')
+        expect(sum(t.name == 'github-refresh' for t in threading.enumerate()) == 1, 'a single refresher thread')
+
+        handler.fail = True
+        time.sleep(0.25)
+        refresher = proxy._refresher
+        expect(proxy.get_repos() == repos, 'stale list served while the refresh fails')
+        time.sleep(0.2)
+        expect(refresher.is_alive(), 'refresher survives an unexpected error')
+        handler.fail = False
+        fetched_at = proxy._fetched_at
+        proxy.get_repos()
+        expect(wait_for_refresh(fetched_at), 'refresh recovers once upstream does')
+    finally:
+        server.shutdown()
+    return failures
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    failed = check()
+    for message in failed:
+        print(f'FAILED: {message}')
+    print('github_proxy: ' + ('all checks passed' if not failed else f'{len(failed)} checks failed'))
+    sys.exit(1 if failed else 0)
@@ -1,8 +1,27 @@
-import requests
+"""
+Check that every page of the site carries the Google Tag Manager snippet.
+
+Pages are fetched concurrently over one pooled session and each response is
+fed, as it streams in, through a single-pass tag scanner that looks for the
+head ``gtm.js`` script, the body ``<noscript>`` iframe and
+``gtm-consolidated.js`` at once. Results can be printed as a table, as JSON,
+or as a JUnit XML report for CI.
+
+Usage:
+    python gtm_test.py [--base-url URL] [--workers N] [--format text|json|junit] [paths...]
+"""
+import argparse
+import json
 import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # Color codes for terminal output
 COLORS = {
@@ -37,80 +56,113 @@ URLS_TO_CHECK = [
     '/retail_loyalty_analytics'
 ]
 
-# Regular expressions for GTM code patterns - updated for more flexible matching
-GTM_HEAD_PATTERN = re.compile(r"googletagmanager\.com/gtm\.js.*?id=['\"]?" + GTM_CONTAINER_ID + r"['\"]?")
-GTM_BODY_PATTERN = re.compile(r"googletagmanager\.com/ns\.html.*?id=['\"]?" + GTM_CONTAINER_ID + r"['\"]?")
+# Matches the plain file and its fingerprinted build (gtm-consolidated.<hash>.js)
+CONSOLIDATED_SCRIPT = re.compile(r'gtm-consolidated(\.[0-9a-f]+)?\.js')
+
+DEFAULT_WORKERS = 8
+CHUNK_SIZE = 16 * 1024
+
+
+class GTMTagScanner(HTMLParser):
+    """Single pass over a page that records which GTM snippets it contains.
+
+    * ``head_gtm``: a script loading ``googletagmanager.com/gtm.js`` for the
+      container, or an inline script that mentions the container ID
+    * ``body_gtm``: an iframe inside ``<noscript>`` loading
+      ``googletagmanager.com/ns.html`` for the container
+    * ``consolidated``: a script loading ``gtm-consolidated.js``
+
+    Feed it chunks as they arrive; ``complete`` turns true as soon as all
+    three have been seen, so the rest of the page need not be read.
+    """
+
+    def __init__(self, container_id=GTM_CONTAINER_ID):
+        super().__init__(convert_charrefs=True)
+        self.container_id = container_id
+        self.head_gtm = False
+        self.body_gtm = False
+        self.consolidated = False
+        self._in_script = False
+        self._noscript_depth = 0
+
+    @property
+    def complete(self):
+        return self.head_gtm and self.body_gtm and self.consolidated
+
+    def handle_starttag(self, tag, attrs):
+        src = dict(attrs).get('src') or ''
+        if tag == 'script':
+            self._in_script = True
+            if 'googletagmanager.com/gtm.js' in src and self.container_id in src:
+                self.head_gtm = True
+            if CONSOLIDATED_SCRIPT.search(src):
+                self.consolidated = True
+        elif tag == 'noscript':
+            self._noscript_depth += 1
+        elif tag == 'iframe' and self._noscript_depth:
+            if 'googletagmanager.com/ns.html' in src and self.container_id in src:
+                self.body_gtm = True
+
+    def handle_endtag(self, tag):
+        if tag == 'script':
+            self._in_script = False
+        elif tag == 'noscript' and self._noscript_depth:
+            self._noscript_depth -= 1
+
+    def handle_data(self, data):
+        if self._in_script and self.container_id in data:
+            self.head_gtm = True
+
+
+def make_session(workers=DEFAULT_WORKERS):
+    """Session whose connection pool is large enough for every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
-# Alternative detection patterns
-GTM_HEAD_ALT_PATTERN = re.compile(r"GTM-PC9Q9VC3")
 
 def print_colored(text, color):
     """Print text with color"""
     print(f"{COLORS[color]}{text}{COLORS['END']}")
 
-def check_gtm_implementation(url):
+
+def check_gtm_implementation(url, session=None, base_url=BASE_URL):
     """Check if GTM is correctly implemented on a page"""
-    full_url = urljoin(BASE_URL, url)
+    full_url = urljoin(base_url, url)
+    started = time.perf_counter()
     try:
-        response = requests.get(full_url, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Check for GTM in head or anywhere in the document
-        all_scripts = soup.find_all('script')
-        
-        # Safely get scripts in head
-        head_scripts = []
-        head = soup.find('head')
-        if head and hasattr(head, 'find_all'):
-            head_scripts = head.find_all('script')
-        
-        # Direct check for GTM in the HTML content
-        html_content = response.text
-        head_gtm_found = GTM_HEAD_PATTERN.search(html_content) is not None or GTM_HEAD_ALT_PATTERN.search(html_content) is not None
-        body_gtm_found = GTM_BODY_PATTERN.search(html_content) is not None
-        
-        # Fallback checks with specific tag structures if direct checks fail
-        if not head_gtm_found:
-            head_gtm_found = (any(GTM_HEAD_PATTERN.search(str(script)) for script in head_scripts) or
-                            any(GTM_HEAD_PATTERN.search(str(script)) for script in all_scripts) or
-                            any(GTM_HEAD_ALT_PATTERN.search(str(script)) for script in all_scripts))
-        
-        if not body_gtm_found:
-            all_noscript = soup.find_all('noscript')
-            
-            body_noscript = []
-            body = soup.find('body')
-            if body and hasattr(body, 'find_all'):
-                body_noscript = body.find_all('noscript')
-            
-            body_gtm_found = (any(GTM_BODY_PATTERN.search(str(noscript)) for noscript in body_noscript) or
-                             any(GTM_BODY_PATTERN.search(str(noscript)) for noscript in all_noscript) or
-                             any(GTM_HEAD_ALT_PATTERN.search(str(noscript)) for noscript in all_noscript))
-        
-        # Check for consolidated script
-        consolidated_script_found = bool(soup.find('script', {'src': re.compile(r'gtm-consolidated\.js')}))
-        
+        with (session or requests).get(full_url, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+
+            scanner = GTMTagScanner()
+            for chunk in response.iter_content(CHUNK_SIZE, decode_unicode=True):
+                scanner.feed(chunk)
+                if scanner.complete:
+                    break
+
         # Determine the overall result
-        if head_gtm_found and body_gtm_found:
+        if scanner.head_gtm and scanner.body_gtm:
             result = 'PASSED'
             color = 'GREEN'
-        elif head_gtm_found or body_gtm_found:
+        elif scanner.head_gtm or scanner.body_gtm:
             result = 'PARTIAL'
             color = 'YELLOW'
         else:
             result = 'FAILED'
             color = 'RED'
-            
+
         return {
             'url': url,
             'result': result,
             'color': color,
-            'head_gtm': head_gtm_found,
-            'body_gtm': body_gtm_found,
-            'consolidated': consolidated_script_found
+            'head_gtm': scanner.head_gtm,
+            'body_gtm': scanner.body_gtm,
+            'consolidated': scanner.consolidated,
+            'time': time.perf_counter() - started
         }
     except requests.exceptions.RequestException as e:
         return {
@@ -120,40 +172,91 @@ def check_gtm_implementation(url):
             'error': str(e),
             'head_gtm': False,
             'body_gtm': False,
-            'consolidated': False
+            'consolidated': False,
+            'time': time.perf_counter() - started
         }
 
-def main():
+
+def check_all(urls=URLS_TO_CHECK, base_url=BASE_URL, workers=DEFAULT_WORKERS):
+    """Check ``urls`` concurrently; results come back in the order given."""
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda url: check_gtm_implementation(url, session, base_url), urls))
+
+
+def print_table(results):
     print_colored(f"\nChecking Google Tag Manager implementation ({GTM_CONTAINER_ID}) across all pages\n", 'BOLD')
     print_colored("URL".ljust(30) + "Status".ljust(10) + "Head GTM".ljust(15) + "Body GTM".ljust(15) + "Consolidated JS", 'BOLD')
     print("-" * 85)
-    
-    all_passed = True
-    results = []
-    
-    for url in URLS_TO_CHECK:
-        result = check_gtm_implementation(url)
-        results.append(result)
-        
+
+    for result in results:
         status_str = result['result'].ljust(10)
         head_gtm_str = ("✓" if result['head_gtm'] else "✗").ljust(15)
         body_gtm_str = ("✓" if result['body_gtm'] else "✗").ljust(15)
         consolidated_str = "✓" if result['consolidated'] else "✗"
-        
+
         print_colored(
-            f"{url.ljust(30)}{status_str}{head_gtm_str}{body_gtm_str}{consolidated_str}",
+            f"{result['url'].ljust(30)}{status_str}{head_gtm_str}{body_gtm_str}{consolidated_str}",
             result['color']
         )
-        
-        if result['result'] != 'PASSED':
-            all_passed = False
-    
+
     print("\nSummary:")
-    if all_passed:
+    if all(result['result'] == 'PASSED' for result in results):
         print_colored("✅ GTM is correctly implemented on all pages!", 'GREEN')
     else:
         print_colored("❌ Some pages have GTM implementation issues.", 'RED')
         print_colored("   Please check the above results for details.", 'YELLOW')
 
+
+def junit_report(results, elapsed):
+    """One test case per page; PARTIAL/FAILED are failures, ERROR is an error."""
+    suite = ElementTree.Element('testsuite', {
+        'name': f'gtm-{GTM_CONTAINER_ID}',
+        'tests': str(len(results)),
+        'failures': str(sum(r['result'] in ('PARTIAL', 'FAILED') for r in results)),
+        'errors': str(sum(r['result'] == 'ERROR' for r in results)),
+        'time': f'{elapsed:.3f}',
+    })
+    for result in results:
+        case = ElementTree.SubElement(suite, 'testcase', {
+            'classname': 'gtm_test', 'name': result['url'], 'time': f"{result['time']:.3f}"})
+        if result['result'] == 'ERROR':
+            ElementTree.SubElement(case, 'error', {'message': result['error']})
+        elif result['result'] != 'PASSED':
+            missing = [label for key, label in (('head_gtm', 'head script'), ('body_gtm', 'noscript iframe'))
+                       if not result[key]]
+            ElementTree.SubElement(case, 'failure', {'message': f"Missing GTM {' and '.join(missing)}"})
+    return ElementTree.tostring(suite, encoding='unicode')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the GTM snippet on every page of the site.')
+    parser.add_argument('paths', nargs='*', default=URLS_TO_CHECK, help='paths to check (default: all pages)')
+    parser.add_argument('--base-url', default=BASE_URL, help='site to check (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='concurrent requests (default: %(default)s)')
+    parser.add_argument('--format', choices=['text', 'json', 'junit'], default='text',
+                        help='report format (default: %(default)s)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = check_all(args.paths, args.base_url, args.workers)
+    elapsed = time.perf_counter() - started
+
+    if args.format == 'json':
+        print(json.dumps({
+            'container_id': GTM_CONTAINER_ID,
+            'base_url': args.base_url,
+            'time': round(elapsed, 3),
+            'results': [{k: v for k, v in r.items() if k != 'color'} for r in results],
+        }, indent=2))
+    elif args.format == 'junit':
+        print(junit_report(results, elapsed))
+    else:
+        print_table(results)
+        print(f"\nChecked {len(results)} pages in {elapsed:.2f}s")
+
+    return all(result['result'] == 'PASSED' for result in results)
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,92 @@
+"""
+Production gunicorn settings, picked up automatically from the working directory.
+
+The site is mostly template and file serving with a few upstream-bound
+routes (``/api/github_repos`` on a cold cache, the GA sender), so it runs
+threaded workers: one process per CPU for the rendering work and several
+threads each, so a request waiting on GitHub does not block the worker.
+On the ``python benchmark.py`` route mix the default 4 threads give a
+lower median latency than sync workers at 16 and 64 concurrent clients,
+and a lower p99 at 64, for about the same throughput. At 16 clients sync
+workers keep a tighter p99, slow clients included; set
+``GUNICORN_WORKER_CLASS=sync`` where the tail at light load matters more.
+
+The app is loaded once in the master (``preload_app``): templates are
+compiled, the page cache is filled and the artifact index is built before
+forking, and the workers share those pages copy-on-write. ``post_worker_init``
+restarts the per-process threads and signal handlers that do not survive
+the fork. With ``METRICS_DIR`` set, an exiting worker writes a last metrics
+snapshot and the master folds it into the retired total (``child_exit``).
+
+Every value can be overridden with a ``GUNICORN_*`` environment variable or
+on the command line.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = 'main:app'
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Threads cover I/O waits; processes are for CPU-bound rendering and are
+# capped because each holds its own caches
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = _env_int('GUNICORN_WORKERS', max(2, min(multiprocessing.cpu_count(), 8)))
+threads = _env_int('GUNICORN_THREADS', 4)
+
+# Disabled in development with GUNICORN_PRELOAD=0, since --reload needs it off
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Recycle workers periodically so slow leaks and cache growth are bounded;
+# the jitter keeps them from restarting at the same time
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 10000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 1000)
+
+# Hold idle keep-alive connections briefly: long enough to serve a page's
+# follow-up asset and API requests on the same connection, short enough
+# that idle clients don't pin worker threads
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+
+# Worker heartbeat files on tmpfs, so a slow disk can't make workers look hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    from app import init_worker
+
+    init_worker(worker.wsgi)
+
+
+def on_starting(server):
+    # Snapshots left by a previous server belong to workers that no longer exist
+    if os.environ.get('METRICS_DIR'):
+        import instrumentation
+
+        instrumentation.clear_snapshots(os.environ['METRICS_DIR'])
+
+
+def worker_exit(server, worker):
+    from app import metrics
+
+    if metrics.metrics_dir:
+        try:
+            metrics.write_snapshot()
+        except OSError:
+            pass
+
+
+def child_exit(server, worker):
+    if os.environ.get('METRICS_DIR'):
+        import instrumentation
+
+        instrumentation.retire_worker(os.environ['METRICS_DIR'], worker.pid)
@@ -0,0 +1,231 @@
+"""
+Responsive derivatives of the images under ``static/images``.
+
+The originals are multi-megabyte photos and charts. The pipeline resizes each
+one to a set of widths in AVIF, WebP and JPEG, drops EXIF/XMP metadata and
+caches the results on disk under the SHA-256 of the source, so a changed
+image gets new files and new URLs while an unchanged one is never re-encoded.
+
+Derivatives are produced lazily by the ``/images/<digest>/<path>`` route on
+first request, or ahead of time with ``python images.py``. Templates use the
+``picture`` macro in ``templates/macros.html``, which renders ``<picture>``
+markup with a ``srcset`` per format from :meth:`ImagePipeline.responsive_image`.
+
+Pillow is optional: without it the macro falls back to the original file.
+"""
+import argparse
+import functools
+import importlib.util
+import os
+import posixpath
+import threading
+
+from flask import url_for
+
+DEFAULT_ROOT = 'static/images'
+SUFFIXES = ['.jpg', '.jpeg', '.png']
+WIDTHS = (320, 640, 960, 1280, 1920)
+DIGEST_LENGTH = 16
+# Width of the plain <img src> for browsers without srcset support
+FALLBACK_WIDTH = 960
+
+# Preferred first: browsers take the first <source> type they support
+FORMATS = {
+    'avif': {'ext': 'avif', 'mimetype': 'image/avif', 'save': {'quality': 55, 'speed': 6}},
+    'webp': {'ext': 'webp', 'mimetype': 'image/webp', 'save': {'quality': 80, 'method': 6}},
+    'jpeg': {'ext': 'jpg', 'mimetype': 'image/jpeg', 'save': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+FALLBACK_FORMAT = 'jpeg'
+ORIENTATION_TAG = 0x0112
+
+
+@functools.cache
+def available():
+    """Whether Pillow is installed; checked without importing it."""
+    return importlib.util.find_spec('PIL') is not None
+
+
+@functools.cache
+def supported_formats():
+    """The formats this Pillow build can encode, in preference order."""
+    if not available():
+        return []
+    from PIL import features
+
+    return [fmt for fmt in FORMATS if fmt == FALLBACK_FORMAT or features.check(fmt)]
+
+
+class ImagePipeline:
+    """Generates and caches resized, re-encoded copies of registered images.
+
+    Source images come from an :class:`artifacts.ArtifactRegistry` tree
+    (``images/<path>``), which already knows each file's content hash.
+    """
+
+    def __init__(self, registry, cache_dir=None, prefix='images', widths=WIDTHS):
+        self.registry = registry
+        self.cache_dir = cache_dir
+        self.prefix = prefix
+        self.widths = widths
+        self._sizes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.cache_dir = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'image_cache')
+        app.add_template_global(self.responsive_image)
+        app.extensions['images'] = self
+
+    @property
+    def formats(self):
+        # Pillow is imported on first use rather than at worker boot
+        return supported_formats()
+
+    def source(self, filename):
+        return self.registry.get(f'{self.prefix}/{filename}')
+
+    def size(self, artifact):
+        """``(width, height)`` of a source image, read from its header once per content hash."""
+        size = self._sizes.get(artifact.sha256)
+        if size is None:
+            from PIL import Image
+
+            with Image.open(artifact.path) as image:
+                size = image.size
+                # EXIF orientations 5-8 rotate by 90 degrees
+                if image.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8):
+                    size = size[::-1]
+            self._sizes[artifact.sha256] = size
+        return size
+
+    def widths_for(self, artifact):
+        """Target widths for a source: the configured widths below its own, plus its own
+        width when that is within the largest configured one."""
+        width = self.size(artifact)[0]
+        widths = [w for w in self.widths if w < width]
+        if width <= self.widths[-1]:
+            widths.append(width)
+        return widths
+
+    def derivative_name(self, filename, width, fmt):
+        """``photos/profile.jpg`` -> ``photos/profile-640.webp``."""
+        return f'{posixpath.splitext(filename)[0]}-{width}.{FORMATS[fmt]["ext"]}'
+
+    def resolve(self, name):
+        """Map a derivative name back to ``(source filename, width, format)``, or ``None``."""
+        base, _, ext = name.rpartition('.')
+        stem, _, width = base.rpartition('-')
+        fmt = next((f for f in self.formats if FORMATS[f]['ext'] == ext), None)
+        if fmt is None or not width.isdigit():
+            return None
+        for suffix in SUFFIXES:
+            if self.source(stem + suffix) is not None:
+                return stem + suffix, int(width), fmt
+        return None
+
+    def _cache_path(self, artifact, name):
+        return os.path.join(self.cache_dir, artifact.sha256[:DIGEST_LENGTH], name)
+
+    def derivative(self, filename, width, fmt):
+        """Return the path of a derivative, encoding it on first use."""
+        artifact = self.source(filename)
+        if artifact is None or fmt not in self.formats or width not in self.widths_for(artifact):
+            return None
+        path = self._cache_path(artifact, posixpath.basename(self.derivative_name(filename, width, fmt)))
+        if os.path.exists(path):
+            return path
+
+        with self._lock:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                self._encode(artifact.path, path, width, fmt)
+        return path
+
+    def _encode(self, source_path, path, width, fmt):
+        from PIL import Image, ImageOps
+
+        with Image.open(source_path) as image:
+            icc_profile = image.info.get('icc_profile')
+            image = ImageOps.exif_transpose(image)
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                image = image.resize((width, height), Image.LANCZOS)
+            if fmt == 'jpeg' and image.mode != 'RGB':
+                # JPEG has no alpha channel; flatten transparent charts onto white
+                background = Image.new('RGB', image.size, 'white')
+                image = image.convert('RGBA')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so concurrent workers never serve a partial file.
+            # Only the colour profile is carried over; EXIF/XMP are dropped.
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            image.save(tmp_path, format=fmt.upper(), icc_profile=icc_profile,
+                       **FORMATS[fmt]['save'])
+            os.replace(tmp_path, path)
+
+    def url(self, filename, width, fmt):
+        artifact = self.source(filename)
+        return url_for('image_derivative', digest=artifact.sha256[:DIGEST_LENGTH],
+                       name=self.derivative_name(filename, width, fmt))
+
+    def responsive_image(self, filename):
+        """Template data for the ``picture`` macro, or ``None`` to use the original file.
+
+        Returns ``{'sources': [{'type', 'srcset'}], 'src', 'srcset', 'width', 'height'}``
+        where ``src``/``srcset`` are the JPEG fallback.
+        """
+        artifact = self.source(filename)
+        if not self.formats or artifact is None:
+            return None
+        widths = self.widths_for(artifact)
+        width, height = self.size(artifact)
+        srcsets = {fmt: ', '.join(f'{self.url(filename, w, fmt)} {w}w' for w in widths) for fmt in self.formats}
+        return {
+            'sources': [{'type': FORMATS[fmt]['mimetype'], 'srcset': srcsets[fmt]}
+                        for fmt in self.formats if fmt != FALLBACK_FORMAT],
+            'src': self.url(filename, max([w for w in widths if w <= FALLBACK_WIDTH] or widths[:1]),
+                            FALLBACK_FORMAT),
+            'srcset': srcsets[FALLBACK_FORMAT],
+            'width': width,
+            'height': height,
+        }
+
+    def build_all(self):
+        """Encode every derivative of every registered image; yields ``(filename, path)``."""
+        for artifact in self.registry:
+            filename = artifact.name[len(self.prefix) + 1:]
+            for width in self.widths_for(artifact):
+                for fmt in self.formats:
+                    yield filename, self.derivative(filename, width, fmt)
+
+
+def main():
+    import blobstore
+    from artifacts import ArtifactRegistry
+
+    parser = argparse.ArgumentParser(description='Pre-build responsive image derivatives.')
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument('--cache-dir', default=os.path.join(root, 'instance', 'image_cache'),
+                        help='cache directory shared with the web app (default: %(default)s)')
+    args = parser.parse_args()
+
+    if not available():
+        parser.error('Pillow must be installed to build image derivatives')
+
+    blobs = blobstore.BlobStore(os.path.join(root, blobstore.DEFAULT_DIR))
+    registry = ArtifactRegistry(root=root, blobs=blobs)
+    registry.register_tree('images', [DEFAULT_ROOT], suffixes=SUFFIXES)
+    registry.refresh()
+
+    pipeline = ImagePipeline(registry, cache_dir=args.cache_dir)
+    for filename, path in pipeline.build_all():
+        print(f"{filename}: {os.path.relpath(path, args.cache_dir)} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Server-side request metrics: latency and response-size histograms per route,
+time spent in named phases (template rendering, file reads, upstream HTTP),
+a Prometheus ``/metrics`` endpoint and ``Server-Timing`` response headers.
+
+Code that does slow work wraps it in :func:`timed`::
+
+    with instrumentation.timed('file'):
+        content = f.read()
+
+Inside a request the duration is added to that request's ``Server-Timing``
+header as well as to the ``app_phase_duration_seconds`` histogram; outside a
+request (background refreshes, the GA sender thread) only the histogram is
+updated. Template rendering is timed through Flask's template signals, so
+views need no changes.
+
+Each observation is a ``bisect`` and a few additions under a lock. Metrics
+are kept per process; when ``METRICS_DIR`` is set every worker also writes a
+snapshot there every few seconds and ``/metrics`` serves the sum over all
+workers. When gunicorn reaps a worker, :func:`retire_worker` folds its last
+snapshot into ``retired.json`` and deletes it, so recycled workers neither
+pile up files nor take their counts with them.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+
+# Seconds; chosen around the 10 ms - 1 s range the pages actually take
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+SNAPSHOT_INTERVAL = 5
+RETIRED_SNAPSHOT = 'retired.json'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts (non-cumulative), then +Inf, sum and count
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self.series.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self.series.items()}
+
+    def render(self, series):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(self.labels, labels))
+            prefix = f'{label_text},' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{self.name}_sum{suffix} {values[-2]:.6f}')
+            lines.append(f'{self.name}_count{suffix} {values[-1]}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """Write-then-rename, so readers never see a partial file."""
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def _merge(merged, data):
+    """Add a snapshot (``{name: [[labels, values], ...]}``) into ``{name: {labels: values}}``."""
+    for name, series in data.items():
+        target = merged.setdefault(name, {})
+        for labels, values in series:
+            labels = tuple(labels)
+            if labels in target:
+                target[labels] = [a + b for a, b in zip(target[labels], values)]
+            else:
+                target[labels] = values
+    return merged
+
+
+def _serialise(merged):
+    return {name: [[list(labels), values] for labels, values in series.items()] for name, series in merged.items()}
+
+
+def retire_worker(metrics_dir, pid):
+    """Fold a dead worker's snapshot into ``retired.json`` and delete the worker's file.
+
+    Called by the gunicorn master from ``child_exit``, one worker at a time.
+    ``retired.json`` lists the pids already folded in, so :meth:`Instrumentation.collect`
+    skips a worker file that is still there between the rename and the delete.
+    """
+    path = os.path.join(metrics_dir, f'{pid}.json')
+    data = _read_json(path)
+    if data is None:
+        return
+    retired_path = os.path.join(metrics_dir, RETIRED_SNAPSHOT)
+    retired = _read_json(retired_path) or {'pids': [], 'metrics': {}}
+    merged = _merge(_merge({}, retired['metrics']), data)
+    pids = [old for old in retired['pids'] if os.path.exists(os.path.join(metrics_dir, f'{old}.json'))]
+    _write_json(retired_path, {'pids': pids + [pid], 'metrics': _serialise(merged)})
+    os.remove(path)
+
+
+def clear_snapshots(metrics_dir):
+    """Delete every snapshot in ``metrics_dir``, e.g. ones left by a previous server."""
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+REQUEST_DURATION = Histogram('app_request_duration_seconds', 'Time from request start to response, by route.',
+                             ['route', 'method', 'status'], LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('app_response_size_bytes', 'Response body size, by route (known lengths only).',
+                          ['route'], SIZE_BUCKETS)
+PHASE_DURATION = Histogram('app_phase_duration_seconds',
+                           'Time spent in template rendering, file reads and upstream HTTP calls.',
+                           ['phase'], LATENCY_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, RESPONSE_SIZE, PHASE_DURATION)
+
+
+def record_phase(phase, seconds):
+    """Add ``seconds`` to a phase, and to the current request's Server-Timing when in one."""
+    PHASE_DURATION.observe(seconds, phase)
+    if has_request_context():
+        phases = g.setdefault('_phase_timings', {})
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    """Time the enclosed block as ``phase``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+class Instrumentation:
+    """Hooks the request lifecycle and serves the collected metrics."""
+
+    def __init__(self, server_timing=True, metrics_dir=None):
+        self.server_timing = server_timing
+        self.metrics_dir = metrics_dir
+        self._snapshotter = None
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.server_timing = app.config.get('SERVER_TIMING', self.server_timing)
+        self.metrics_dir = app.config.get('METRICS_DIR') or os.environ.get('METRICS_DIR') or self.metrics_dir
+
+        # Register this before the other after_request hooks so it runs last
+        # and the recorded duration includes them
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['instrumentation'] = self
+
+        if self.metrics_dir:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            self.start_snapshotter()
+
+    def _start(self):
+        g._request_started = time.perf_counter()
+
+    def _template_started(self, sender, template, context, **extra):
+        self._local.template_started = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        started = getattr(self._local, 'template_started', None)
+        if started is not None:
+            record_phase('template', time.perf_counter() - started)
+            self._local.template_started = None
+
+    def _finish(self, response):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        # The URL rule, not the path, so notebook and download paths don't explode the label set
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_DURATION.observe(elapsed, route, request.method, str(response.status_code))
+        if response.content_length is not None:
+            RESPONSE_SIZE.observe(response.content_length, route)
+
+        if self.server_timing:
+            phases = g.get('_phase_timings', {})
+            metrics = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in phases.items()]
+            metrics.append(f'app;dur={elapsed * 1000:.2f}')
+            response.headers.add('Server-Timing', ', '.join(metrics))
+        return response
+
+    def reset(self):
+        """Drop everything recorded so far, e.g. by the boot-time warm-up."""
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(self.metrics_dir, f'{pid or os.getpid()}.json')
+
+    def write_snapshot(self):
+        """Write this process's metrics to ``METRICS_DIR`` (write-then-rename)."""
+        _write_json(self._snapshot_path(), _serialise({h.name: h.snapshot() for h in HISTOGRAMS}))
+
+    def start_snapshotter(self, interval=SNAPSHOT_INTERVAL):
+        if self._snapshotter is not None and self._snapshotter.is_alive():
+            return self._snapshotter
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot()
+                except OSError:
+                    pass
+
+        self._snapshotter = threading.Thread(target=run, name='metrics-snapshot', daemon=True)
+        self._snapshotter.start()
+        return self._snapshotter
+
+    def collect(self):
+        """``{histogram name: {labels: values}}`` for this process, plus the other workers' snapshots."""
+        merged = {h.name: h.snapshot() for h in HISTOGRAMS}
+        if not self.metrics_dir:
+            return merged
+        # Read the retired totals first: a worker file folded in after this read
+        # is then either still on disk or already deleted, never counted twice
+        retired = _read_json(os.path.join(self.metrics_dir, RETIRED_SNAPSHOT))
+        skip = {self._snapshot_path(), os.path.join(self.metrics_dir, RETIRED_SNAPSHOT)}
+        if retired:
+            _merge(merged, retired['metrics'])
+            skip.update(self._snapshot_path(pid) for pid in retired['pids'])
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            if path in skip:
+                continue
+            data = _read_json(path)
+            if data is not None:
+                _merge(merged, data)
+        return merged
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        collected = self.collect()
+        lines = []
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.render(collected.get(histogram.name, {})))
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
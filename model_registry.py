@@ -0,0 +1,335 @@
+"""
+Versioned store of fitted sales models, plus an LRU cache of their predictions.
+
+The budget optimisation notebook fits its ``XGBRegressor`` and
+``StandardScaler`` from scratch on every run. Here a fitted model and scaler
+are published once as an immutable version::
+
+    instance/models/<name>/<version>/manifest.json
+    instance/models/<name>/<version>/scaler_mean.npy, scaler_scale.npy
+    instance/models/<name>/<version>/coef.npy      (NumPy ridge model)
+    instance/models/<name>/<version>/model.ubj     (XGBoost booster)
+
+Versions are numbered 1, 2, ...; a version directory is written under a
+temporary name and renamed into place, so workers never see a half-written
+one. The web process loads a version on first use, memory-mapping the
+``.npy`` arrays (XGBoost boosters are read with ``load_model``, which cannot
+map them), and keeps it for the life of the worker; restart the workers to
+pick up a newly published version, or pin one with ``SALES_MODEL_VERSION``.
+
+For XGBoost versions, predictions for batches of up to a few thousand rows
+go through a per-version LRU cache keyed on the raw features, so a repeated
+optimiser query skips the model entirely. Large batches (sensitivity sweeps)
+bypass it rather than flush it. Ridge models predict faster than the feature
+matrix can be hashed, so they are never cached.
+
+Usage:
+    python model_registry.py publish [--kind ridge|xgboost] [--if-missing]
+    python model_registry.py list
+    python model_registry.py benchmark [--queries 50]
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import budget_optimizer
+from budget_optimizer import FEATURES, MODEL_NAME, Predictor
+
+DEFAULT_DIR = os.path.join('instance', 'models')
+MANIFEST_NAME = 'manifest.json'
+CACHE_SIZE = 50_000
+# Batches above this many rows are predicted without the cache
+MAX_CACHED_BATCH = 4096
+# Model kinds whose predict costs more than hashing its input
+CACHED_KINDS = {'xgboost'}
+
+# Hyperparameters from the notebook
+XGBOOST_PARAMS = {
+    'objective': 'reg:squarederror',
+    'n_estimators': 100,
+    'learning_rate': 0.1,
+    'max_depth': 5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+}
+
+
+class ModelRegistryError(ValueError):
+    """Raised for a model version that is not published or cannot be used."""
+
+
+class CachedPredictor(Predictor):
+    """A :class:`budget_optimizer.Predictor` with an LRU cache of predictions.
+
+    Entries are keyed on a digest of the feature matrix (a single row for
+    point predictions, the whole grid for an optimiser query) and the cache
+    is bounded by the number of predicted rows it holds.
+    """
+
+    def __init__(self, model, scaler, label, manifest=None, cache_size=CACHE_SIZE, max_batch=MAX_CACHED_BATCH):
+        super().__init__(model, scaler, label)
+        self.manifest = manifest or {}
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def predict(self, X):
+        import numpy as np
+
+        X = np.ascontiguousarray(X, dtype=float)
+        if len(X) > min(self.max_batch, self.cache_size):
+            return super().predict(X)
+
+        key = hashlib.blake2b(X.data, digest_size=16, person=str(X.shape).encode()[:16]).digest()
+        with self._lock:
+            predictions = self._cache.get(key)
+            if predictions is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return predictions.copy()
+            self.misses += 1
+
+        predictions = super().predict(X)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = predictions.copy()
+                self._rows += len(predictions)
+            while self._rows > self.cache_size:
+                _, evicted = self._cache.popitem(last=False)
+                self._rows -= len(evicted)
+        return predictions
+
+    def stats(self):
+        return {'model': self.label, 'entries': len(self._cache), 'rows': self._rows,
+                'hits': self.hits, 'misses': self.misses}
+
+
+class ModelRegistry:
+    """Publishes and loads versioned model/scaler pairs under ``root``."""
+
+    def __init__(self, root=DEFAULT_DIR, cache_size=CACHE_SIZE):
+        self.root = root
+        self.cache_size = cache_size
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.root = app.config.get('MODEL_REGISTRY_DIR') or os.path.join(app.instance_path, 'models')
+        self.cache_size = app.config.get('PREDICTION_CACHE_SIZE', self.cache_size)
+        app.extensions['model_registry'] = self
+
+    def versions(self, name):
+        """Published versions of ``name``, oldest first."""
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(entry) for entry in os.listdir(directory)
+                      if entry.isdigit() and os.path.exists(os.path.join(directory, entry, MANIFEST_NAME)))
+
+    def latest(self, name):
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def resolve(self, name, version=None):
+        """The version to load: ``version``, which must be published, or the latest (None if none is)."""
+        if not version:
+            return self.latest(name)
+        try:
+            version = int(version)
+        except ValueError:
+            raise ModelRegistryError(f'Invalid model version: {version!r}')
+        if version not in self.versions(name):
+            published = ', '.join(map(str, self.versions(name))) or 'none'
+            raise ModelRegistryError(f'{name} v{version} is not published (published versions: {published})')
+        return version
+
+    def manifest(self, name, version):
+        with open(os.path.join(self.root, name, str(version), MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+
+    def publish(self, name, model, scaler, kind, metrics=None):
+        """Write a fitted model and scaler as the next version of ``name``; returns the version."""
+        import numpy as np
+
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.publish-', dir=directory)
+        try:
+            os.chmod(staging, 0o755)
+            np.save(os.path.join(staging, 'scaler_mean.npy'), np.asarray(scaler.mean_, dtype=float))
+            np.save(os.path.join(staging, 'scaler_scale.npy'), np.asarray(scaler.scale_, dtype=float))
+            if kind == 'ridge':
+                np.save(os.path.join(staging, 'coef.npy'), np.append(model.coef_, model.intercept_))
+            elif kind == 'xgboost':
+                model.save_model(os.path.join(staging, 'model.ubj'))
+            else:
+                raise ValueError(f'Unknown model kind: {kind}')
+
+            manifest = {
+                'name': name,
+                'kind': kind,
+                'features': FEATURES,
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'metrics': metrics or {},
+            }
+            # Another publisher may take a version number first; try the next one
+            while True:
+                version = (self.latest(name) or 0) + 1
+                manifest['version'] = version
+                with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+                    json.dump(manifest, f, indent=2)
+                try:
+                    os.rename(staging, os.path.join(directory, str(version)))
+                    return version
+                except OSError:
+                    if not os.path.exists(os.path.join(directory, str(version))):
+                        raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load(self, name, version=None):
+        """The given (or latest) version as a :class:`Predictor`, or None if none is published."""
+        version = self.resolve(name, version)
+        if version is None:
+            return None
+        key = (name, version)
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = self._read(name, version)
+            return self._loaded[key]
+
+    def _read(self, name, version):
+        import numpy as np
+
+        directory = os.path.join(self.root, name, str(version))
+        manifest = self.manifest(name, version)
+        if manifest['features'] != FEATURES:
+            raise ModelRegistryError(f'{name} v{version} was trained on different features')
+
+        scaler = budget_optimizer.Standardizer()
+        scaler.mean_ = np.load(os.path.join(directory, 'scaler_mean.npy'), mmap_mode='r')
+        scaler.scale_ = np.load(os.path.join(directory, 'scaler_scale.npy'), mmap_mode='r')
+        if manifest['kind'] == 'ridge':
+            weights = np.load(os.path.join(directory, 'coef.npy'), mmap_mode='r')
+            model = budget_optimizer.RidgeSalesModel()
+            model.coef_, model.intercept_ = weights[:-1], float(weights[-1])
+        else:
+            import xgboost
+
+            model = xgboost.XGBRegressor()
+            model.load_model(os.path.join(directory, 'model.ubj'))
+        label = f'{name}/{version}'
+        if manifest['kind'] in CACHED_KINDS and self.cache_size:
+            return CachedPredictor(model, scaler, label, manifest, cache_size=self.cache_size)
+        return Predictor(model, scaler, label)
+
+
+def train(kind='ridge', seed=42, test_size=0.2):
+    """Fit a model on the notebook's simulated campaign; returns ``(model, scaler, metrics)``."""
+    import numpy as np
+
+    X, y = budget_optimizer.simulate_campaign(seed)
+    order = np.random.RandomState(seed).permutation(len(X))
+    split = int(len(X) * (1 - test_size))
+    train_rows, test_rows = order[:split], order[split:]
+
+    scaler = budget_optimizer.Standardizer().fit(X[train_rows])
+    if kind == 'ridge':
+        model = budget_optimizer.RidgeSalesModel().fit(scaler.transform(X[train_rows]), y[train_rows])
+    else:
+        import xgboost
+
+        model = xgboost.XGBRegressor(**XGBOOST_PARAMS).fit(scaler.transform(X[train_rows]), y[train_rows])
+
+    predicted = np.asarray(model.predict(scaler.transform(X[test_rows])), dtype=float)
+    residual = y[test_rows] - predicted
+    metrics = {
+        'rmse': float(np.sqrt(np.mean(residual ** 2))),
+        'r2': float(1 - np.sum(residual ** 2) / np.sum((y[test_rows] - y[test_rows].mean()) ** 2)),
+        'train_rows': len(train_rows),
+        'test_rows': len(test_rows),
+    }
+    return model, scaler, metrics
+
+
+def benchmark(registry, name, queries):
+    """Per-query latency of an optimiser query: retraining first vs a published model, cold and cached."""
+    import numpy as np
+
+    def timed(run):
+        samples = []
+        for i in range(queries):
+            started = time.perf_counter()
+            run(i)
+            samples.append(time.perf_counter() - started)
+        return {'mean_ms': round(float(np.mean(samples)) * 1000, 3),
+                'p95_ms': round(float(np.percentile(samples, 95)) * 1000, 3)}
+
+    kind = registry.manifest(name, registry.latest(name))['kind']
+    scenario = {'total_budget': 150000, 'days_to_christmas': 14, 'week': 8}
+
+    def retrain(i):
+        model, scaler, _ = train(kind)
+        budget_optimizer.BudgetOptimizer(model, scaler).optimize(**scenario)
+
+    def cold_load(i):
+        budget_optimizer.BudgetOptimizer(registry=ModelRegistry(registry.root)).optimize(**scenario)
+
+    loaded = budget_optimizer.BudgetOptimizer(registry=ModelRegistry(registry.root, cache_size=0))
+    cached = budget_optimizer.BudgetOptimizer(registry=ModelRegistry(registry.root))
+    return {
+        'model': f'{name}/{registry.latest(name)} ({kind})',
+        'retrain_per_query': timed(retrain),
+        'load_per_query': timed(cold_load),
+        'loaded_uncached': timed(lambda i: loaded.optimize(**dict(scenario, days_to_christmas=i % 30))),
+        'loaded_cached': timed(lambda i: cached.optimize(**scenario)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish and inspect versioned sales models.')
+    parser.add_argument('--root', default=DEFAULT_DIR, help='registry directory (default: %(default)s)')
+    parser.add_argument('--name', default=MODEL_NAME)
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish = commands.add_parser('publish', help='train on the simulated campaign and publish a new version')
+    publish.add_argument('--kind', choices=['ridge', 'xgboost'], default='ridge')
+    publish.add_argument('--if-missing', action='store_true',
+                         help='do nothing if the latest version is already of this kind')
+    commands.add_parser('list', help='list published versions')
+    bench = commands.add_parser('benchmark', help='compare retraining per query with the registry')
+    bench.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'publish':
+        latest = registry.latest(args.name)
+        if args.if_missing and latest and registry.manifest(args.name, latest)['kind'] == args.kind:
+            print(f"{args.name} v{latest} ({args.kind}) already published")
+            return
+        model, scaler, metrics = train(args.kind)
+        version = registry.publish(args.name, model, scaler, args.kind, metrics)
+        print(f"Published {args.name} v{version} ({args.kind}): {json.dumps(metrics)}")
+    elif args.command == 'list':
+        for version in registry.versions(args.name):
+            manifest = registry.manifest(args.name, version)
+            print(f"{version:4d}  {manifest['kind']:8s}  {manifest['created']}  {json.dumps(manifest['metrics'])}")
+    elif args.command == 'benchmark':
+        if registry.latest(args.name) is None:
+            parser.error(f'nothing published for {args.name}; run publish first')
+        print(json.dumps(benchmark(registry, args.name, args.queries), indent=2))
+
+
+if __name__ == '__main__':
+    main()
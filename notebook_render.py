@@ -0,0 +1,257 @@
+"""
+Server-side rendering of Jupyter notebooks to cached HTML fragments.
+
+The notebook page used to fetch the raw notebook JSON and run Markdown
+parsing and syntax highlighting in the browser for every cell on every view.
+This module does that work once: each cell is rendered to an HTML fragment
+keyed by the SHA-256 of its JSON, each notebook to a page fragment keyed by
+the SHA-256 of the file, and both are kept in memory and on disk.
+
+Math is left in place (protected from the Markdown parser) and typeset by
+KaTeX in a single pass over the pre-rendered container.
+
+Run ``python notebook_render.py`` to pre-build the cache offline; anything not
+pre-built is rendered on first request.
+"""
+import argparse
+import functools
+import hashlib
+import html
+import importlib.util
+import json
+import os
+import re
+import threading
+
+import instrumentation
+import notebooks
+
+# Bump when the fragment markup changes so stale disk caches are ignored
+RENDER_VERSION = '1'
+
+DEFAULT_ROOTS = ['static/historical_projects']
+PYGMENTS_STYLE = 'monokai'
+
+_math = re.compile(r'\$\$.+?\$\$|\$[^$\n]+?\$|\\\(.+?\\\)|\\\[.+?\\\]', re.DOTALL)
+_ansi = re.compile(r'\x1b\[[0-9;]*m')
+_heading = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+
+
+def _text(value):
+    """Notebook strings may be stored as a single string or a list of lines."""
+    return ''.join(value) if isinstance(value, list) else (value or '')
+
+
+@functools.cache
+def available():
+    """Whether the optional Markdown/Pygments dependencies are installed.
+
+    Checked without importing them: they are only imported when a notebook
+    actually has to be rendered, not for cache hits or at worker boot.
+    """
+    return all(importlib.util.find_spec(name) is not None for name in ('markdown', 'pygments'))
+
+
+def notebook_title(cells, default):
+    """Title from the first top-level Markdown heading, as the client-side renderer did."""
+    for cell in cells:
+        if cell.get('cell_type') == 'markdown':
+            match = _heading.search(_text(cell.get('source')))
+            if match:
+                return match.group(1)
+    return default
+
+
+class NotebookRenderer:
+    """Renders notebooks to HTML and caches the fragments in memory and on disk."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._formatter = None
+
+    def init_app(self, app):
+        self.cache_dir = app.config.get('NOTEBOOK_CACHE_DIR') or os.path.join(app.instance_path, 'notebook_cache')
+        app.extensions['notebook_renderer'] = self
+
+    @property
+    def formatter(self):
+        if self._formatter is None:
+            from pygments.formatters import HtmlFormatter
+            self._formatter = HtmlFormatter(style=PYGMENTS_STYLE, cssclass='highlight')
+        return self._formatter
+
+    @property
+    def stylesheet(self):
+        """CSS for the Pygments token classes used in rendered code cells."""
+        return self.formatter.get_style_defs('.highlight')
+
+    def _cache_path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, f'{key}.json')
+
+    def _load(self, kind, key):
+        with self._lock:
+            cached = self._memory.get((kind, key))
+        if cached is not None or self.cache_dir is None:
+            return cached
+        try:
+            with open(self._cache_path(kind, key), 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._memory[(kind, key)] = cached
+        return cached
+
+    def _store(self, kind, key, value):
+        with self._lock:
+            self._memory[(kind, key)] = value
+        if self.cache_dir is None:
+            return value
+        path = self._cache_path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent workers never read a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        return value
+
+    def render_markdown(self, source):
+        import markdown
+
+        placeholders = []
+
+        def protect(match):
+            placeholders.append(match.group(0))
+            return f'\x00MATH{len(placeholders) - 1}\x00'
+
+        rendered = markdown.markdown(_math.sub(protect, source), extensions=['tables', 'fenced_code'])
+        return re.sub(r'\x00MATH(\d+)\x00', lambda m: html.escape(placeholders[int(m.group(1))]), rendered)
+
+    def render_code(self, source, language):
+        from pygments import highlight
+        from pygments.lexers import PythonLexer, get_lexer_by_name
+        from pygments.util import ClassNotFound
+
+        try:
+            lexer = get_lexer_by_name(language)
+        except ClassNotFound:
+            lexer = PythonLexer()
+        return highlight(source, lexer, self.formatter)
+
+    def render_output_data(self, data):
+        # Same mime type precedence as the client-side renderer
+        if 'text/html' in data:
+            return _text(data['text/html'])
+        if 'image/png' in data:
+            return f'<img src="data:image/png;base64,{_text(data["image/png"]).strip()}" class="output-image">'
+        if 'text/latex' in data:
+            return f'<div class="latex-output">$${html.escape(_text(data["text/latex"]))}$$</div>'
+        if 'text/plain' in data:
+            return f'<pre>{html.escape(_text(data["text/plain"]))}</pre>'
+        return '<div>Unsupported output format</div>'
+
+    def render_output(self, output):
+        output_type = output.get('output_type')
+        if output_type == 'execute_result':
+            count = output.get('execution_count')
+            return (f'<span class="execute-count">Out[{"" if count is None else count}]:</span>'
+                    + self.render_output_data(output.get('data', {})))
+        if output_type == 'display_data':
+            return self.render_output_data(output.get('data', {}))
+        if output_type == 'stream':
+            return f'<pre>{html.escape(_text(output.get("text")))}</pre>'
+        if output_type == 'error':
+            traceback = _ansi.sub('', '\n'.join(output.get('traceback', [])))
+            return f'<div class="output-error"><pre>{html.escape(traceback)}</pre></div>'
+        return f'<div>Unsupported output type: {html.escape(str(output_type))}</div>'
+
+    def render_cell_html(self, cell, language):
+        cell_type = cell.get('cell_type')
+        source = _text(cell.get('source'))
+        if cell_type == 'markdown':
+            body = f'<div class="cell-markdown">{self.render_markdown(source)}</div>'
+        elif cell_type == 'code':
+            count = cell.get('execution_count')
+            body = (f'<div class="cell-code">'
+                    f'<span class="execute-count">In [{"" if count is None else count}]:</span>'
+                    f'<div class="code-input">{self.render_code(source, language)}</div>')
+            outputs = cell.get('outputs') or []
+            if outputs:
+                body += '<div class="code-output">' + ''.join(self.render_output(o) for o in outputs) + '</div>'
+            body += '</div>'
+        else:
+            body = f'<div class="alert alert-warning">Unsupported cell type: {html.escape(str(cell_type))}</div>'
+        return f'<div class="cell cell-{html.escape(str(cell_type))}">{body}</div>'
+
+    def render_cell(self, cell, language='python'):
+        """Return the HTML fragment for one cell, from cache when possible."""
+        key = hashlib.sha256(
+            json.dumps([RENDER_VERSION, language, cell], sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        cached = self._load('cells', key)
+        if cached is None:
+            cached = self._store('cells', key, self.render_cell_html(cell, language))
+        return cached
+
+    def render(self, artifact):
+        """Return ``{'html', 'title', 'language', 'kernel'}`` for a notebook artifact.
+
+        ``artifact`` is an :class:`artifacts.Artifact`; its content hash keys
+        the whole-notebook fragment so an unchanged file is never re-parsed.
+        """
+        key = f'{artifact.sha256}-{RENDER_VERSION}'
+        cached = self._load('notebooks', key)
+        if cached is not None:
+            return cached
+
+        with instrumentation.timed('file'), open(artifact.path, 'r') as f:
+            text = f.read()
+        cells, fields = [], {}
+        for kind, name, value in notebooks.scan_notebook(text):
+            if kind == 'cell':
+                cells.append(value)
+            else:
+                fields[name] = value
+
+        kernelspec = fields.get('metadata', {}).get('kernelspec', {})
+        language = kernelspec.get('language') or 'python'
+        rendered = {
+            'html': ''.join(self.render_cell(cell, language) for cell in cells),
+            'title': notebook_title(cells, os.path.basename(artifact.path)),
+            'language': kernelspec.get('language') or 'Unknown',
+            'kernel': kernelspec.get('display_name') or 'Unknown',
+        }
+        return self._store('notebooks', key, rendered)
+
+
+def main():
+    import blobstore
+    from artifacts import ArtifactRegistry
+
+    parser = argparse.ArgumentParser(description='Pre-render notebooks into the HTML fragment cache.')
+    parser.add_argument('roots', nargs='*', default=DEFAULT_ROOTS,
+                        help='directories to scan for .ipynb files (default: %(default)s)')
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument('--cache-dir', default=os.path.join(root, 'instance', 'notebook_cache'),
+                        help='cache directory shared with the web app (default: %(default)s)')
+    args = parser.parse_args()
+
+    if not available():
+        parser.error('markdown and pygments must be installed to pre-render notebooks')
+
+    blobs = blobstore.BlobStore(os.path.join(root, blobstore.DEFAULT_DIR))
+    registry = ArtifactRegistry(root=root, blobs=blobs)
+    registry.register_tree('notebooks', args.roots, suffixes=['.ipynb'])
+    registry.refresh()
+
+    renderer = NotebookRenderer(cache_dir=args.cache_dir)
+    for artifact in registry:
+        rendered = renderer.render(artifact)
+        print(f"{artifact.name}: {len(rendered['html'])} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Incremental reading of Jupyter notebooks for the notebook API.
+
+``json.load`` on a notebook builds the whole document, embedded base64 plots
+included, and ``jsonify`` then serialises it again. The scanner below walks
+the top-level JSON object with :meth:`json.JSONDecoder.raw_decode` so only one
+cell is decoded at a time, which lets the API stream cells out as they are
+parsed and skip or trim the ones the client did not ask for.
+
+Only the decoding is incremental: the scanner works on the notebook's text,
+so the file itself is still read into memory in one go. That copy is a
+single string; it is the decoded objects that cost several times the file
+size.
+"""
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class NotebookFormatError(ValueError):
+    """Raised when a notebook file is not a JSON object of the expected shape."""
+
+
+def _skip_whitespace(text, pos):
+    return _whitespace.match(text, pos).end()
+
+
+def _decode(text, pos):
+    try:
+        return _decoder.raw_decode(text, pos)
+    except json.JSONDecodeError as e:
+        raise NotebookFormatError(f"Invalid JSON at offset {e.pos}: {e.msg}")
+
+
+def _expect(text, pos, char):
+    pos = _skip_whitespace(text, pos)
+    if text[pos:pos + 1] != char:
+        raise NotebookFormatError(f"Expected {char!r} at offset {pos}")
+    return pos + 1
+
+
+def scan_notebook(text):
+    """Yield the top-level entries of a notebook document one at a time.
+
+    Cells are yielded individually as ``('cell', index, cell)``; every other
+    top-level key is yielded as ``('field', key, value)`` in file order.
+    """
+    pos = _expect(text, 0, '{')
+    pos = _skip_whitespace(text, pos)
+    if text[pos:pos + 1] == '}':
+        return
+
+    while True:
+        key, pos = _decode(text, _skip_whitespace(text, pos))
+        pos = _expect(text, pos, ':')
+        pos = _skip_whitespace(text, pos)
+
+        if key == 'cells':
+            pos = _expect(text, pos, '[')
+            pos = _skip_whitespace(text, pos)
+            index = 0
+            if text[pos:pos + 1] == ']':
+                pos += 1
+            else:
+                while True:
+                    cell, pos = _decode(text, _skip_whitespace(text, pos))
+                    yield 'cell', index, cell
+                    index += 1
+                    pos = _skip_whitespace(text, pos)
+                    if text[pos:pos + 1] == ']':
+                        pos += 1
+                        break
+                    pos = _expect(text, pos, ',')
+        else:
+            value, pos = _decode(text, pos)
+            yield 'field', key, value
+
+        pos = _skip_whitespace(text, pos)
+        if text[pos:pos + 1] == '}':
+            return
+        pos = _expect(text, pos, ',')
+
+
+def validate(text):
+    """Raise :class:`NotebookFormatError` unless ``text`` scans as a whole.
+
+    Decodes every cell once and keeps none of them, so a malformed notebook
+    can be rejected before a response is started.
+    """
+    for _ in scan_notebook(text):
+        pass
+
+
+def strip_outputs(cell):
+    """Return ``cell`` without its outputs (embedded images, tables, streams)."""
+    if cell.get('cell_type') != 'code' or not cell.get('outputs'):
+        return cell
+    return dict(cell, outputs=[])
+
+
+def iter_cells(text, offset=0, limit=None, outputs=True):
+    """Yield the same events as :func:`scan_notebook`, restricted to a cell range.
+
+    Cells outside ``[offset, offset + limit)`` are parsed and discarded, and
+    the total cell count is yielded last as ``('field', 'total_cells', n)``.
+    """
+    total = 0
+    for kind, key, value in scan_notebook(text):
+        if kind == 'cell':
+            total += 1
+            if key < offset or (limit is not None and key >= offset + limit):
+                continue
+            yield kind, key, value if outputs else strip_outputs(value)
+        else:
+            yield kind, key, value
+    yield 'field', 'total_cells', total
+
+
+def ndjson_lines(events):
+    """Serialise :func:`iter_cells` events as newline-delimited JSON records.
+
+    A format error ends the stream with a ``{"type": "error"}`` record before
+    it is re-raised, so clients can tell a failed stream from a short one.
+    """
+    try:
+        for kind, key, value in events:
+            if kind == 'cell':
+                record = {'type': 'cell', 'index': key, 'cell': value}
+            else:
+                record = {'type': 'field', 'key': key, 'value': value}
+            yield json.dumps(record) + '\n'
+    except NotebookFormatError as e:
+        yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+        raise
+
+
+def json_chunks(events, paginated=False):
+    """Serialise :func:`iter_cells` events as one JSON notebook document, in chunks.
+
+    The output has the regular nbformat shape (``cells`` first, then the
+    remaining top-level keys). When ``paginated`` is set the total cell count
+    is included as ``total_cells``; otherwise it is left out so the document
+    stays a plain notebook.
+    """
+    yield '{"cells": ['
+    first_cell = True
+    fields = []
+    for kind, key, value in events:
+        if kind == 'cell':
+            yield ('' if first_cell else ', ') + json.dumps(value)
+            first_cell = False
+        elif key != 'total_cells' or paginated:
+            fields.append((key, value))
+    yield ']'
+    for key, value in fields:
+        yield f', {json.dumps(key)}: {json.dumps(value)}'
+    yield '}'
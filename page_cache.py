@@ -0,0 +1,195 @@
+"""
+In-memory cache of rendered pages for routes whose output only depends on the
+template they render.
+
+Entries are keyed on the endpoint and the modification times of the template
+and everything it extends or includes, so editing a template produces a new
+key rather than serving stale HTML. Responses carry a strong ETag and a
+Last-Modified header and honour conditional GETs with ``304 Not Modified``.
+
+Pages built from large on-disk artifacts can also be cached pre-compressed,
+in which case every supported encoding is produced once at fill time and the
+best one is picked per request from ``Accept-Encoding``.
+"""
+import functools
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from flask import Response, current_app, make_response, request
+from jinja2 import meta
+
+from compression import encode_variants, negotiate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    """A rendered page body plus the validators sent with it."""
+    body: bytes
+    mimetype: str
+    etag: str
+    last_modified: datetime
+    encodings: dict = field(default_factory=dict)
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(variant) for variant in self.encodings.values())
+
+    def to_response(self, max_age=0):
+        encoding = negotiate(request.accept_encodings, self.encodings)
+        if encoding is None:
+            response = Response(self.body, mimetype=self.mimetype)
+            response.set_etag(self.etag)
+        else:
+            response = Response(self.encodings[encoding], mimetype=self.mimetype)
+            response.content_encoding = encoding
+            # Each representation needs its own strong validator
+            response.set_etag(f'{self.etag}-{encoding}')
+        if self.encodings:
+            response.vary.add('Accept-Encoding')
+        response.last_modified = self.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+
+class PageCache:
+    """Bounded LRU cache of rendered pages, sized by total body bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_age=0):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._versions = {}
+        self._views = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', self.max_bytes)
+        self.max_age = app.config.get('PAGE_CACHE_MAX_AGE', self.max_age)
+        app.extensions['page_cache'] = self
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._size = 0
+
+    def _template_files(self, env, name, seen):
+        """Yield the filename of ``name`` and of every template it references."""
+        if name in seen:
+            return
+        seen.add(name)
+        source, filename, _ = env.loader.get_source(env, name)
+        yield filename
+        for child in meta.find_referenced_templates(env.parse(source)):
+            if child is not None:
+                yield from self._template_files(env, child, seen)
+
+    def template_version(self, name):
+        """Return the newest mtime across ``name`` and its parent/included templates.
+
+        The result is memoised unless template auto-reload is enabled, so in
+        production the templates are only stat'ed once per worker.
+        """
+        env = current_app.jinja_env
+        if not env.auto_reload and name in self._versions:
+            return self._versions[name]
+        version = max(os.path.getmtime(filename)
+                      for filename in self._template_files(env, name, set()))
+        self._versions[name] = version
+        return version
+
+    def cached(self, template, artifact=None, compress=False):
+        """Decorator caching a view's rendered output, keyed on endpoint and template mtime.
+
+        ``artifact`` names an entry in the app's artifact registry that the page
+        embeds; its content hash becomes part of the key so the page is rebuilt
+        when the registry picks up a new version of the file. With ``compress``
+        the gzip/brotli variants are built once when the entry is filled.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+
+                version = self.template_version(template)
+                source = None
+                if artifact is not None:
+                    source = current_app.extensions['artifacts'].get(artifact)
+                    if source is not None:
+                        version = max(version, source.mtime)
+                cache_key = (request.endpoint, version, source.sha256 if source else None)
+                entry = self.get(cache_key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    body = response.get_data()
+                    entry = self.put(cache_key, CachedPage(
+                        body=body,
+                        mimetype=response.mimetype,
+                        etag=hashlib.sha256(body).hexdigest()[:32],
+                        last_modified=datetime.fromtimestamp(version, timezone.utc),
+                        encodings=encode_variants(body) if compress else {},
+                    ))
+                return entry.to_response(self.max_age)
+            self._views.add(wrapper)
+            return wrapper
+        return decorator
+
+    def warm(self, app):
+        """Fill the cache for every cached view that takes no URL arguments.
+
+        Views are called directly in a test request context, bypassing the
+        request hooks. Returns the endpoints that were filled.
+        """
+        filled = []
+        for rule in app.url_map.iter_rules():
+            view = app.view_functions.get(rule.endpoint)
+            if view not in self._views or rule.arguments or 'GET' not in rule.methods:
+                continue
+            with app.test_request_context(rule.rule):
+                try:
+                    view()
+                except Exception as e:
+                    logger.warning(f"Could not pre-render {rule.rule}: {str(e)}")
+                    continue
+            filled.append(rule.endpoint)
+        return filled
@@ -8,5 +8,14 @@ fi
 # Activate virtual environment
 source venv/bin/activate
 
-# Run Flask application
-python app.py 
\ No newline at end of file
+# Build fingerprinted CSS/JS
+python assets.py
+
+# Precompile templates into the shared bytecode cache
+python template_cache.py
+
+# Publish the budget optimiser's XGBoost model unless the latest version already is one
+python model_registry.py publish --kind xgboost --if-missing
+
+# Run the application under gunicorn (settings in gunicorn.conf.py)
+exec gunicorn --config gunicorn.conf.py
\ No newline at end of file
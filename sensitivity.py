@@ -0,0 +1,218 @@
+"""
+Scenario sweeps for the budget optimiser.
+
+The notebook's sensitivity analysis calls ``optimize_budget`` once per
+``days_to_christmas`` value and repeats the whole grid each time. Here a
+sweep is the Cartesian product of scenario parameters (total budget, days to
+Christmas, weekend, holiday, week of campaign) evaluated against the
+allocation grid in chunks: every chunk of scenarios times the grid becomes a
+single feature matrix and a single predict call, and the best allocation per
+scenario is an ``argmax`` over the reshaped predictions.
+
+Chunks hold at most ``chunk_rows`` feature rows and at most ``2 * workers``
+chunks are in flight, so memory stays bounded however many scenarios are
+asked for. Chunks run on a thread pool (NumPy and model ``predict`` calls
+release the GIL for the heavy part) and results are yielded in scenario
+order as they complete, so callers can stream them.
+
+Usage:
+    python sensitivity.py --days 1-30 --budget 100000,150000,200000 --week 0-12
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import budget_optimizer
+from budget_optimizer import CHANNELS, DEFAULT_WEEK, OptimizerError
+
+# Swept parameters, in the order scenarios are enumerated (last varies fastest)
+PARAMETERS = ('total_budget', 'days_to_christmas', 'is_weekend', 'is_holiday', 'week')
+DEFAULTS = {
+    'total_budget': [150000.0],
+    'days_to_christmas': [14],
+    'is_weekend': [0],
+    'is_holiday': [0],
+    'week': [DEFAULT_WEEK],
+}
+CHUNK_ROWS = 20_000
+MAX_SCENARIOS = 100_000
+DEFAULT_WORKERS = 4
+
+
+def parse_values(text, kind=int, limit=None):
+    """Values of one parameter from ``'30,25,20'``, ``'1-30'`` or ``'30-5:5'`` (ranges are inclusive).
+
+    With ``limit``, more than that many values is an error, raised before any
+    range is expanded.
+    """
+    parts = []
+    count = 0
+    for part in text.split(','):
+        part = part.strip()
+        try:
+            if '-' in part[1:]:
+                bounds, _, step = part.partition(':')
+                start, _, stop = bounds.partition('-')
+                start, stop, step = int(start), int(stop), int(step or 1)
+                if step < 1:
+                    raise OptimizerError(f'Range step must be positive: {part}')
+                parts.append((start, stop, step))
+                count += abs(stop - start) // step + 1
+            else:
+                parts.append(kind(part))
+                count += 1
+        except ValueError:
+            raise OptimizerError(f'Invalid value: {part!r}')
+        if limit is not None and count > limit:
+            raise OptimizerError(f'More than {limit} values requested')
+
+    values = []
+    for part in parts:
+        if isinstance(part, tuple):
+            start, stop, step = part
+            direction = 1 if stop >= start else -1
+            values.extend(kind(v) for v in range(start, stop + direction, direction * step))
+        else:
+            values.append(part)
+    return values
+
+
+def scenario_count(values):
+    count = 1
+    for name in PARAMETERS:
+        count *= len(values.get(name) or DEFAULTS[name])
+    return count
+
+
+def scenarios(values):
+    """All combinations of the given parameter values, as tuples in :data:`PARAMETERS` order."""
+    return itertools.product(*(values.get(name) or DEFAULTS[name] for name in PARAMETERS))
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class SensitivityEngine:
+    """Runs scenario sweeps through a :class:`budget_optimizer.BudgetOptimizer`'s model."""
+
+    def __init__(self, optimizer, chunk_rows=CHUNK_ROWS, workers=DEFAULT_WORKERS, max_scenarios=MAX_SCENARIOS):
+        self.optimizer = optimizer
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.max_scenarios = max_scenarios
+
+    def init_app(self, app):
+        self.workers = app.config.get('SENSITIVITY_WORKERS', self.workers)
+        self.max_scenarios = app.config.get('SENSITIVITY_MAX_SCENARIOS', self.max_scenarios)
+        app.extensions['sensitivity'] = self
+
+    def evaluate(self, chunk, shares, day_of_week=0):
+        """Best allocation for each scenario in ``chunk``, scored in one predict call."""
+        import numpy as np
+
+        params = np.array(chunk, dtype=float)
+        k, m = len(params), len(shares)
+        budgets = params[:, 0]
+        spend = (shares[None, :, :] * budgets[:, None, None]).reshape(-1, 4)
+        scenario = {name: np.repeat(params[:, i], m) for i, name in enumerate(PARAMETERS) if i}
+        sales = self.optimizer.predict_sales(spend, day_of_week=day_of_week, **scenario).reshape(k, m)
+        best = sales.argmax(axis=1)
+        best_sales = sales[np.arange(k), best]
+
+        # Equal split per scenario, for the improvement figure
+        baseline = self.optimizer.predict_sales(np.repeat(budgets[:, None] / 4, 4, axis=1), day_of_week=day_of_week,
+                                                **{name: params[:, i] for i, name in enumerate(PARAMETERS) if i})
+
+        results = []
+        for row, index, predicted, base in zip(chunk, best, best_sales, baseline):
+            results.append({
+                'scenario': dict(zip(PARAMETERS, row)),
+                'shares': {c: float(s) for c, s in zip(CHANNELS, shares[index])},
+                'predicted_sales': float(predicted),
+                'roi': float(predicted / row[0]),
+                'improvement': float((predicted - base) / base) if base else None,
+            })
+        return results
+
+    def sweep(self, values, steps=None, day_of_week=0):
+        """Yield one result per scenario, in :func:`scenarios` order."""
+        count = scenario_count(values)
+        if count > self.max_scenarios:
+            raise OptimizerError(f'{count} scenarios requested, at most {self.max_scenarios} allowed')
+        if any(not 0 < budget < float('inf') for budget in values.get('total_budget') or []):
+            raise OptimizerError('total_budget must be a positive number')
+        steps = self.optimizer.steps if steps is None else steps
+        if not 2 <= steps <= self.optimizer.max_steps:
+            raise OptimizerError(f'steps must be between 2 and {self.optimizer.max_steps}')
+        if not 0 <= day_of_week <= 6:
+            raise OptimizerError('day_of_week must be between 0 (Monday) and 6')
+
+        shares = budget_optimizer.allocation_grid(steps)
+        per_chunk = max(1, self.chunk_rows // len(shares))
+        chunks = _chunks(scenarios(values), per_chunk)
+        if self.workers <= 1 or count <= per_chunk:
+            for chunk in chunks:
+                yield from self.evaluate(chunk, shares, day_of_week)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sensitivity') as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(self.evaluate, chunk, shares, day_of_week))
+                if len(pending) >= 2 * self.workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def ndjson_lines(self, values, steps=None, day_of_week=0):
+        """The sweep as newline-delimited JSON records, ending with a summary record.
+
+        Parameters are validated before the first line is produced, so errors
+        can still become a 400 response.
+        """
+        results = self.sweep(values, steps, day_of_week)
+        started = time.perf_counter()
+        first = next(results, None)
+
+        def generate():
+            count = 0
+            for index, result in enumerate(itertools.chain([first] if first else [], results)):
+                yield json.dumps({'type': 'scenario', 'index': index, **result}) + '\n'
+                count += 1
+            yield json.dumps({'type': 'summary', 'scenarios': count,
+                              'seconds': time.perf_counter() - started}) + '\n'
+        return generate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimise the channel split for every combination of scenarios.')
+    parser.add_argument('--budget', default='150000', help='daily budgets, e.g. 100000,150000')
+    parser.add_argument('--days', default='30-5:5', help='days to Christmas, e.g. 1-30 (default: %(default)s)')
+    parser.add_argument('--weekend', default='0', help='0, 1 or 0,1')
+    parser.add_argument('--holiday', default='0', help='0, 1 or 0,1')
+    parser.add_argument('--week', default=str(DEFAULT_WEEK), help='weeks of the campaign, e.g. 0-12')
+    parser.add_argument('--steps', type=int, default=budget_optimizer.DEFAULT_STEPS, help='grid points per channel')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    values = {
+        'total_budget': parse_values(args.budget, float),
+        'days_to_christmas': parse_values(args.days),
+        'is_weekend': parse_values(args.weekend),
+        'is_holiday': parse_values(args.holiday),
+        'week': parse_values(args.week),
+    }
+    engine = SensitivityEngine(budget_optimizer.BudgetOptimizer(), workers=args.workers,
+                               max_scenarios=sys.maxsize)
+    sys.stdout.writelines(engine.ndjson_lines(values, steps=args.steps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Startup profile of the app: where a worker's boot time goes.
+
+Runs ``create_app()`` in a fresh interpreter under ``python -X importtime``
+and reports the time spent importing (broken down by the modules the app
+imports directly, by top-level package and by the slowest individual
+modules) and the time spent in ``create_app()`` itself.
+
+Usage:
+    python startup_profile.py [--limit N] [--no-warmup] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LIMIT = 15
+
+# Imports the app, then creates it, and reports both durations on stdout
+BOOT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported}))
+"""
+
+_importtime_line = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """``[(module, depth, self_us, cumulative_us)]`` from ``-X importtime`` output, in import order."""
+    modules = []
+    for line in stderr.splitlines():
+        match = _importtime_line.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def profile(warm_up=True):
+    """Boot the app once in a subprocess; returns the report document."""
+    env = dict(os.environ, TEMPLATE_WARMUP='1' if warm_up else '0')
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT], cwd=ROOT, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(completed.stderr)
+
+    # Everything imported while `from app import create_app` ran is nested under `app`
+    app_index = next(i for i, (name, depth, _, _) in enumerate(modules) if name == 'app' and depth == 0)
+    app_modules = []
+    for name, depth, self_us, cumulative_us in reversed(modules[:app_index]):
+        if depth == 0:
+            break
+        app_modules.append((name, depth, self_us, cumulative_us))
+    app_modules.reverse()
+
+    packages = defaultdict(int)
+    for name, _, self_us, _ in app_modules:
+        packages[name.split('.')[0]] += self_us
+
+    return {
+        'import_seconds': round(timings['import'], 4),
+        'create_app_seconds': round(timings['create_app'], 4),
+        'warm_up': warm_up,
+        'app_module_seconds': round(modules[app_index][2] / 1e6, 4),
+        # What `import app` pulls in directly: the cost attributable to each of its imports
+        'direct_imports': [{'module': name, 'seconds': round(cumulative_us / 1e6, 4)}
+                           for name, depth, _, cumulative_us in app_modules if depth == 1],
+        'packages': [{'package': name, 'seconds': round(us / 1e6, 4)}
+                     for name, us in sorted(packages.items(), key=lambda item: -item[1])],
+        'modules': [{'module': name, 'seconds': round(self_us / 1e6, 4)}
+                    for name, _, self_us, _ in sorted(app_modules, key=lambda m: -m[2])],
+    }
+
+
+def print_report(report, limit):
+    total = report['import_seconds'] + report['create_app_seconds']
+    print(f"Boot: {total * 1000:.1f} ms = import {report['import_seconds'] * 1000:.1f} ms"
+          f" + create_app() {report['create_app_seconds'] * 1000:.1f} ms"
+          f" (template warm-up {'on' if report['warm_up'] else 'off'})")
+
+    sections = [
+        ('Direct imports of app.py (cumulative)', 'direct_imports', 'module'),
+        ('Packages (self time)', 'packages', 'package'),
+        ('Slowest modules (self time)', 'modules', 'module'),
+    ]
+    for title, key, field in sections:
+        rows = sorted(report[key], key=lambda row: -row['seconds'])[:limit]
+        print(f"\n{title}:")
+        for row in rows:
+            print(f"  {row['seconds'] * 1000:8.1f} ms  {row[field]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Break down where app start-up time goes.')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help='rows per section (default: %(default)s)')
+    parser.add_argument('--no-warmup', action='store_true', help='profile without the template warm-up')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    report = profile(warm_up=not args.no_warmup)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.limit)
+
+
+if __name__ == '__main__':
+    main()
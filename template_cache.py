@@ -0,0 +1,99 @@
+"""
+Persistent Jinja bytecode cache and boot-time template warm-up.
+
+Jinja compiles each template to Python on first use, per worker. With a
+:class:`jinja2.FileSystemBytecodeCache` under ``instance/jinja_bytecode`` the
+compiled code is written once and loaded by every other worker (and every
+later boot); entries are keyed on the template source's checksum, so an
+edited template is simply recompiled.
+
+:meth:`TemplateWarmer.warm` runs once the routes are registered: it loads
+every page template and renders it inside a throwaway request context, which
+also primes ``url_for``, the asset manifest and the image sizes the templates
+look up. ``init_app`` only installs the bytecode cache; ``create_app`` calls
+``warm`` at its end, after registering the routes. With ``preload_app`` that
+happens once in the gunicorn master, and the forked workers inherit the
+compiled templates, so ``post_worker_init`` has nothing to redo. Without it,
+each worker warms up while loading the app, before it accepts its first
+connection.
+
+``python template_cache.py`` fills the bytecode cache ahead of time, as part
+of the deploy build.
+"""
+import logging
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = ('.html',)
+
+
+class TemplateWarmer:
+    """Installs the bytecode cache and pre-renders templates."""
+
+    def __init__(self, cache_dir=None, warm_up=True):
+        self.cache_dir = cache_dir
+        self.warm_up = warm_up
+        self.app = None
+
+    def init_app(self, app):
+        self.cache_dir = app.config.get('TEMPLATE_BYTECODE_DIR') or os.path.join(app.instance_path, 'jinja_bytecode')
+        self.warm_up = app.config.get('TEMPLATE_WARMUP', self.warm_up)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Must be installed before the first template is loaded
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(self.cache_dir)
+        self.app = app
+        app.extensions['template_warmer'] = self
+
+    def templates(self):
+        return self.app.jinja_env.list_templates(filter_func=lambda name: name.endswith(TEMPLATE_SUFFIXES))
+
+    def compile_all(self):
+        """Load every template, writing any missing bytecode to the cache; returns their names."""
+        names = self.templates()
+        for name in names:
+            self.app.jinja_env.get_template(name)
+        return names
+
+    def warm(self):
+        """Compile and render every template once; returns ``{name: seconds}``.
+
+        Templates that need view-specific context fail to render here; they
+        are still compiled, which is the expensive part.
+        """
+        if not self.warm_up:
+            return {}
+        started = time.perf_counter()
+        timings = {}
+        for name in self.templates():
+            template_started = time.perf_counter()
+            template = self.app.jinja_env.get_template(name)
+            with self.app.test_request_context('/'):
+                context = {}
+                self.app.update_template_context(context)
+                try:
+                    template.render(context)
+                except Exception as e:
+                    logger.debug(f"Warm-up render of {name} skipped: {str(e)}")
+            timings[name] = time.perf_counter() - template_started
+        logger.info(f"Warmed up {len(timings)} templates in {time.perf_counter() - started:.3f}s")
+        return timings
+
+
+def main():
+    os.environ.setdefault('TEMPLATE_WARMUP', '0')
+    from app import create_app
+
+    app = create_app()
+
+    warmer = app.extensions['template_warmer']
+    for name in warmer.compile_all():
+        print(name)
+    print(f"Bytecode cache: {warmer.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()